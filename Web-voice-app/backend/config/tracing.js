@@ -0,0 +1,134 @@
+const crypto = require("crypto");
+const fs = require("fs");
+const path = require("path");
+
+// Spans are appended as OTLP/JSON lines (OpenTelemetry Collector file exporter
+// format). Point the Flask services' TRACE_EXPORT_FILE at the same file to see
+// the Node and Python sides of a request in one trace.
+const TRACE_EXPORT_FILE = process.env.TRACE_EXPORT_FILE || "";
+const SERVICE_NAME = process.env.TRACE_SERVICE_NAME || "voicescript-backend";
+
+const SPAN_KIND_SERVER = 2;
+const SPAN_KIND_CLIENT = 3;
+const STATUS_OK = 1;
+const STATUS_ERROR = 2;
+
+if (TRACE_EXPORT_FILE) {
+  fs.mkdirSync(path.dirname(path.resolve(TRACE_EXPORT_FILE)), { recursive: true });
+}
+
+const newId = (bytes) => crypto.randomBytes(bytes).toString("hex");
+
+// Parse a W3C traceparent header into { traceId, spanId }
+const parseTraceparent = (header) => {
+  const match = /^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$/.exec((header || "").trim().toLowerCase());
+  if (!match || /^0+$/.test(match[1]) || /^0+$/.test(match[2])) {
+    return null;
+  }
+  return { traceId: match[1], spanId: match[2] };
+};
+
+const toAttribute = (key, value) => {
+  if (typeof value === "boolean") return { key, value: { boolValue: value } };
+  if (Number.isInteger(value)) return { key, value: { intValue: String(value) } };
+  if (typeof value === "number") return { key, value: { doubleValue: value } };
+  return { key, value: { stringValue: String(value) } };
+};
+
+const exportSpan = (span) => {
+  if (!TRACE_EXPORT_FILE) return;
+  const line = JSON.stringify({
+    resourceSpans: [{
+      resource: { attributes: [toAttribute("service.name", SERVICE_NAME)] },
+      scopeSpans: [{ scope: { name: "voicescript.backend" }, spans: [span] }],
+    }],
+  });
+  fs.appendFile(TRACE_EXPORT_FILE, line + "\n", (err) => {
+    if (err) console.error("Trace export failed:", err.message);
+  });
+};
+
+// Wall-clock time in nanoseconds, with sub-millisecond precision
+const nowNano = () => BigInt(Math.round((performance.timeOrigin + performance.now()) * 1e6)).toString();
+
+class Span {
+  constructor(name, traceId, parentSpanId, kind, attributes = {}) {
+    this.name = name;
+    this.traceId = traceId;
+    this.spanId = newId(8);
+    this.parentSpanId = parentSpanId;
+    this.kind = kind;
+    this.attributes = { ...attributes };
+    this.startTimeUnixNano = nowNano();
+    this.ended = false;
+  }
+
+  child(name, attributes = {}, kind = SPAN_KIND_CLIENT) {
+    return new Span(name, this.traceId, this.spanId, kind, attributes);
+  }
+
+  // Headers that make the downstream service join this span's trace
+  headers() {
+    return {
+      traceparent: `00-${this.traceId}-${this.spanId}-01`,
+      "X-Request-ID": this.traceId,
+    };
+  }
+
+  end(attributes = {}, error = null) {
+    if (this.ended) return;
+    this.ended = true;
+    Object.assign(this.attributes, attributes);
+    const span = {
+      traceId: this.traceId,
+      spanId: this.spanId,
+      name: this.name,
+      kind: this.kind,
+      startTimeUnixNano: this.startTimeUnixNano,
+      endTimeUnixNano: nowNano(),
+      attributes: Object.entries(this.attributes)
+        .filter(([, value]) => value !== undefined && value !== null)
+        .map(([key, value]) => toAttribute(key, value)),
+      status: error ? { code: STATUS_ERROR, message: String(error.message || error).slice(0, 200) } : { code: STATUS_OK },
+    };
+    if (this.parentSpanId) span.parentSpanId = this.parentSpanId;
+    exportSpan(span);
+  }
+}
+
+// Start a server span for an incoming request, joining the caller's trace if
+// it sent a traceparent header. The span ends when the response is sent.
+const startRequestSpan = (req, res, name) => {
+  const parent = parseTraceparent(req.headers.traceparent);
+  const span = new Span(
+    name || `${req.method} ${req.baseUrl || ""}${req.route ? req.route.path : req.path}`,
+    parent ? parent.traceId : newId(16),
+    parent ? parent.spanId : undefined,
+    SPAN_KIND_SERVER,
+    { "http.method": req.method }
+  );
+  res.setHeader("X-Request-ID", span.traceId);
+  res.on("finish", () => {
+    span.end({ "http.status_code": res.statusCode }, res.statusCode >= 500 ? `HTTP ${res.statusCode}` : null);
+  });
+  return span;
+};
+
+// Wrap an axios call in a client span; the span's headers are passed to `call`
+const traceCall = async (parentSpan, name, attributes, call) => {
+  const span = parentSpan.child(name, attributes);
+  try {
+    const response = await call(span.headers());
+    span.end({ "http.status_code": response.status });
+    return response;
+  } catch (error) {
+    span.end({ "http.status_code": error.response?.status, "error.code": error.code }, error);
+    throw error;
+  }
+};
+
+module.exports = {
+  parseTraceparent,
+  startRequestSpan,
+  traceCall,
+};
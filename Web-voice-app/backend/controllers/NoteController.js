@@ -3,6 +3,7 @@ const FormData = require("form-data");
 const fs = require("fs");
 const path = require("path");
 const axios = require("axios");
+const { startRequestSpan, traceCall } = require("../config/tracing");
 
 // Python transcription service URL
 const PYTHON_SERVICE_URL = process.env.PYTHON_SERVICE_URL || "http://localhost:5000";
@@ -125,6 +126,8 @@ class NoteController {
     const userId = req.body.userId;
     const language = req.body.language || 'en-US'; // Default to en-US if not provided
     const audioFile = req.file;
+    // Trace id is forwarded to Flask, linking these axios calls to its spans
+    const requestSpan = startRequestSpan(req, res, "POST /api/notes/upload");
 
     if (!userId) {
       return res.status(400).json({ message: "User ID is required" });
@@ -133,6 +136,7 @@ class NoteController {
     if (!audioFile) {
       return res.status(400).json({ message: "No audio file provided" });
     }
+    requestSpan.attributes["file.size"] = audioFile.size;
 
     try {
       // Extract filename without extension for note title
@@ -148,15 +152,18 @@ class NoteController {
 
       let fileMetadata = null;
       try {
-        const analysisResponse = await axios.post(
-          `${PYTHON_SERVICE_URL}/api/analyze-file`,
-          analysisFormData,
-          {
-            headers: analysisFormData.getHeaders(),
-            maxContentLength: Infinity,
-            maxBodyLength: Infinity,
-            timeout: 30000, // 30 second timeout for analysis
-          }
+        const analysisResponse = await traceCall(
+          requestSpan, "POST /api/analyze-file", { "http.url": `${PYTHON_SERVICE_URL}/api/analyze-file` },
+          (traceHeaders) => axios.post(
+            `${PYTHON_SERVICE_URL}/api/analyze-file`,
+            analysisFormData,
+            {
+              headers: { ...analysisFormData.getHeaders(), ...traceHeaders },
+              maxContentLength: Infinity,
+              maxBodyLength: Infinity,
+              timeout: 30000, // 30 second timeout for analysis
+            }
+          )
         );
         fileMetadata = analysisResponse.data;
       } catch (analysisError) {
@@ -176,20 +183,24 @@ class NoteController {
       try {
         // Call Python transcription service
         const transcriptionStartTime = Date.now();
-        const transcriptionResponse = await axios.post(
-          `${PYTHON_SERVICE_URL}/api/transcribe-file`,
-          formData,
-          {
-            headers: formData.getHeaders(),
-            maxContentLength: Infinity,
-            maxBodyLength: Infinity,
-            timeout: 300000, // 5 minute timeout for large files
-          }
+        const transcriptionResponse = await traceCall(
+          requestSpan, "POST /api/transcribe-file",
+          { "http.url": `${PYTHON_SERVICE_URL}/api/transcribe-file`, language },
+          (traceHeaders) => axios.post(
+            `${PYTHON_SERVICE_URL}/api/transcribe-file`,
+            formData,
+            {
+              headers: { ...formData.getHeaders(), ...traceHeaders },
+              maxContentLength: Infinity,
+              maxBodyLength: Infinity,
+              timeout: 300000, // 5 minute timeout for large files
+            }
+          )
         );
 
         transcriptionData = transcriptionResponse.data;
         const transcriptionDuration = Date.now() - transcriptionStartTime;
-        console.log(`[NoteController] Python transcription took ${transcriptionDuration}ms (text length: ${transcriptionData.text?.length || 0} chars)`);
+        console.log(`[NoteController] Python transcription took ${transcriptionDuration}ms (text length: ${transcriptionData.text?.length || 0} chars, trace ${requestSpan.traceId})`);
         
         // Include metadata in response for frontend
         if (fileMetadata) {
@@ -0,0 +1,78 @@
+"""
+Async (gevent) serving support.
+
+Under gunicorn's gevent worker class, socket I/O is cooperative, so while one
+request waits on the recognizer the same worker process serves others. CPU-bound
+work (NumPy VAD, language detection) would stall every request in the process if
+it ran on the event loop; run_cpu_bound() moves it onto gevent's native thread
+pool instead, carrying the caller's context variables (request id for logging).
+Without gevent (dev server, sync workers) calls run inline.
+"""
+
+import logging
+import importlib
+import contextvars
+
+logger = logging.getLogger(__name__)
+
+
+def gevent_active():
+    """Return True when the process is monkey-patched by gevent."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def original(module_name, name):
+    """
+    Return `module_name.name` as it was before gevent monkey-patching (the
+    current attribute when gevent is not installed or not patching).
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return getattr(importlib.import_module(module_name), name)
+    return monkey.get_original(module_name, name)
+
+
+class OSThread:
+    """
+    A real OS thread, even under gevent monkey-patching (where threading.Thread
+    starts a greenlet that only runs when other greenlets yield).
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self._done = original('_thread', 'allocate_lock')()
+
+    def start(self):
+        self._done.acquire()
+        original('_thread', 'start_new_thread')(self._run, ())
+
+    def _run(self):
+        try:
+            self._target()
+        finally:
+            self._done.release()
+
+    def join(self):
+        """Wait for the thread to finish (blocks the whole event loop under gevent)."""
+        with self._done:
+            pass
+
+
+def run_cpu_bound(func, *args, **kwargs):
+    """
+    Run a CPU-bound callable without blocking the event loop.
+
+    Returns:
+        The return value of `func(*args, **kwargs)`
+    """
+    if not gevent_active():
+        return func(*args, **kwargs)
+
+    import gevent
+    context = contextvars.copy_context()
+    return gevent.get_hub().threadpool.apply(context.run, (func,) + args, kwargs)
@@ -4,10 +4,19 @@ Converts various audio formats to WAV format for transcription.
 """
 
 import os
+import queue
+import shutil
+import subprocess
 import tempfile
+import threading
+import time
 import logging
+import wave
+from contextlib import contextmanager
 from pathlib import Path
 
+from voice_activity import split_at_pauses
+
 logger = logging.getLogger(__name__)
 
 # Supported input formats
@@ -18,6 +27,104 @@ WAV_SAMPLE_RATE = 16000  # 16kHz
 WAV_CHANNELS = 1  # Mono
 WAV_SAMPLE_WIDTH = 2  # 16-bit
 
+# Streaming conversion: decode/resample with ffmpeg and write in fixed-size blocks
+# instead of holding the whole decoded file in memory (set to "0" to disable)
+STREAMING_CONVERSION = os.environ.get('STREAMING_CONVERSION', '1') != '0'
+STREAM_BLOCK_SIZE = 64 * 1024  # bytes of PCM per read/write
+
+# Pipelined mode: decoded PCM is handed to recognition in segments of about this
+# length (cut at the quietest frame within +/- PIPELINE_CUT_SEARCH_SECONDS)
+PIPELINE_SEGMENT_SECONDS = 30
+PIPELINE_CUT_SEARCH_SECONDS = 2
+# Decoded segments buffered ahead of recognition
+PIPELINE_QUEUE_SIZE = 2
+
+# Per-process memory ceiling for concurrent conversions
+CONVERSION_MEMORY_LIMIT = int(os.environ.get('CONVERSION_MEMORY_LIMIT_MB', '256')) * 1024 * 1024
+# How long a request waits for memory before being rejected
+CONVERSION_MEMORY_WAIT = float(os.environ.get('CONVERSION_MEMORY_WAIT_SECONDS', '30'))
+
+# Resident memory of one ffmpeg decode/resample process (measured peak RSS
+# ~15MB for MP3/Opus input), charged to every conversion that runs ffmpeg
+FFMPEG_PROCESS_BYTES = int(os.environ.get('FFMPEG_PROCESS_MB', '16')) * 1024 * 1024
+
+# Rough decoded-size multiplier for the in-memory (pydub) path: compressed audio
+# expands ~10x when decoded, and each set_* call makes another full copy
+IN_MEMORY_EXPANSION_FACTOR = 30
+
+
+_END_OF_STREAM = object()
+
+
+class MemoryLimitError(RuntimeError):
+    """Raised when a conversion cannot get a memory reservation in time."""
+
+
+class MemoryBudget:
+    """
+    Tracks memory reserved by in-flight conversions against a ceiling.
+    Requests that do not fit wait (queue) until memory frees up or time out.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.in_use = 0
+        self.peak = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes, timeout=CONVERSION_MEMORY_WAIT):
+        """
+        Reserve `nbytes` for the duration of the block.
+
+        Requests larger than the ceiling are capped to it, so they run alone
+        rather than never running at all.
+
+        Raises:
+            MemoryLimitError: If the reservation is not granted within `timeout`
+        """
+        nbytes = max(0, min(int(nbytes), self.limit_bytes))
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_use + nbytes > self.limit_bytes:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise MemoryLimitError(
+                            f"Server is busy converting other files "
+                            f"({self.in_use // (1024 * 1024)}MB of {self.limit_bytes // (1024 * 1024)}MB in use). "
+                            "Please try again shortly."
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield nbytes
+        finally:
+            with self._cond:
+                self.in_use -= nbytes
+                self._cond.notify_all()
+
+    def stats(self):
+        """Return a snapshot of the budget counters."""
+        with self._cond:
+            return {
+                'limit_bytes': self.limit_bytes,
+                'in_use_bytes': self.in_use,
+                'peak_bytes': self.peak,
+                'waiting': self.waiting,
+                'rejected': self.rejected,
+            }
+
+
+memory_budget = MemoryBudget(CONVERSION_MEMORY_LIMIT)
+
 
 def is_supported_format(filename):
     """Check if file format is supported for conversion."""
@@ -60,7 +167,258 @@ def convert_mp3_to_wav(mp3_file_path, wav_file_path):
         raise RuntimeError(error_msg) from e
 
 
-def convert_to_wav(input_path, output_path=None, output_dir=None):
+def find_ffmpeg():
+    """Return the path to the ffmpeg binary, or None if it is not installed."""
+    return shutil.which('ffmpeg') or shutil.which('avconv')
+
+
+def _make_output_path(input_path, output_dir=None):
+    """Create an empty temp WAV file next to the input (or in output_dir)."""
+    if output_dir is None:
+        output_dir = os.path.dirname(input_path) or '.'
+    base_name = Path(input_path).stem
+    output_file = tempfile.NamedTemporaryFile(
+        delete=False,
+        suffix='.wav',
+        prefix=f'converted_{base_name}_',
+        dir=output_dir
+    )
+    output_path = output_file.name
+    output_file.close()
+    return output_path
+
+
+def iter_pcm_blocks(input_path, block_size=STREAM_BLOCK_SIZE):
+    """
+    Decode an audio file with ffmpeg and yield normalized PCM blocks
+    (16kHz mono 16-bit) as soon as they are produced.
+
+    Closing the generator early stops ffmpeg.
+
+    Raises:
+        RuntimeError: If ffmpeg is missing or decoding fails
+    """
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is required for streaming conversion: https://ffmpeg.org/download.html")
+
+    command = [
+        ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-i', input_path,
+        '-vn',
+        '-ac', str(WAV_CHANNELS),
+        '-ar', str(WAV_SAMPLE_RATE),
+        '-acodec', 'pcm_s16le',
+        '-f', 's16le',
+        'pipe:1',
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    total_bytes = 0
+    try:
+        while True:
+            block = process.stdout.read(block_size)
+            if not block:
+                break
+            total_bytes += len(block)
+            yield block
+        stderr = process.stderr.read()
+        returncode = process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+    if returncode != 0 or total_bytes == 0:
+        message = stderr.decode('utf-8', errors='replace').strip() or f"ffmpeg exited with code {returncode}"
+        raise RuntimeError(f"Failed to convert audio file: {message}")
+
+
+def sniff_container(data):
+    """
+    Identify an in-memory recording by its magic bytes.
+
+    Returns:
+        str or None: 'wav', 'webm' (Matroska/WebM), 'ogg', or None if unknown
+    """
+    header = bytes(data[:12])
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    if header[:4] == b'OggS':
+        return 'ogg'
+    return None
+
+
+def decode_audio_bytes(data, container=None):
+    """
+    Decode a compressed recording (WebM/Opus, OGG) held in memory.
+
+    The bytes are piped into ffmpeg's stdin and 16kHz mono 16-bit PCM is read
+    back from its stdout; nothing touches the disk.
+
+    Args:
+        data: Encoded audio bytes
+        container: Result of sniff_container(), used to skip format probing
+
+    Returns:
+        bytes: Raw PCM at WAV_SAMPLE_RATE / WAV_CHANNELS / WAV_SAMPLE_WIDTH
+
+    Raises:
+        RuntimeError: If ffmpeg is missing or decoding fails
+    """
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is required to decode compressed audio: https://ffmpeg.org/download.html")
+
+    input_format = {'webm': ['-f', 'matroska'], 'ogg': ['-f', 'ogg']}.get(container, [])
+    command = [
+        ffmpeg, '-hide_banner', '-loglevel', 'error',
+        *input_format, '-i', 'pipe:0',
+        '-vn',
+        '-ac', str(WAV_CHANNELS),
+        '-ar', str(WAV_SAMPLE_RATE),
+        '-acodec', 'pcm_s16le',
+        '-f', 's16le',
+        'pipe:1',
+    ]
+    # The ffmpeg process plus the decoded PCM held in memory
+    estimated_bytes = FFMPEG_PROCESS_BYTES + len(data) * IN_MEMORY_EXPANSION_FACTOR
+    with memory_budget.reserve(estimated_bytes):
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        pcm, stderr = process.communicate(data)
+
+    if process.returncode != 0 or not pcm:
+        message = stderr.decode('utf-8', errors='replace').strip() or f"ffmpeg exited with code {process.returncode}"
+        raise RuntimeError(f"Failed to decode audio: {message}")
+    return pcm
+
+
+def convert_to_wav_streaming(input_path, output_path=None, output_dir=None, block_size=STREAM_BLOCK_SIZE):
+    """
+    Convert an audio file to WAV using bounded memory.
+
+    ffmpeg decodes and resamples to 16kHz mono 16-bit PCM on a pipe; the PCM is
+    read and written to the WAV file `block_size` bytes at a time, so memory use
+    does not grow with the length of the recording.
+
+    Args:
+        input_path: Path to input audio file
+        output_path: Optional output path (if None, creates temp file)
+        output_dir: Optional directory for output file (if output_path is None)
+        block_size: Bytes of PCM read/written per block
+
+    Returns:
+        str: Path to converted WAV file
+
+    Raises:
+        MemoryLimitError: If the memory ceiling is reached and the wait times out
+        RuntimeError: If ffmpeg is missing or conversion fails
+    """
+    # The ffmpeg process plus our read buffer and the OS pipe buffer; decoded
+    # PCM goes straight to disk, so this does not grow with the recording
+    with memory_budget.reserve(FFMPEG_PROCESS_BYTES + 2 * block_size):
+        if output_path is None:
+            output_path = _make_output_path(input_path, output_dir)
+
+        logger.debug("Streaming conversion: %s -> %s", input_path, output_path)
+        total_bytes = 0
+        try:
+            with wave.open(output_path, 'wb') as wav_file:
+                wav_file.setnchannels(WAV_CHANNELS)
+                wav_file.setsampwidth(WAV_SAMPLE_WIDTH)
+                wav_file.setframerate(WAV_SAMPLE_RATE)
+                for block in iter_pcm_blocks(input_path, block_size):
+                    wav_file.writeframesraw(block)
+                    total_bytes += len(block)
+        except Exception as e:
+            # Also when the caller chose the path (e.g. a spool file): a partial WAV is useless
+            cleanup_file(output_path)
+            if isinstance(e, RuntimeError):
+                raise
+            raise RuntimeError(f"Failed to convert audio file: {str(e)}") from e
+
+    duration = total_bytes / float(WAV_SAMPLE_RATE * WAV_CHANNELS * WAV_SAMPLE_WIDTH)
+    logger.info("Converted %s to WAV (%.1fs, streamed)", input_path, duration)
+    return output_path
+
+
+def iter_pcm_segments(input_path, segment_seconds=PIPELINE_SEGMENT_SECONDS,
+                      search_seconds=PIPELINE_CUT_SEARCH_SECONDS):
+    """
+    Decode an audio file and yield normalized PCM segments of roughly
+    `segment_seconds`, each cut at the quietest frame near the boundary.
+    """
+    bytes_per_second = WAV_SAMPLE_RATE * WAV_CHANNELS * WAV_SAMPLE_WIDTH
+    return split_at_pauses(
+        iter_pcm_blocks(input_path),
+        segment_seconds * bytes_per_second,
+        search_seconds * bytes_per_second,
+        WAV_SAMPLE_RATE,
+        WAV_SAMPLE_WIDTH,
+    )
+
+
+def pipelined_pcm_segments(input_path, segment_seconds=PIPELINE_SEGMENT_SECONDS,
+                           search_seconds=PIPELINE_CUT_SEARCH_SECONDS, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Yield PCM segments while decoding continues in a background thread.
+
+    Decoding runs ahead of the consumer by up to `queue_size` segments, so a
+    caller that recognizes each segment overlaps recognition with decoding:
+    total time is roughly max(decode, recognize) instead of their sum.
+
+    Raises:
+        MemoryLimitError: If the memory ceiling is reached and the wait times out
+        RuntimeError: If decoding fails (raised in the consumer)
+    """
+    bytes_per_second = WAV_SAMPLE_RATE * WAV_CHANNELS * WAV_SAMPLE_WIDTH
+    # The ffmpeg process, queued segments, the one being built and the one being recognized
+    reserved = FFMPEG_PROCESS_BYTES + (queue_size + 2) * (segment_seconds + search_seconds) * bytes_per_second
+
+    with memory_budget.reserve(reserved):
+        segments = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    segments.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            decoder = iter_pcm_segments(input_path, segment_seconds, search_seconds)
+            try:
+                for segment in decoder:
+                    if not put(segment):
+                        return
+                put(_END_OF_STREAM)
+            except Exception as e:
+                put(e)
+            finally:
+                decoder.close()
+
+        producer = threading.Thread(target=produce, name='pcm-decoder', daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = segments.get()
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+
+def convert_to_wav(input_path, output_path=None, output_dir=None, streaming=None):
     """
     Convert audio file to WAV format.
     
@@ -68,12 +426,15 @@ def convert_to_wav(input_path, output_path=None, output_dir=None):
         input_path: Path to input audio file
         output_path: Optional output path (if None, creates temp file)
         output_dir: Optional directory for output file (if output_path is None)
+        streaming: Use bounded-memory streaming conversion (defaults to
+            STREAMING_CONVERSION when ffmpeg is available)
     
     Returns:
         str: Path to converted WAV file
     
     Raises:
         ImportError: If pydub is not installed
+        MemoryLimitError: If the conversion memory ceiling is reached
         RuntimeError: If conversion fails
         ValueError: If file format is not supported
     """
@@ -82,7 +443,7 @@ def convert_to_wav(input_path, output_path=None, output_dir=None):
     
     # Check if already WAV
     if input_path.lower().endswith('.wav'):
-        logger.info(f"File is already WAV format: {input_path}")
+        logger.debug("File is already WAV format: %s", input_path)
         return input_path
     
     # Check if format is supported
@@ -90,6 +451,19 @@ def convert_to_wav(input_path, output_path=None, output_dir=None):
     if not is_supported_format(filename):
         raise ValueError(f"Unsupported audio format. Supported formats: {', '.join(SUPPORTED_INPUT_FORMATS)}")
     
+    if streaming is None:
+        streaming = STREAMING_CONVERSION and find_ffmpeg() is not None
+    if streaming:
+        return convert_to_wav_streaming(input_path, output_path=output_path, output_dir=output_dir)
+    
+    # The in-memory path runs ffmpeg (through pydub) and holds the decoded audio plus copies
+    estimated_bytes = FFMPEG_PROCESS_BYTES + os.path.getsize(input_path) * IN_MEMORY_EXPANSION_FACTOR
+    with memory_budget.reserve(estimated_bytes):
+        return _convert_to_wav_in_memory(input_path, output_path, output_dir)
+
+
+def _convert_to_wav_in_memory(input_path, output_path=None, output_dir=None):
+    """Convert with pydub, holding the whole decoded file in memory."""
     try:
         from pydub import AudioSegment
     except ImportError:
@@ -100,7 +474,7 @@ def convert_to_wav(input_path, output_path=None, output_dir=None):
         )
     
     try:
-        logger.info(f"Loading audio file: {input_path}")
+        logger.debug("Loading audio file: %s", input_path)
         
         # Get file extension to use format-specific loader when possible
         file_ext = Path(input_path).suffix.lower()
@@ -110,17 +484,7 @@ def convert_to_wav(input_path, output_path=None, output_dir=None):
         if file_ext == '.mp3':
             # Use the dedicated MP3 converter function
             if output_path is None:
-                if output_dir is None:
-                    output_dir = os.path.dirname(input_path) or '.'
-                base_name = Path(input_path).stem
-                output_file = tempfile.NamedTemporaryFile(
-                    delete=False,
-                    suffix='.wav',
-                    prefix=f'converted_{base_name}_',
-                    dir=output_dir
-                )
-                output_path = output_file.name
-                output_file.close()
+                output_path = _make_output_path(input_path, output_dir)
             
             # Use the MP3-specific converter
             return convert_mp3_to_wav(input_path, output_path)
@@ -147,39 +511,30 @@ def convert_to_wav(input_path, output_path=None, output_dir=None):
             logger.warning(f"Format-specific load failed, trying generic: {str(load_error)}")
             audio = AudioSegment.from_file(input_path)
         
-        logger.info(f"Original audio: {len(audio)}ms, {audio.frame_rate}Hz, {audio.channels} channels")
+        logger.debug("Original audio: %dms, %dHz, %d channels", len(audio), audio.frame_rate, audio.channels)
         
         # Convert to required WAV format (16kHz, mono, 16-bit)
         audio = audio.set_frame_rate(WAV_SAMPLE_RATE)
         audio = audio.set_channels(WAV_CHANNELS)
         audio = audio.set_sample_width(WAV_SAMPLE_WIDTH)
         
-        logger.info(f"Converted audio: {len(audio)}ms, {audio.frame_rate}Hz, {audio.channels} channels")
+        logger.debug("Converted audio: %dms, %dHz, %d channels", len(audio), audio.frame_rate, audio.channels)
         
         # Determine output path
         if output_path is None:
-            if output_dir is None:
-                output_dir = os.path.dirname(input_path) or '.'
-            
             # Create temp file in output directory
-            base_name = Path(input_path).stem
-            output_file = tempfile.NamedTemporaryFile(
-                delete=False,
-                suffix='.wav',
-                prefix=f'converted_{base_name}_',
-                dir=output_dir
-            )
-            output_path = output_file.name
-            output_file.close()
+            output_path = _make_output_path(input_path, output_dir)
         
         # Export as WAV
-        logger.info(f"Exporting to WAV: {output_path}")
+        logger.debug("Exporting to WAV: %s", output_path)
         audio.export(output_path, format="wav")
         
-        logger.info(f"Successfully converted '{input_path}' to '{output_path}'")
+        logger.info("Converted %s to WAV", input_path)
         return output_path
         
     except Exception as e:
+        if output_path is not None and output_path != input_path:
+            cleanup_file(output_path)
         error_msg = f"Failed to convert audio file: {str(e)}"
         logger.error(f"Error converting file: {error_msg}")
         raise RuntimeError(error_msg) from e
@@ -219,7 +574,7 @@ def cleanup_file(file_path):
     try:
         if file_path and os.path.exists(file_path):
             os.remove(file_path)
-            logger.debug(f"Cleaned up file: {file_path}")
+            logger.debug("Cleaned up file: %s", file_path)
             return True
     except Exception as e:
         logger.warning(f"Failed to cleanup file {file_path}: {str(e)}")
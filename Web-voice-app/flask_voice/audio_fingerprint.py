@@ -0,0 +1,223 @@
+"""
+Perceptual audio fingerprints for near-duplicate transcript reuse.
+
+The exact-bytes transcript cache misses the same recording re-exported in
+another format or trimmed by a second. Here each clip gets a compact spectral
+fingerprint (one 32-bit sub-fingerprint per 32ms frame, from the signs of
+energy differences across 33 log-spaced bands, as in Haitsma & Kalker's robust
+audio hash) computed with NumPy from the normalized PCM. Fingerprints live in
+an in-memory inverted index; a lookup votes for (clip, time offset) pairs via
+exactly matching sub-fingerprints, then scores the best alignments by bit
+error rate.
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict, Counter
+
+import numpy as np
+
+from voice_activity import pcm_to_samples
+
+logger = logging.getLogger(__name__)
+
+# Clips kept in the index (0 disables near-duplicate lookup)
+FINGERPRINT_INDEX_SIZE = int(os.environ.get('FINGERPRINT_INDEX_SIZE', '512'))
+# 1 - 2 * bit error rate: 1.0 identical, ~0 unrelated audio
+FINGERPRINT_MIN_CONFIDENCE = float(os.environ.get('FINGERPRINT_MIN_CONFIDENCE', '0.6'))
+# Aligned overlap required, as a fraction of the longer clip
+FINGERPRINT_MIN_COVERAGE = 0.8
+# Shorter clips are too ambiguous to match
+FINGERPRINT_MIN_SECONDS = 2.0
+
+FRAME_SECONDS = 0.256
+HOP_SECONDS = 0.032
+BAND_COUNT = 33              # 33 bands -> 32 bits per frame
+BAND_LOW_HZ = 300.0
+BAND_HIGH_HZ = 2000.0
+FRAMES_PER_CHUNK = 256       # frames transformed at once (bounds memory)
+
+# Sub-fingerprints shared by too many frames carry no information
+_MAX_BUCKET = 64
+_CANDIDATES = 3
+_BIT_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def compute_fingerprint(pcm, sample_rate, sample_width=2):
+    """
+    Fingerprint raw mono PCM.
+
+    Returns:
+        numpy.ndarray: uint32 sub-fingerprints, one per hop (empty if too short)
+    """
+    samples = pcm_to_samples(pcm, sample_width).astype(np.float32)
+    frame_length = int(round(FRAME_SECONDS * sample_rate))
+    hop = int(round(HOP_SECONDS * sample_rate))
+    if samples.size < frame_length + hop:
+        return np.zeros(0, dtype=np.uint32)
+
+    # Normalize level; the hash uses energy differences so only precision matters
+    peak = float(np.max(np.abs(samples)))
+    if peak > 0:
+        samples /= peak
+
+    edges_hz = np.geomspace(BAND_LOW_HZ, min(BAND_HIGH_HZ, sample_rate / 2.0 - 1), BAND_COUNT + 1)
+    edges = np.round(edges_hz * frame_length / float(sample_rate)).astype(int)
+    window = np.hanning(frame_length).astype(np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop]
+
+    energies = np.empty((len(frames), BAND_COUNT), dtype=np.float64)
+    for start in range(0, len(frames), FRAMES_PER_CHUNK):
+        chunk = frames[start:start + FRAMES_PER_CHUNK] * window
+        power = np.abs(np.fft.rfft(chunk, axis=1)) ** 2
+        cumulative = np.concatenate(
+            [np.zeros((len(power), 1)), np.cumsum(power, axis=1)], axis=1
+        )
+        energies[start:start + len(chunk)] = cumulative[:, edges[1:]] - cumulative[:, edges[:-1]]
+
+    log_energy = np.log10(energies + 1e-10)
+    band_diff = log_energy[:, :-1] - log_energy[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    weights = (np.uint64(1) << np.arange(BAND_COUNT - 1, dtype=np.uint64))
+    return (bits.astype(np.uint64) * weights).sum(axis=1).astype(np.uint32)
+
+
+def fingerprint_audio_data(audio_data):
+    """Fingerprint a speech_recognition AudioData object."""
+    return compute_fingerprint(audio_data.frame_data, audio_data.sample_rate, audio_data.sample_width)
+
+
+def bit_error_rate(a, b):
+    """Fraction of differing bits between two equal-length uint32 arrays."""
+    differing = _BIT_COUNTS[np.bitwise_xor(a, b).view(np.uint8)].sum()
+    return differing / float(a.size * 32)
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'text', 'language', 'requested_language')
+
+    def __init__(self, fingerprint, text, language, requested_language):
+        self.fingerprint = fingerprint
+        self.text = text
+        self.language = language
+        self.requested_language = requested_language
+
+
+class FingerprintIndex:
+    """Thread-safe LRU index of transcribed clips searchable by fingerprint similarity."""
+
+    def __init__(self, max_entries=FINGERPRINT_INDEX_SIZE, min_confidence=FINGERPRINT_MIN_CONFIDENCE,
+                 min_coverage=FINGERPRINT_MIN_COVERAGE):
+        self.max_entries = max_entries
+        self.min_confidence = min_confidence
+        self.min_coverage = min_coverage
+        self.matches = 0
+        self.lookups = 0
+        self._entries = OrderedDict()
+        self._postings = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def usable(fingerprint):
+        return fingerprint.size * HOP_SECONDS >= FINGERPRINT_MIN_SECONDS
+
+    def add(self, fingerprint, text, language, requested_language):
+        """Index a transcribed clip."""
+        if not self.enabled or not self.usable(fingerprint):
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(fingerprint, text, language, requested_language)
+            for position, value in enumerate(fingerprint.tolist()):
+                if value in (0, 0xFFFFFFFF):
+                    continue
+                self._postings.setdefault(value, []).append((entry_id, position))
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for value in set(entry.fingerprint.tolist()):
+            postings = self._postings.get(value)
+            if postings is None:
+                continue
+            postings[:] = [posting for posting in postings if posting[0] != entry_id]
+            if not postings:
+                del self._postings[value]
+
+    def lookup(self, fingerprint, language):
+        """
+        Find a previously transcribed near-duplicate.
+
+        Args:
+            fingerprint: Query fingerprint
+            language: Requested language ('auto' accepts any stored language)
+
+        Returns:
+            tuple or None: (text, language, confidence)
+        """
+        if not self.enabled or not self.usable(fingerprint):
+            return None
+
+        with self._lock:
+            self.lookups += 1
+            votes = Counter()
+            for position, value in enumerate(fingerprint.tolist()):
+                postings = self._postings.get(value)
+                if not postings or len(postings) > _MAX_BUCKET:
+                    continue
+                for entry_id, entry_position in postings:
+                    votes[(entry_id, entry_position - position)] += 1
+
+            best = None
+            for (entry_id, offset), count in votes.most_common(_CANDIDATES):
+                if count < 2:
+                    break
+                entry = self._entries[entry_id]
+                if language != 'auto' and language not in (entry.language, entry.requested_language):
+                    continue
+                confidence = self._score(fingerprint, entry.fingerprint, offset)
+                if confidence is not None and (best is None or confidence > best[2]):
+                    best = (entry.text, entry.language, confidence, entry_id)
+
+            if best is None or best[2] < self.min_confidence:
+                return None
+            self._entries.move_to_end(best[3])
+            self.matches += 1
+            return best[0], best[1], round(float(best[2]), 3)
+
+    def _score(self, query, stored, offset):
+        """Confidence (1 - 2 * bit error rate) of the best alignment near `offset`."""
+        best = None
+        for shift in (offset - 1, offset, offset + 1):
+            query_start = max(0, -shift)
+            stored_start = query_start + shift
+            overlap = min(query.size - query_start, stored.size - stored_start)
+            if overlap <= 0 or overlap < self.min_coverage * max(query.size, stored.size):
+                continue
+            error_rate = bit_error_rate(
+                query[query_start:query_start + overlap], stored[stored_start:stored_start + overlap]
+            )
+            confidence = 1.0 - 2.0 * error_rate
+            if best is None or confidence > best:
+                best = confidence
+        return best
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'lookups': self.lookups,
+                'matches': self.matches,
+                'min_confidence': self.min_confidence,
+            }
+
+
+fingerprint_index = FingerprintIndex()
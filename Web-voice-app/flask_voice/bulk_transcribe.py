@@ -0,0 +1,294 @@
+"""
+Offline bulk transcription of a directory tree of recordings.
+
+Backfills an archive without going through the HTTP services: files are
+converted with convert_to_wav() and transcribed with transcribe_speech() in
+a pool of worker processes (one per core by default). Results are appended
+to a JSONL file, one line per input file.
+
+Runs are resumable:
+- files whose content hash already has a successful line in the output are
+  skipped (failed files are retried)
+- files with identical content are transcribed once; the copies get a line
+  marked with "duplicate_of"
+- content hashes are checkpointed next to the output (<output>.checkpoint.json)
+  keyed by path, size and mtime, so a restarted run does not re-read
+  unchanged files to hash them
+
+Example:
+    python bulk_transcribe.py /data/voice-notes --output notes.jsonl --language auto
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+# Imported first: sets up the Python 3.13 aifc shim before speech_recognition loads
+from transcription_engine import DEFAULT_LANGUAGE, validate_language, transcribe_speech
+
+import speech_recognition as sr
+
+from audio_converter import convert_to_wav, cleanup_file, is_supported_format
+from scheduler import BULK
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+# Results written between checkpoint saves
+CHECKPOINT_EVERY = 25
+
+OK = 'ok'
+FAILED = 'failed'
+
+# Per-process state, set by _init_worker
+_worker = {}
+
+
+def find_audio_files(root):
+    """Return the paths of supported audio files under `root`, sorted."""
+    paths = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if is_supported_format(filename):
+                paths.append(os.path.join(directory, filename))
+    return sorted(paths)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _hash_task(path):
+    try:
+        return path, _stat_key(path), file_sha256(path), None
+    except OSError as e:
+        return path, None, None, str(e)
+
+
+class Checkpoint:
+    """Content hashes of already-seen files, keyed by path, size and mtime."""
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f).get('hashes', {})
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            logger.warning("Ignoring unreadable checkpoint %s", path)
+
+    def lookup(self, path):
+        entry = self.hashes.get(path)
+        if entry is None:
+            return None
+        try:
+            if entry[:2] == _stat_key(path):
+                return entry[2]
+        except OSError:
+            pass
+        return None
+
+    def record(self, path, stat_key, sha256):
+        self.hashes[path] = stat_key + [sha256]
+
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'hashes': self.hashes}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+
+def load_completed(output_path):
+    """
+    Read the successful results already in the output file.
+
+    Returns:
+        dict: {sha256: relative path of the file that produced it}
+    """
+    completed = {}
+    try:
+        with open(output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial last line from an interrupted run
+                if entry.get('status') == OK and entry.get('sha256'):
+                    completed.setdefault(entry['sha256'], entry.get('path'))
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+def _init_worker(language, work_dir, log_level):
+    logging.basicConfig(level=log_level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    _worker.update(language=language, work_dir=work_dir, recognizer=sr.Recognizer())
+
+
+def _transcribe_task(task):
+    """Convert and transcribe one file in a worker process."""
+    path, sha256 = task
+    started = time.monotonic()
+    result = {'sha256': sha256}
+    wav_path = None
+    try:
+        wav_path = convert_to_wav(path, output_dir=_worker['work_dir'])
+        details = {}
+        text, error_message, language, trimmed_seconds = transcribe_speech(
+            wav_path, _worker['language'], _worker['recognizer'], BULK, details
+        )
+        if text and details.get('incomplete'):
+            # Partial transcript: keep it, but leave the file to be retried on the next run
+            result.update(status=FAILED, error=f"Recognition failed for segments {details['failed_segments']}",
+                          text=text, language=language)
+        elif text:
+            result.update(status=OK, text=text, language=language, trimmed_seconds=round(trimmed_seconds, 2),
+                          transcript_source=details.get('transcript_source', 'recognizer'))
+        else:
+            result.update(status=FAILED, error=error_message or "No speech recognized", language=language)
+    except Exception as e:
+        result.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+    finally:
+        if wav_path and wav_path != path:
+            cleanup_file(wav_path)
+    result['elapsed_seconds'] = round(time.monotonic() - started, 2)
+    return path, result
+
+
+def hash_files(pool, paths, checkpoint):
+    """
+    Content hashes of `paths`, reusing checkpointed ones.
+
+    Returns:
+        dict: {path: sha256} (unreadable files are reported and left out)
+    """
+    hashes = {}
+    pending = []
+    for path in paths:
+        sha256 = checkpoint.lookup(path)
+        if sha256:
+            hashes[path] = sha256
+        else:
+            pending.append(path)
+
+    for path, stat_key, sha256, error in pool.imap_unordered(_hash_task, pending, chunksize=8):
+        if error:
+            print(f"  cannot read {path}: {error}", file=sys.stderr)
+            continue
+        hashes[path] = sha256
+        checkpoint.record(path, stat_key, sha256)
+    if pending:
+        checkpoint.save()
+    return hashes
+
+
+def run(args):
+    language, language_error = validate_language(args.language)
+    if language_error:
+        raise SystemExit(language_error)
+
+    root = os.path.abspath(args.directory)
+    output_path = os.path.abspath(args.output)
+    checkpoint = Checkpoint(output_path + '.checkpoint.json')
+    completed = load_completed(output_path)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bulk_transcribe_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    paths = find_audio_files(root)
+    print(f"Found {len(paths)} audio files under {root} ({len(completed)} transcripts already in {args.output})")
+
+    pool = multiprocessing.Pool(args.processes, initializer=_init_worker,
+                                initargs=(language, work_dir, args.log_level))
+    try:
+        hashes = hash_files(pool, paths, checkpoint)
+
+        # One transcription per distinct content not already in the output
+        originals = {}
+        duplicates = {}
+        for path in paths:
+            sha256 = hashes.get(path)
+            if sha256 is None or sha256 in completed:
+                continue
+            if sha256 in originals:
+                duplicates.setdefault(sha256, []).append(path)
+            else:
+                originals[sha256] = path
+        skipped = sum(1 for path in paths if hashes.get(path) in completed)
+        tasks = [(path, sha256) for sha256, path in originals.items()]
+        print(f"Transcribing {len(tasks)} files with {args.processes} processes "
+              f"({skipped} already done, {sum(map(len, duplicates.values()))} duplicates)")
+
+        started = time.monotonic()
+        counts = {OK: 0, FAILED: 0}
+        with open(output_path, 'a', encoding='utf-8') as output:
+            for done, (path, result) in enumerate(pool.imap_unordered(_transcribe_task, tasks), 1):
+                relative = os.path.relpath(path, root)
+                lines = [dict(path=relative, **result)]
+                for copy in duplicates.get(result['sha256'], []):
+                    lines.append(dict(path=os.path.relpath(copy, root), duplicate_of=relative, **result))
+                for line in lines:
+                    output.write(json.dumps(line, ensure_ascii=False) + '\n')
+                output.flush()
+                counts[result['status']] += len(lines)
+
+                rate = done / max(time.monotonic() - started, 1e-6)
+                print(f"[{done}/{len(tasks)}] {result['status']:6} {relative} ({result['elapsed_seconds']}s, "
+                      f"{rate:.2f} files/s)", flush=True)
+                if done % CHECKPOINT_EVERY == 0:
+                    os.fsync(output.fileno())
+                    checkpoint.save()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print("\nInterrupted; rerun the same command to resume.")
+        raise SystemExit(130)
+    else:
+        pool.close()
+    finally:
+        pool.join()
+        checkpoint.save()
+        if not args.work_dir:
+            try:
+                os.rmdir(work_dir)
+            except OSError:
+                pass
+
+    elapsed = time.monotonic() - started
+    print(f"Done in {elapsed:.1f}s: {counts[OK]} transcribed, {counts[FAILED]} failed, {skipped} skipped")
+    return 0 if counts[FAILED] == 0 else 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe every recording under a directory to JSONL.")
+    parser.add_argument('directory', help="root of the recordings to transcribe")
+    parser.add_argument('--output', '-o', default='transcripts.jsonl', help="JSONL results file (appended to)")
+    parser.add_argument('--language', '-l', default=DEFAULT_LANGUAGE, help="language code, or 'auto'")
+    parser.add_argument('--processes', '-p', type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: number of cores)")
+    parser.add_argument('--work-dir', help="directory for converted WAVs (default: a temp directory)")
+    parser.add_argument('--log-level', default='WARNING', help="worker log level (default WARNING)")
+    args = parser.parse_args(argv)
+    if args.processes < 1:
+        parser.error("--processes must be at least 1")
+    args.log_level = args.log_level.upper()
+    return args
+
+
+if __name__ == '__main__':
+    sys.exit(run(parse_args()))
@@ -1,138 +1,53 @@
-# Fix for Python 3.13 compatibility - aifc was removed
-# MUST be before any other imports that might trigger speech_recognition import
-import sys
-import types
+"""
+Flask service for transcribing microphone recordings (voice commands).
+"""
 
-# Create aifc stub immediately for Python 3.13+
-if sys.version_info >= (3, 13):
-    if 'aifc' not in sys.modules:
-        # Create minimal aifc stub
-        aifc_stub = types.ModuleType('aifc')
-        aifc_stub.Error = Exception
-        # Add open function stub
-        def aifc_open(*args, **kwargs):
-            raise NotImplementedError("aifc.open() not available in Python 3.13+")
-        aifc_stub.open = aifc_open
-        sys.modules['aifc'] = aifc_stub
-
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import speech_recognition as sr
 import io
 import logging
-from langdetect import detect, LangDetectException
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Imported first: sets up the Python 3.13 aifc shim before speech_recognition loads
+from transcription_engine import (
+    SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE, MIC_AUTO_DETECT_LANGUAGES, validate_language, recognize
+)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS
+from flask import Blueprint, Flask, request, jsonify
+from flask_cors import CORS
+import speech_recognition as sr
 
-# Supported languages for Google Speech Recognition
-# Format: language code (e.g., 'en-US', 'es-ES', 'fr-FR')
-# See: https://cloud.google.com/speech-to-text/docs/languages
-SUPPORTED_LANGUAGES = {
-    'auto': 'Auto Detect',
-    'en-US': 'English (United States)',
-    'en-GB': 'English (United Kingdom)',
-    'es-ES': 'Spanish (Spain)',
-    'es-MX': 'Spanish (Mexico)',
-    'fr-FR': 'French (France)',
-    'de-DE': 'German (Germany)',
-    'it-IT': 'Italian (Italy)',
-    'pt-BR': 'Portuguese (Brazil)',
-    'pt-PT': 'Portuguese (Portugal)',
-    'ru-RU': 'Russian (Russia)',
-    'ja-JP': 'Japanese (Japan)',
-    'ko-KR': 'Korean (Korea)',
-    'zh-CN': 'Chinese (Simplified, China)',
-    'zh-TW': 'Chinese (Traditional, Taiwan)',
-    'ar-SA': 'Arabic (Saudi Arabia)',
-    'ar-EG': 'Arabic (Egypt)',
-    'hi-IN': 'Hindi (India)',
-    'nl-NL': 'Dutch (Netherlands)',
-    'pl-PL': 'Polish (Poland)',
-    'tr-TR': 'Turkish (Turkey)',
-    'sv-SE': 'Swedish (Sweden)',
-    'da-DK': 'Danish (Denmark)',
-    'no-NO': 'Norwegian (Norway)',
-    'fi-FI': 'Finnish (Finland)',
-    'cs-CZ': 'Czech (Czech Republic)',
-    'hu-HU': 'Hungarian (Hungary)',
-    'ro-RO': 'Romanian (Romania)',
-    'th-TH': 'Thai (Thailand)',
-    'vi-VN': 'Vietnamese (Vietnam)',
-    'id-ID': 'Indonesian (Indonesia)',
-    'ms-MY': 'Malay (Malaysia)',
-    'he-IL': 'Hebrew (Israel)',
-    'uk-UA': 'Ukrainian (Ukraine)',
-    'el-GR': 'Greek (Greece)',
-}
+from voice_activity import prepare_audio
+from audio_converter import (
+    sniff_container, decode_audio_bytes, find_ffmpeg, MemoryLimitError, WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH
+)
+from async_support import run_cpu_bound
+from scheduler import classify, recognition_scheduler
+from structured_logging import configure_logging, init_app
+import tracing
+import readiness
+import request_profiling
 
-# Languages to try for auto-detection (in order of priority)
-AUTO_DETECT_LANGUAGES = [ 'en-US','ar-EG','ar-SA','fr-FR',  'en-GB',  'es-ES', 'de-DE', 'it-IT', 'pt-BR', 'ru-RU', 'ja-JP', 'ko-KR', 'zh-CN', 'nl-NL', 'tr-TR', 'hi-IN', 'sv-SE', 'pl-PL']
+# Configure logging (queued, structured, tagged with the request id)
+configure_logging()
+logger = logging.getLogger(__name__)
 
-# Mapping from langdetect codes to Google language codes
-LANG_DETECT_MAP = {
-    'en': ['en-US', 'en-GB'],
-    'es': ['es-ES', 'es-MX'],
-    'fr': ['fr-FR'],
-    'de': ['de-DE'],
-    'it': ['it-IT'],
-    'pt': ['pt-BR', 'pt-PT'],
-    'ru': ['ru-RU'],
-    'ja': ['ja-JP'],
-    'ko': ['ko-KR'],
-    'zh': ['zh-CN', 'zh-TW'],
-    'ar': ['ar-SA', 'ar-EG'],
-    'hi': ['hi-IN'],
-    'nl': ['nl-NL'],
-    'pl': ['pl-PL'],
-    'tr': ['tr-TR'],
-    'sv': ['sv-SE'],
-    'da': ['da-DK'],
-    'no': ['no-NO'],
-    'fi': ['fi-FI'],
-    'cs': ['cs-CZ'],
-    'hu': ['hu-HU'],
-    'ro': ['ro-RO'],
-    'th': ['th-TH'],
-    'vi': ['vi-VN'],
-    'id': ['id-ID'],
-    'ms': ['ms-MY'],
-    'he': ['he-IL'],
-    'uk': ['uk-UA'],
-    'el': ['el-GR'],
-}
+# Containers decoded with ffmpeg; anything else goes to sr.AudioFile (WAV/AIFF/FLAC)
+COMPRESSED_CONTAINERS = ('webm', 'ogg')
 
-def validate_language(language_code):
-    """Validate if language code is supported."""
-    # Handle None, empty string, or whitespace-only strings
-    if not language_code or (isinstance(language_code, str) and not language_code.strip()):
-        return 'en-US', None
-    # Strip whitespace and normalize
-    language_code = language_code.strip() if isinstance(language_code, str) else language_code
-    if language_code in SUPPORTED_LANGUAGES:
-        return language_code, None
-    return None, f"Unsupported language code: {language_code}. Supported languages: {', '.join(SUPPORTED_LANGUAGES.keys())}"
+mic_blueprint = Blueprint('microphone', __name__)
 
-@app.route("/languages", methods=["GET"])
+@mic_blueprint.route("/languages", methods=["GET"])
 def get_languages():
     """Get list of supported languages."""
     return jsonify({
         "languages": SUPPORTED_LANGUAGES,
-        "default": "en-US"
+        "default": DEFAULT_LANGUAGE
     }), 200
 
-@app.route("/transcribe", methods=["POST"])
+@mic_blueprint.route("/transcribe", methods=["POST"])
 def transcribe():
     try:
-        logger.info("Transcribe request received")
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Content-Type: {request.content_type}")
-        logger.info(f"Files received: {list(request.files.keys())}")
-        logger.info(f"Form data keys: {list(request.form.keys())}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Transcribe request: content_type=%s files=%s form=%s",
+                         request.content_type, ','.join(request.files.keys()), ','.join(request.form.keys()))
         
         # Get language parameter from form data or JSON
         # For multipart/form-data (file uploads), use request.form
@@ -144,20 +59,15 @@ def transcribe():
             # For multipart/form-data requests
             language = request.form.get('language')
         
-        logger.info(f"Received language parameter: {language}")
         language, language_error = validate_language(language)
         
         if language_error:
-            logger.warning(f"Language validation error: {language_error}")
+            logger.warning("Language validation error: %s", language_error)
             return jsonify({"error": language_error}), 400
         
-        logger.info(f"Using language: {language} ({SUPPORTED_LANGUAGES.get(language, 'Unknown')})")
-        
         # Check if request has files
         if not request.files:
-            logger.error("No files in request")
-            logger.error(f"Request content type: {request.content_type}")
-            logger.error(f"Request form keys: {list(request.form.keys())}")
+            logger.error("No files in request (content type: %s)", request.content_type)
             return jsonify({
                 "error": "No files provided in request",
                 "content_type": request.content_type,
@@ -166,7 +76,7 @@ def transcribe():
         
         # Check if audio file is present
         if "audio" not in request.files:
-            logger.error(f"Audio file not found. Available keys: {list(request.files.keys())}")
+            logger.error("Audio file not found in request")
             return jsonify({
                 "error": "No audio file provided",
                 "available_keys": list(request.files.keys())
@@ -179,9 +89,6 @@ def transcribe():
             logger.error("Empty filename")
             return jsonify({"error": "No file selected"}), 400
         
-        logger.info(f"Processing file: {audio_file.filename}")
-        logger.info(f"Content type: {audio_file.content_type}")
-        
         # Read audio file
         audio_data = audio_file.read()
         
@@ -189,114 +96,108 @@ def transcribe():
             logger.error("Audio file is empty")
             return jsonify({"error": "Audio file is empty"}), 400
         
-        logger.info(f"Audio file size: {len(audio_data)} bytes")
-        
-        # Create BytesIO object
-        audio_bytes = io.BytesIO(audio_data)
+        # Browsers send MediaRecorder output (WebM/Opus or OGG) as-is; WAV is still accepted
+        container = sniff_container(audio_data)
+        logger.info("Transcribing %d byte %s recording (language: %s)",
+                    len(audio_data), container or 'unknown', language)
         
-        # Reset file pointer to beginning
-        audio_bytes.seek(0)
+        if container in COMPRESSED_CONTAINERS and find_ffmpeg() is None:
+            logger.error("Cannot decode %s recording: ffmpeg is not installed", container)
+            return jsonify({
+                "error": f"Compressed audio ({container}) is not supported on this server",
+                "message": "Please send the recording as WAV."
+            }), 415
         
         recognizer = sr.Recognizer()
         
         try:
-            # Try to open as AudioFile
-            with sr.AudioFile(audio_bytes) as source:
-                logger.info("Audio file opened successfully")
-                
-                # Adjust for ambient noise
-                try:
-                    recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    logger.info("Adjusted for ambient noise")
-                except Exception as e:
-                    logger.warning(f"Could not adjust for ambient noise: {str(e)}")
-                
-                # Read audio data
-                audio = recognizer.record(source)
-                logger.info(f"Audio recorded: {len(audio.frame_data)} bytes")
+            if container in COMPRESSED_CONTAINERS:
+                # Decode in memory (ffmpeg pipes) straight to 16kHz mono PCM
+                with tracing.span('decode', container=container, encoded_bytes=len(audio_data)):
+                    pcm = decode_audio_bytes(audio_data, container)
+                audio = sr.AudioData(pcm, WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH)
+            else:
+                # Try to open as AudioFile
+                with sr.AudioFile(io.BytesIO(audio_data)) as source:
+                    # Read audio data
+                    audio = recognizer.record(source)
             
-            # Transcribe audio with specified language
-            logger.info(f"Starting transcription with language: {language}...")
+            # Estimate ambient noise from the loaded buffer (nothing is discarded)
+            # and drop silence so only speech is sent to the recognizer
+            with tracing.span('prepare'):
+                audio, trimmed_seconds = run_cpu_bound(prepare_audio, audio)
             
-            if language == "auto":
-                # Auto-detect language by trying common languages
-                text = None
-                detected_lang = None
-                for lang in AUTO_DETECT_LANGUAGES:
-                    try:
-                        logger.info(f"Trying language: {lang}")
-                        candidate_text = recognizer.recognize_google(audio, language=lang)
-                        # Verify the detected language matches
-                        try:
-                            detected_lang_code = detect(candidate_text)
-                            if detected_lang_code in LANG_DETECT_MAP and lang in LANG_DETECT_MAP[detected_lang_code]:
-                                text = candidate_text
-                                detected_lang = lang
-                                logger.info(f"Auto-detected language: {lang} - {text[:50]}...")
-                                break
-                            else:
-                                logger.debug(f"Language mismatch: transcribed in {lang} but detected as {detected_lang_code}")
-                                continue
-                        except LangDetectException:
-                            logger.debug(f"Could not detect language for text from {lang}")
-                            continue
-                    except sr.UnknownValueError:
-                        logger.debug(f"No speech detected for {lang}")
-                        continue
-                    except sr.RequestError as e:
-                        logger.warning(f"Request error with {lang}: {e}")
-                        continue
-                
-                if not text:
-                    raise sr.UnknownValueError("Could not understand audio in any supported language")
-                
-                language = detected_lang
-            else:
-                text = recognizer.recognize_google(audio, language=language)
-                logger.info(f"Transcription successful: {text[:50]}...")
+            # Short voice commands are scheduled ahead of long file jobs
+            duration = len(audio.frame_data) / float(audio.sample_rate * audio.sample_width)
+            priority_class = classify('microphone', duration)
+            details = {}
+            text, language = recognize(audio, language, recognizer, MIC_AUTO_DETECT_LANGUAGES, priority_class, details)
+            logger.info("Transcription successful (%d chars, %s)", len(text), details.get('transcript_source'))
             
-            return jsonify({
+            response = {
                 "text": text,
                 "language": language,
-                "language_name": SUPPORTED_LANGUAGES.get(language, "Unknown")
-            })
+                "language_name": SUPPORTED_LANGUAGES.get(language, "Unknown"),
+                "silence_trimmed_seconds": round(trimmed_seconds, 2),
+                "transcript_source": details.get('transcript_source', 'recognizer')
+            }
+            if 'match_confidence' in details:
+                response["match_confidence"] = details['match_confidence']
+            return jsonify(response)
         
         except sr.UnknownValueError:
             logger.error("Could not understand audio")
             return jsonify({"error": "Could not understand audio. Please ensure the audio contains clear speech."}), 400
         
         except sr.RequestError as e:
-            logger.error(f"Recognition service error: {str(e)}")
+            logger.error("Recognition service error: %s", e)
             return jsonify({
                 "error": f"Recognition service error: {str(e)}",
                 "message": "Please check your internet connection and try again."
             }), 500
         
         except ValueError as e:
-            logger.error(f"Audio format error: {str(e)}")
+            logger.error("Audio format error: %s", e)
+            return jsonify({
+                "error": f"Invalid audio format: {str(e)}",
+                "message": "Please send WAV, WebM/Opus or OGG audio."
+            }), 400
+        
+        except MemoryLimitError as e:
+            logger.warning("Decode rejected: %s", e)
+            return jsonify({"error": str(e)}), 503
+        
+        except RuntimeError as e:
+            logger.error("Audio decode error: %s", e)
             return jsonify({
                 "error": f"Invalid audio format: {str(e)}",
-                "message": "Please ensure the audio file is in WAV format."
+                "message": "Please send WAV, WebM/Opus or OGG audio."
             }), 400
         
         except Exception as e:
-            logger.error(f"Unexpected error during transcription: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Unexpected error during transcription")
             return jsonify({
                 "error": f"Error processing audio: {str(e)}",
                 "type": type(e).__name__
             }), 500
     
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Unexpected error")
         return jsonify({
             "error": f"Server error: {str(e)}",
             "type": type(e).__name__
         }), 500
 
+app = Flask(__name__)
+CORS(app)  # Enable CORS
+init_app(app)
+tracing.init_app(app)
+# WebM/Opus recordings are decoded with ffmpeg
+readiness.init_app(app, requires_converter=True)
+request_profiling.init_app(app)
+app.register_blueprint(mic_blueprint)
+
+
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint"""
@@ -304,7 +205,8 @@ def health():
         "status": "healthy",
         "message": "Transcription service is running",
         "supported_languages_count": len(SUPPORTED_LANGUAGES),
-        "default_language": "en-US"
+        "default_language": DEFAULT_LANGUAGE,
+        "scheduler": recognition_scheduler.stats()
     }), 200
 
 if __name__ == "__main__":
@@ -313,8 +215,9 @@ if __name__ == "__main__":
     print("=" * 60)
     print("Starting server on http://localhost:5003")
     print("Endpoints:")
-    print("  POST /transcribe - Transcribe audio file from microphone")
+    print("  POST /transcribe - Transcribe microphone audio (WAV, WebM/Opus, OGG)")
     print("  GET  /languages - Get supported languages")
     print("  GET  /health - Health check")
+    print("  GET  /ready - Readiness (503 when saturated)")
     print("=" * 60)
     app.run(host='0.0.0.0', port=5003, debug=True)
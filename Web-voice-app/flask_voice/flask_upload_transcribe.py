@@ -3,141 +3,62 @@ Flask service for transcribing uploaded audio files.
 Handles file uploads, converts audio formats, and transcribes to text.
 """
 
-# Fix for Python 3.13 compatibility - aifc was removed
-# MUST be before any other imports that might trigger speech_recognition import
-import sys
-import types
-
-if sys.version_info >= (3, 13):
-    if 'aifc' not in sys.modules:
-        aifc_stub = types.ModuleType('aifc')
-        aifc_stub.Error = Exception
-        def aifc_open(*args, **kwargs):
-            raise NotImplementedError("aifc.open() not available in Python 3.13+")
-        aifc_stub.open = aifc_open
-        sys.modules['aifc'] = aifc_stub
-
 import os
 import io
 import logging
 from werkzeug.utils import secure_filename
 from pathlib import Path
 
-from flask import Flask, request, jsonify
+# Imported first: sets up the Python 3.13 aifc shim before speech_recognition loads
+from transcription_engine import (
+    SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE, validate_language,
+    transcribe_speech, recognize_segments, recognize_pcm
+)
+
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
 import speech_recognition as sr
-from langdetect import detect, LangDetectException
-
 
-from audio_converter import convert_to_wav, cleanup_file
+from audio_converter import (
+    convert_to_wav, cleanup_file, find_ffmpeg, pipelined_pcm_segments, MemoryLimitError,
+    WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH
+)
+from scheduler import classify, estimate_duration_seconds, recognition_scheduler
+from structured_logging import configure_logging, init_app
+import tracing
+import readiness
+import request_profiling
+from spool import UploadSpool, SpoolFullError
+from resumable_upload import (
+    ResumableUploadManager, UploadError, RECOMMENDED_CHUNK_SIZE, MAX_RESUMABLE_UPLOAD_SIZE
+)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queued, structured, tagged with the request id)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-# Enable CORS with explicit configuration for all origins
-CORS(app, resources={
-    r"/*": {
-        "origins": "*",
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
 # Configuration
 UPLOAD_FOLDER = os.path.normpath('uploads')
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'mp4', 'm4a', 'flac', 'ogg', 'webm', 'aac', 'wma'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+# Recognize decoded segments while the rest of the file is still being decoded
+PIPELINED_TRANSCRIPTION = os.environ.get('PIPELINED_TRANSCRIPTION', '1') != '0'
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
-
-# Supported languages for Google Speech Recognition
-# Format: language code (e.g., 'en-US', 'es-ES', 'fr-FR')
-# See: https://cloud.google.com/speech-to-text/docs/languages
-SUPPORTED_LANGUAGES = {
-    'auto': 'Auto Detect',
-    'en-US': 'English (United States)',
-    'en-GB': 'English (United Kingdom)',
-    'es-ES': 'Spanish (Spain)',
-    'es-MX': 'Spanish (Mexico)',
-    'fr-FR': 'French (France)',
-    'de-DE': 'German (Germany)',
-    'it-IT': 'Italian (Italy)',
-    'pt-BR': 'Portuguese (Brazil)',
-    'pt-PT': 'Portuguese (Portugal)',
-    'ru-RU': 'Russian (Russia)',
-    'ja-JP': 'Japanese (Japan)',
-    'ko-KR': 'Korean (Korea)',
-    'zh-CN': 'Chinese (Simplified, China)',
-    'zh-TW': 'Chinese (Traditional, Taiwan)',
-    'ar-SA': 'Arabic (Saudi Arabia)',
-    'ar-EG': 'Arabic (Egypt)',
-    'hi-IN': 'Hindi (India)',
-    'nl-NL': 'Dutch (Netherlands)',
-    'pl-PL': 'Polish (Poland)',
-    'tr-TR': 'Turkish (Turkey)',
-    'sv-SE': 'Swedish (Sweden)',
-    'da-DK': 'Danish (Denmark)',
-    'no-NO': 'Norwegian (Norway)',
-    'fi-FI': 'Finnish (Finland)',
-    'cs-CZ': 'Czech (Czech Republic)',
-    'hu-HU': 'Hungarian (Hungary)',
-    'ro-RO': 'Romanian (Romania)',
-    'th-TH': 'Thai (Thailand)',
-    'vi-VN': 'Vietnamese (Vietnam)',
-    'id-ID': 'Indonesian (Indonesia)',
-    'ms-MY': 'Malay (Malaysia)',
-    'he-IL': 'Hebrew (Israel)',
-    'uk-UA': 'Ukrainian (Ukraine)',
-    'el-GR': 'Greek (Greece)',
+# CORS settings shared with the unified service
+CORS_RESOURCES = {
+    r"/*": {
+        "origins": "*",
+        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "Upload-Offset", "X-Chunk-SHA256",
+                          "X-Request-ID", "traceparent", "X-Profile-Request", "X-Profile-Mode"],
+        "expose_headers": ["X-Request-ID", "traceresponse", "X-Profile-Id"]
+    }
 }
 
-# Languages to try for auto-detection (in order of priority)
-AUTO_DETECT_LANGUAGES = ['ar-SA',  'en-US', 'ar-EG',  'en-GB', 'fr-FR', 'es-ES', 'de-DE', 'it-IT', 'pt-BR', 'ru-RU', 'ja-JP', 'ko-KR', 'zh-CN', 'nl-NL', 'tr-TR', 'hi-IN', 'sv-SE', 'pl-PL']
-
-# Mapping from langdetect codes to Google language codes
-LANG_DETECT_MAP = {
-    'en': ['en-US', 'en-GB'],
-    'es': ['es-ES', 'es-MX'],
-    'fr': ['fr-FR'],
-    'de': ['de-DE'],
-    'it': ['it-IT'],
-    'pt': ['pt-BR', 'pt-PT'],
-    'ru': ['ru-RU'],
-    'ja': ['ja-JP'],
-    'ko': ['ko-KR'],
-    'zh': ['zh-CN', 'zh-TW'],
-    'ar': ['ar-SA', 'ar-EG'],
-    'hi': ['hi-IN'],
-    'nl': ['nl-NL'],
-    'pl': ['pl-PL'],
-    'tr': ['tr-TR'],
-    'sv': ['sv-SE'],
-    'da': ['da-DK'],
-    'no': ['no-NO'],
-    'fi': ['fi-FI'],
-    'cs': ['cs-CZ'],
-    'hu': ['hu-HU'],
-    'ro': ['ro-RO'],
-    'th': ['th-TH'],
-    'vi': ['vi-VN'],
-    'id': ['id-ID'],
-    'ms': ['ms-MY'],
-    'he': ['he-IL'],
-    'uk': ['uk-UA'],
-    'el': ['el-GR'],
-}
+# Temp uploads and converted WAVs: quota-enforced, orphans reclaimed by owner pid and age
+upload_spool = UploadSpool(UPLOAD_FOLDER)
 
-def validate_language(language_code):
-    """Validate if language code is supported."""
-    if not language_code:
-        return 'en-US', None
-    if language_code in SUPPORTED_LANGUAGES:
-        return language_code, None
-    return None, f"Unsupported language code: {language_code}. Supported languages: {', '.join(SUPPORTED_LANGUAGES.keys())}"
+upload_blueprint = Blueprint('upload', __name__)
 
 
 def allowed_file(filename):
@@ -147,85 +68,16 @@ def allowed_file(filename):
     return filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-@app.route("/api/languages", methods=["GET"])
+@upload_blueprint.route("/api/languages", methods=["GET"])
 def get_languages():
     """Get list of supported languages."""
     return jsonify({
         "languages": SUPPORTED_LANGUAGES,
-        "default": "en-US"
+        "default": DEFAULT_LANGUAGE
     }), 200
 
 
-def transcribe_speech(audio_path, language, recognizer):
-    """
-    Transcribe speech audio using speech recognition.
-    
-    Returns:
-        tuple: (transcribed_text, error_message, detected_language)
-    """
-    text = None
-    error_message = None
-    detected_language = language
-    
-    try:
-        with sr.AudioFile(audio_path) as source:
-            try:
-                recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            except Exception:
-                pass  # Ignore ambient noise adjustment errors
-            
-            audio_data = recognizer.record(source)
-        
-        # Try Google Speech Recognition
-        if language == "auto":
-            # Auto-detect language by trying common languages
-            for lang in AUTO_DETECT_LANGUAGES:
-                try:
-                    logger.info(f"Trying language: {lang}")
-                    candidate_text = recognizer.recognize_google(audio_data, language=lang)
-                    # Verify the detected language matches
-                    try:
-                        detected_lang_code = detect(candidate_text)
-                        if detected_lang_code in LANG_DETECT_MAP and lang in LANG_DETECT_MAP[detected_lang_code]:
-                            text = candidate_text
-                            detected_language = lang
-                            logger.info(f"Auto-detected language: {lang} - {text[:50]}...")
-                            break
-                        else:
-                            logger.debug(f"Language mismatch: transcribed in {lang} but detected as {detected_lang_code}")
-                            continue
-                    except LangDetectException:
-                        logger.debug(f"Could not detect language for text from {lang}")
-                        continue
-                except sr.UnknownValueError:
-                    logger.debug(f"No speech detected for {lang}")
-                    continue
-                except sr.RequestError as e:
-                    logger.warning(f"Request error with {lang}: {e}")
-                    continue
-            
-            if not text:
-                error_message = "Could not understand the audio. The audio may contain only music, noise, or unclear speech in any supported language."
-                logger.warning(error_message)
-        else:
-            try:
-                text = recognizer.recognize_google(audio_data, language=language)
-                logger.info(f"Transcription successful ({len(text)} chars)")
-            except sr.UnknownValueError:
-                error_message = "Could not understand the audio. The audio may contain only music, noise, or unclear speech."
-                logger.warning(error_message)
-            except sr.RequestError as e:
-                error_message = f"Recognition service error: {str(e)}"
-                logger.error(error_message)
-    
-    except Exception as e:
-        error_message = f"Error transcribing speech: {str(e)}"
-        logger.error(error_message)
-    
-    return text, error_message, detected_language
-
-
-@app.route("/api/analyze-file", methods=["POST"])
+@upload_blueprint.route("/api/analyze-file", methods=["POST"])
 def analyze_file():
     """Analyze file to determine if conversion is needed."""
     try:
@@ -265,11 +117,10 @@ def analyze_file():
         return jsonify({"error": f"Error analyzing file: {str(e)}"}), 500
 
 
-@app.route("/api/transcribe-file", methods=["POST"])
+@upload_blueprint.route("/api/transcribe-file", methods=["POST"])
 def transcribe_file():
     """Upload audio file, convert to WAV if needed, and transcribe."""
     temp_upload_path = None
-    temp_wav_path = None
     
     try:
         # Validate file
@@ -284,41 +135,76 @@ def transcribe_file():
             return jsonify({"success": False, "error": f"Invalid file type. Supported: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
         
         # Get and validate language parameter
-        language = request.form.get('language', 'en-US')
+        language = request.form.get('language', DEFAULT_LANGUAGE)
         language, language_error = validate_language(language)
         
         if language_error:
             logger.warning(f"Language validation error: {language_error}")
             return jsonify({"success": False, "error": language_error}), 400
         
-        logger.info(f"Processing file: {audio_file.filename} with language: {language} ({SUPPORTED_LANGUAGES.get(language, 'Unknown')})")
+        logger.info("Processing upload %s (language: %s)", audio_file.filename, language)
         
-        # Save uploaded file
+        # Save uploaded file (small uploads may land on the RAM-backed spool)
         filename = secure_filename(audio_file.filename)
-        upload_folder = os.path.normpath(app.config['UPLOAD_FOLDER'])
-        temp_upload_path = os.path.normpath(os.path.join(
-            upload_folder,
-            f"temp_{os.urandom(8).hex()}_{filename}"
-        ))
+        try:
+            temp_upload_path = os.path.normpath(upload_spool.new_path('temp', filename, request.content_length))
+        except SpoolFullError as e:
+            temp_upload_path = None
+            logger.warning("Upload rejected: %s", e)
+            return jsonify({"success": False, "error": str(e)}), 507
         
-        os.makedirs(upload_folder, exist_ok=True)
-        audio_file.save(temp_upload_path)
+        with tracing.span('save') as save_span:
+            audio_file.save(temp_upload_path)
+            if save_span is not None:
+                save_span.set(bytes=os.path.getsize(temp_upload_path))
         
         if not os.path.exists(temp_upload_path):
             return jsonify({"success": False, "error": "Failed to save uploaded file"}), 500
         
+        return _convert_and_transcribe(temp_upload_path, filename, language)
+            
+    except Exception as e:
+        cleanup_file(temp_upload_path)
+        logger.error(f"Error processing audio: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": f"Error processing audio: {str(e)}"
+        }), 500
+
+
+def _convert_and_transcribe(temp_upload_path, filename, language, extra_metadata=None):
+    """
+    Convert a saved upload to WAV if needed, transcribe it and clean up.
+    
+    Returns:
+        tuple: (Flask response, status code)
+    """
+    temp_wav_path = None
+    
+    try:
         # Check if conversion is needed
         file_ext = Path(filename).suffix.lower()
         is_wav = file_ext == '.wav'
         
+        # Long files are scheduled behind short ones for recognizer time
+        priority_class = classify('upload', estimate_duration_seconds(
+            os.path.getsize(temp_upload_path), is_wav, temp_upload_path
+        ))
+        
+        if not is_wav and PIPELINED_TRANSCRIPTION and find_ffmpeg():
+            return _pipelined_transcribe(temp_upload_path, file_ext, language, priority_class, extra_metadata)
+        
         if is_wav:
             audio_path = os.path.normpath(temp_upload_path)
         else:
             # Convert to WAV using audio_converter
-            logger.info(f"Converting {file_ext} to WAV...")
+            logger.info("Converting %s to WAV", file_ext)
             try:
-                output_dir = os.path.normpath(app.config['UPLOAD_FOLDER'])
-                temp_wav_path = convert_to_wav(temp_upload_path, output_dir=output_dir)
+                expected_wav_bytes = int(estimate_duration_seconds(os.path.getsize(temp_upload_path), False)
+                                         * WAV_SAMPLE_RATE * WAV_SAMPLE_WIDTH)
+                output_path = upload_spool.new_path('converted', f"{Path(filename).stem}.wav", expected_wav_bytes)
+                with tracing.span('convert', format=file_ext):
+                    temp_wav_path = convert_to_wav(temp_upload_path, output_path=output_path)
                 temp_wav_path = os.path.normpath(temp_wav_path)
                 audio_path = temp_wav_path
                 
@@ -327,6 +213,14 @@ def transcribe_file():
             except ImportError as e:
                 cleanup_file(temp_upload_path)
                 return jsonify({"success": False, "error": str(e)}), 500
+            except MemoryLimitError as e:
+                cleanup_file(temp_upload_path)
+                logger.warning(f"Conversion rejected: {str(e)}")
+                return jsonify({"success": False, "error": str(e)}), 503
+            except SpoolFullError as e:
+                cleanup_file(temp_upload_path)
+                logger.warning("Conversion rejected: %s", e)
+                return jsonify({"success": False, "error": str(e)}), 507
             except (ValueError, RuntimeError, FileNotFoundError) as e:
                 cleanup_file(temp_upload_path)
                 return jsonify({"success": False, "error": f"Audio conversion failed: {str(e)}"}), 400
@@ -340,7 +234,11 @@ def transcribe_file():
         
         # Transcribe
         recognizer = sr.Recognizer()
-        text, error_message, detected_language = transcribe_speech(audio_path, language, recognizer)
+        details = {}
+        text, error_message, detected_language, trimmed_seconds = transcribe_speech(
+            audio_path, language, recognizer, priority_class, details
+        )
+        extra_metadata = dict(extra_metadata or {}, **_details_metadata(details))
         
         # Get file size BEFORE any cleanup (file must still exist)
         file_size_mb = 0
@@ -352,45 +250,261 @@ def transcribe_file():
             # Continue without file size metadata
         
         # Cleanup after getting all needed data
-        cleanup_file(temp_upload_path)
-        if temp_wav_path and temp_wav_path != temp_upload_path and temp_wav_path != audio_path:
-            cleanup_file(temp_wav_path)
+        with tracing.span('cleanup'):
+            cleanup_file(temp_upload_path)
+            if temp_wav_path and temp_wav_path != temp_upload_path:
+                cleanup_file(temp_wav_path)
         
-        if text:
-            estimated_conversion_time = 0 if is_wav else max(1.0, file_size_mb * 1.0)
-            estimated_transcription_time = max(2.0, file_size_mb * 5.0)
-            
-            return jsonify({
-                "success": True,
-                "text": text,
-                "language": detected_language,
-                "language_name": SUPPORTED_LANGUAGES.get(detected_language, "Unknown"),
-                "metadata": {
-                    "needsConversion": not is_wav,
-                    "fileExtension": file_ext,
-                    "fileSizeMB": round(file_size_mb, 2),
-                    "estimatedConversionTime": round(estimated_conversion_time, 2),
-                    "estimatedTranscriptionTime": round(estimated_transcription_time, 2),
-                    "estimatedTotalTime": round(estimated_conversion_time + estimated_transcription_time, 2)
-                }
-            }), 200
-        else:
-            error = error_message or "Transcription failed. No speech detected in audio."
-            logger.warning(f"Transcription failed: {error}")
-            return jsonify({
-                "success": False,
-                "error": error,
-                "message": error
-            }), 200
-            
-    except Exception as e:
+        return _transcription_response(
+            text, error_message, detected_language, trimmed_seconds,
+            is_wav, file_ext, file_size_mb, extra_metadata
+        )
+    
+    except Exception:
         cleanup_file(temp_upload_path)
         cleanup_file(temp_wav_path)
-        logger.error(f"Error processing audio: {str(e)}")
+        raise
+
+
+def _pipelined_transcribe(temp_upload_path, file_ext, language, priority_class, extra_metadata=None):
+    """
+    Decode and recognize concurrently: segments are recognized as soon as
+    they are decoded, without writing a converted WAV file.
+    """
+    logger.info("Pipelined decode and recognition of %s upload", file_ext)
+    try:
+        # Decoding overlaps recognition, so both are timed as one span
+        details = {}
+        with tracing.span('convert', format=file_ext, pipelined=True):
+            result = recognize_segments(
+                pipelined_pcm_segments(temp_upload_path), language, sr.Recognizer(), priority_class,
+                details=details
+            )
+    except MemoryLimitError as e:
+        logger.warning(f"Conversion rejected: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 503
+    except RuntimeError as e:
+        return jsonify({"success": False, "error": f"Audio conversion failed: {str(e)}"}), 400
+    finally:
+        with tracing.span('cleanup'):
+            cleanup_file(temp_upload_path)
+    
+    # Size of the equivalent converted WAV, to keep the estimates comparable
+    file_size_mb = (result['duration_seconds'] * WAV_SAMPLE_RATE * WAV_SAMPLE_WIDTH) / (1024 * 1024)
+    metadata = {"segments": result['segments'], "pipelined": True}
+    metadata.update(_details_metadata(details))
+    metadata.update(extra_metadata or {})
+    return _transcription_response(
+        result['text'], result['error_message'], result['language'], result['trimmed_seconds'],
+        False, file_ext, file_size_mb, metadata
+    )
+
+
+def _details_metadata(details):
+    """Response metadata for the recognition details filled in by the engine."""
+    metadata = {}
+    if 'transcript_source' in details:
+        metadata['transcriptSource'] = details['transcript_source']
+        if 'match_confidence' in details:
+            metadata['matchConfidence'] = details['match_confidence']
+    if details.get('incomplete'):
+        metadata.update(incomplete=True, failedSegments=details['failed_segments'])
+    return metadata
+
+
+def _transcription_response(text, error_message, detected_language, trimmed_seconds,
+                            is_wav, file_ext, file_size_mb, extra_metadata=None):
+    """Build the JSON response shared by the file transcription endpoints."""
+    if text:
+        estimated_conversion_time = 0 if is_wav else max(1.0, file_size_mb * 1.0)
+        estimated_transcription_time = max(2.0, file_size_mb * 5.0)
+        
+        metadata = {
+            "needsConversion": not is_wav,
+            "fileExtension": file_ext,
+            "fileSizeMB": round(file_size_mb, 2),
+            "estimatedConversionTime": round(estimated_conversion_time, 2),
+            "estimatedTranscriptionTime": round(estimated_transcription_time, 2),
+            "estimatedTotalTime": round(estimated_conversion_time + estimated_transcription_time, 2),
+            "silenceTrimmedSeconds": round(trimmed_seconds, 2)
+        }
+        metadata.update(extra_metadata or {})
+        
+        return jsonify({
+            "success": True,
+            "text": text,
+            "language": detected_language,
+            "language_name": SUPPORTED_LANGUAGES.get(detected_language, "Unknown"),
+            "metadata": metadata
+        }), 200
+    else:
+        error = error_message or "Transcription failed. No speech detected in audio."
+        logger.warning("Transcription failed: %s", error)
         return jsonify({
             "success": False,
-            "error": f"Error processing audio: {str(e)}"
-        }), 500
+            "error": error,
+            "message": error
+        }), 200
+
+
+upload_manager = ResumableUploadManager(os.path.join(UPLOAD_FOLDER, 'resumable'), recognize_pcm)
+
+
+def _upload_error_response(error):
+    body = {"success": False, "error": str(error)}
+    body.update(error.details)
+    return jsonify(body), error.status_code
+
+
+@upload_blueprint.route("/api/uploads", methods=["POST"])
+def create_upload():
+    """Start a resumable upload. Body: {"filename", "language", "totalSize"}."""
+    try:
+        data = request.get_json(silent=True) or {}
+        original_filename = data.get('filename', '')
+        if not allowed_file(original_filename):
+            return jsonify({"success": False, "error": f"Invalid file type. Supported: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
+        
+        language, language_error = validate_language(data.get('language', DEFAULT_LANGUAGE))
+        if language_error:
+            return jsonify({"success": False, "error": language_error}), 400
+        
+        total_size = data.get('totalSize')
+        if total_size is not None:
+            try:
+                total_size = int(total_size)
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "error": "totalSize must be an integer"}), 400
+            if total_size <= 0:
+                return jsonify({"success": False, "error": "totalSize must be positive"}), 400
+        
+        # Resumable sessions live under the spool root; reject up front an upload that cannot fit
+        try:
+            upload_spool.ensure_space(total_size or 0)
+        except SpoolFullError as e:
+            logger.warning("Upload rejected: %s", e)
+            return jsonify({"success": False, "error": str(e)}), 507
+        
+        filename = secure_filename(original_filename)
+        meta = upload_manager.create(filename, Path(filename).suffix.lower(), language, total_size)
+        
+        return jsonify({
+            "success": True,
+            "uploadId": meta['upload_id'],
+            "offset": 0,
+            "chunkSize": RECOMMENDED_CHUNK_SIZE,
+            "maxSize": MAX_RESUMABLE_UPLOAD_SIZE,
+            "progressive": meta['progressive']
+        }), 201
+    
+    except UploadError as e:
+        return _upload_error_response(e)
+    except Exception as e:
+        logger.error(f"Error creating upload: {str(e)}")
+        return jsonify({"success": False, "error": f"Error creating upload: {str(e)}"}), 500
+
+
+@upload_blueprint.route("/api/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Return the committed offset so a client can resume an upload."""
+    try:
+        status = upload_manager.status(upload_id)
+        status["success"] = True
+        return jsonify(status), 200
+    except UploadError as e:
+        return _upload_error_response(e)
+
+
+@upload_blueprint.route("/api/uploads/<upload_id>", methods=["PUT"])
+def append_upload_chunk(upload_id):
+    """
+    Append a chunk. The raw request body is the chunk; the Upload-Offset header
+    must equal the current offset and X-Chunk-SHA256 (optional) its checksum.
+    """
+    try:
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return jsonify({"success": False, "error": "Upload-Offset header is required"}), 400
+        
+        # Every chunk counts towards the spool quota (uploads need not declare totalSize)
+        try:
+            upload_spool.ensure_space(request.content_length or MAX_FILE_SIZE)
+        except SpoolFullError as e:
+            logger.warning("Chunk rejected: %s", e)
+            return jsonify({"success": False, "error": str(e), "offset": upload_manager.status(upload_id)['offset']}), 507
+        
+        new_offset = upload_manager.append(
+            upload_id, offset, request.stream, request.headers.get('X-Chunk-SHA256')
+        )
+        return jsonify({"success": True, "uploadId": upload_id, "offset": new_offset}), 200
+    
+    except UploadError as e:
+        return _upload_error_response(e)
+    except Exception as e:
+        logger.error(f"Error appending chunk to {upload_id}: {str(e)}")
+        return jsonify({"success": False, "error": f"Error appending chunk: {str(e)}"}), 500
+
+
+@upload_blueprint.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    """Complete a resumable upload and return its transcription. Body: {"sha256"} (optional)."""
+    try:
+        data = request.get_json(silent=True) or {}
+        meta, data_path, prefix_result = upload_manager.finalize(upload_id, data.get('sha256'))
+        
+        if prefix_result is not None:
+            # The prefix was already transcribed while chunks were arriving
+            file_ext = meta['extension']
+            file_size_mb = os.path.getsize(data_path) / (1024 * 1024)
+            upload_manager.discard(upload_id)
+            metadata = {"segments": prefix_result['segments'], "progressive": True}
+            if prefix_result['incomplete']:
+                metadata.update(incomplete=True, failedSegments=prefix_result['failed_segments'])
+            return _transcription_response(
+                prefix_result['text'], prefix_result['error_message'], prefix_result['language'],
+                prefix_result['trimmed_seconds'], file_ext == '.wav', file_ext, file_size_mb, metadata
+            )
+        
+        try:
+            return _convert_and_transcribe(data_path, meta['filename'], meta['language'], {"progressive": False})
+        finally:
+            upload_manager.discard(upload_id)
+    
+    except UploadError as e:
+        return _upload_error_response(e)
+    except Exception as e:
+        logger.error(f"Error finalizing upload {upload_id}: {str(e)}")
+        return jsonify({"success": False, "error": f"Error processing audio: {str(e)}"}), 500
+
+
+@upload_blueprint.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def cancel_upload(upload_id):
+    """Abort a resumable upload and delete its data."""
+    try:
+        upload_manager.discard(upload_id)
+        return jsonify({"success": True}), 200
+    except UploadError as e:
+        return _upload_error_response(e)
+
+
+def configure_app(app):
+    """Apply the upload service configuration to a Flask app."""
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+    init_app(app)
+    tracing.init_app(app)
+    readiness.init_app(app, requires_converter=True)
+    request_profiling.init_app(app)
+    # Reclaim orphans at startup (first request) and periodically, in every worker
+    app.before_request(upload_spool.ensure_sweeper)
+
+
+app = Flask(__name__)
+# Enable CORS with explicit configuration for all origins
+CORS(app, resources=CORS_RESOURCES)
+configure_app(app)
+app.register_blueprint(upload_blueprint)
 
 
 @app.route("/health", methods=["GET"])
@@ -400,7 +514,9 @@ def health_check():
         "status": "healthy",
         "message": "Upload transcription service is running",
         "supported_languages_count": len(SUPPORTED_LANGUAGES),
-        "default_language": "en-US"
+        "default_language": DEFAULT_LANGUAGE,
+        "scheduler": recognition_scheduler.stats(),
+        "spool": upload_spool.stats()
     }), 200
 
 
@@ -416,8 +532,10 @@ if __name__ == "__main__":
     print("Endpoints:")
     print("  POST /api/transcribe-file - Upload and transcribe audio")
     print("  POST /api/analyze-file - Analyze file metadata")
+    print("  POST /api/uploads - Start a resumable upload (then PUT chunks, POST .../finalize)")
     print("  GET  /api/languages - Get supported languages")
     print("  GET  /health - Health check")
+    print("  GET  /ready - Readiness (503 when saturated)")
     print("\nNote: Non-WAV files are automatically converted to WAV before transcription.")
     print("\nPress Ctrl+C to stop")
     print("=" * 60)
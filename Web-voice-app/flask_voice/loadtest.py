@@ -0,0 +1,590 @@
+"""
+Load-testing harness for the transcription service.
+
+For every serving configuration (worker count x worker class x pool size) it
+starts transcription_service under gunicorn with the stub recognizer
+(RECOGNIZER_MODE=stub, so no network and a controllable recognizer latency),
+replays a mix of microphone clips (POST /transcribe) and file uploads
+(POST /api/transcribe-file) at increasing open-loop arrival rates, and
+reports:
+
+- the highest sustainable request rate (throughput keeps up with arrivals,
+  error/timeout rate and p95 latency of both request types within limits)
+- latency percentiles per request type at that rate
+- error and timeout rates
+- idle and peak memory (whole process tree and largest worker)
+
+Transcript caches and the fingerprint index are disabled in the service so
+repeated clips are not answered from cache (--keep-caches to keep them).
+
+Example:
+    python loadtest.py --workers 1,2,4 --worker-classes gevent,gthread,sync \\
+        --pool-sizes 25,100 --stub-latency-ms 800 --json loadtest.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import wave
+import socket
+import random
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from run import fetch_json
+from audio_converter import find_ffmpeg
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+
+SAMPLE_RATE = 16000
+# Synthetic corpus: distinct clips per type (recycled during the test)
+MIC_CLIPS = 12
+UPLOAD_FILES = 4
+MIC_SECONDS = (1.5, 6.0)
+UPLOAD_SECONDS = (20.0, 90.0)
+
+# Seconds to wait for a configuration to answer /ready
+STARTUP_TIMEOUT = 60
+MEMORY_SAMPLE_INTERVAL = 0.5
+
+# A step is only sustainable if completions keep up with arrivals (the backlog
+# does not grow); throughput counts the time to drain the step's requests
+SUSTAINED_THROUGHPUT_RATIO = 0.8
+
+MIC_PATH = '/transcribe'
+UPLOAD_PATH = '/api/transcribe-file'
+
+
+# --- Corpus -------------------------------------------------------------------
+
+def synthesize_speechlike(seconds, rng, sample_rate=SAMPLE_RATE):
+    """
+    Syllable-like bursts of voiced sound separated by short pauses, so voice
+    activity detection keeps most of the clip as it would for real speech.
+
+    Returns:
+        bytes: 16-bit mono PCM
+    """
+    total = int(seconds * sample_rate)
+    signal = np.zeros(total, dtype=np.float32)
+    position = int(rng.uniform(0.1, 0.3) * sample_rate)
+    while position < total:
+        length = int(rng.uniform(0.12, 0.35) * sample_rate)
+        t = np.arange(min(length, total - position)) / float(sample_rate)
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * h * t) / h for h in range(1, 6))
+        envelope = np.sin(np.pi * np.linspace(0, 1, len(t))) ** 2
+        signal[position:position + len(t)] = 0.3 * voiced * envelope
+        position += len(t) + int(rng.uniform(0.03, 0.4) * sample_rate)
+    signal += rng.normal(0, 0.003, total).astype(np.float32)
+    return (np.clip(signal, -1, 1) * 32767).astype('<i2').tobytes()
+
+
+def wav_bytes(pcm, sample_rate=SAMPLE_RATE):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def encode_with_ffmpeg(pcm, output_format, codec_args):
+    """Encode PCM in memory with ffmpeg (e.g. WebM/Opus or MP3)."""
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'error',
+               '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', 'pipe:0',
+               *codec_args, '-f', output_format, 'pipe:1']
+    result = subprocess.run(command, input=pcm, capture_output=True, check=True)
+    return result.stdout
+
+
+def load_directory(directory):
+    """Read every file in `directory` as (filename, bytes)."""
+    files = sorted(p for p in Path(directory).iterdir() if p.is_file())
+    if not files:
+        raise SystemExit(f"No audio files in {directory}")
+    return [(p.name, p.read_bytes()) for p in files]
+
+
+def build_corpus(args):
+    """
+    Build the request payloads.
+
+    Returns:
+        dict: {'mic': [(filename, bytes)], 'upload': [(filename, bytes)]}
+    """
+    rng = np.random.default_rng(args.seed)
+    corpus = {}
+
+    if args.mic_dir:
+        corpus['mic'] = load_directory(args.mic_dir)
+    else:
+        clips = []
+        for i in range(MIC_CLIPS):
+            pcm = synthesize_speechlike(rng.uniform(*MIC_SECONDS), rng)
+            if args.mic_format == 'webm':
+                clips.append((f'mic_{i}.webm', encode_with_ffmpeg(pcm, 'webm', ['-c:a', 'libopus', '-b:a', '32k'])))
+            else:
+                clips.append((f'mic_{i}.wav', wav_bytes(pcm)))
+        corpus['mic'] = clips
+
+    if args.upload_dir:
+        corpus['upload'] = load_directory(args.upload_dir)
+    else:
+        files = []
+        for i in range(UPLOAD_FILES):
+            pcm = synthesize_speechlike(rng.uniform(*UPLOAD_SECONDS), rng)
+            if args.upload_format == 'mp3':
+                files.append((f'upload_{i}.mp3', encode_with_ffmpeg(pcm, 'mp3', ['-b:a', '64k'])))
+            else:
+                files.append((f'upload_{i}.wav', wav_bytes(pcm)))
+        corpus['upload'] = files
+
+    return corpus
+
+
+def corpus_needs_converter(corpus):
+    """True if any payload is not a WAV file (the service needs ffmpeg to decode it)."""
+    return any(not filename.lower().endswith('.wav') for payloads in corpus.values() for filename, _ in payloads)
+
+
+# --- HTTP client --------------------------------------------------------------
+
+def encode_multipart(fields, filename, data):
+    """
+    Encode form fields plus one file (field name 'audio') as multipart/form-data.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+    )
+    parts.append(data)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def send_request(port, kind, payload, language, timeout):
+    """
+    POST one recording.
+
+    Returns:
+        dict: {'kind', 'status', 'latency', 'outcome'} where outcome is
+        'ok', 'error' or 'timeout'; a 200 response whose JSON body reports
+        "success": false (e.g. a recognizer error) counts as an error
+    """
+    filename, data = payload
+    body, content_type = encode_multipart({'language': language}, filename, data)
+    path = MIC_PATH if kind == 'mic' else UPLOAD_PATH
+    started = time.perf_counter()
+    status = None
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        body = response.read()
+        status = response.status
+        outcome = 'ok' if status == 200 and _reports_success(body) else 'error'
+    except socket.timeout:
+        outcome = 'timeout'
+    except (OSError, http.client.HTTPException):
+        outcome = 'error'
+    finally:
+        connection.close()
+    return {'kind': kind, 'status': status, 'latency': time.perf_counter() - started, 'outcome': outcome}
+
+
+def _reports_success(body):
+    try:
+        return json.loads(body).get('success') is not False
+    except (ValueError, AttributeError):
+        return False
+
+
+# --- Server under test --------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss(root_pid):
+    """
+    Resident memory of a process and its children (Linux /proc only).
+
+    Returns:
+        dict or None: {pid: rss_bytes}
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                # Fields after the parenthesised command name: state, ppid, ...
+                ppid = int(f.read().rsplit(b')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    rss = {}
+    pending = [root_pid]
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                rss[pid] = int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        pending.extend(children.get(pid, []))
+    return rss
+
+
+class ServiceUnderTest:
+    """One gunicorn instance of transcription_service in a given configuration."""
+
+    def __init__(self, workers, worker_class, pool_size, env):
+        self.workers = workers
+        self.worker_class = worker_class
+        self.pool_size = pool_size
+        self.env = env
+        self.port = free_port()
+        self.process = None
+        self.idle_rss = None
+        self.peak_rss = None
+        self.peak_worker_rss = None
+        self._sampling = False
+        self._sampler = None
+
+    @property
+    def label(self):
+        pool = '' if self.pool_size is None else f'/{self.pool_size}'
+        return f'{self.workers}x{self.worker_class}{pool}'
+
+    def command(self):
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+                   '--workers', str(self.workers), '--worker-class', self.worker_class,
+                   '--timeout', '600', '--graceful-timeout', '30']
+        if self.worker_class == 'gevent':
+            command += ['--worker-connections', str(self.pool_size)]
+        elif self.worker_class == 'gthread':
+            command += ['--threads', str(self.pool_size)]
+        command.append('transcription_service:app')
+        return command
+
+    def start(self):
+        env = dict(os.environ, **self.env)
+        self.process = subprocess.Popen(self.command(), cwd=str(SCRIPT_DIR), env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        report = None
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.label} exited during startup (code {self.process.returncode})")
+            status, report = fetch_json(f'http://127.0.0.1:{self.port}/ready')
+            if status == 200:
+                break
+            time.sleep(0.5)
+        else:
+            self.stop()
+            reasons = '; '.join((report or {}).get('reasons', [])) or 'no response'
+            raise RuntimeError(f"{self.label} did not become ready within {STARTUP_TIMEOUT}s ({reasons})")
+
+        rss = process_tree_rss(self.process.pid)
+        if rss is not None:
+            self.idle_rss = sum(rss.values())
+            self.peak_rss = self.idle_rss
+            self.peak_worker_rss = max((v for pid, v in rss.items() if pid != self.process.pid), default=0)
+            self._sampling = True
+            self._sampler = threading.Thread(target=self._sample_memory, daemon=True)
+            self._sampler.start()
+
+    def _sample_memory(self):
+        while self._sampling:
+            rss = process_tree_rss(self.process.pid)
+            if rss:
+                self.peak_rss = max(self.peak_rss, sum(rss.values()))
+                workers = [v for pid, v in rss.items() if pid != self.process.pid]
+                if workers:
+                    self.peak_worker_rss = max(self.peak_worker_rss, max(workers))
+            time.sleep(MEMORY_SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._sampling = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=35)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+# --- Load steps ---------------------------------------------------------------
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def summarize(results, kind=None):
+    """Latency percentiles (ms) and outcome rates for one request type (or all)."""
+    selected = [r for r in results if kind is None or r['kind'] == kind]
+    ok_latencies = [r['latency'] * 1000 for r in selected if r['outcome'] == 'ok']
+    total = len(selected)
+    summary = {
+        'requests': total,
+        'error_rate': round(sum(r['outcome'] == 'error' for r in selected) / total, 4) if total else 0.0,
+        'timeout_rate': round(sum(r['outcome'] == 'timeout' for r in selected) / total, 4) if total else 0.0,
+    }
+    for q in (50, 95, 99):
+        value = percentile(ok_latencies, q)
+        summary[f'p{q}_ms'] = round(value, 1) if value is not None else None
+    return summary
+
+
+def run_step(port, corpus, rate, args, executor, rng):
+    """
+    Offer `rate` requests/second (Poisson arrivals) for args.step_seconds and
+    wait for every request to finish.
+    """
+    futures = []
+    started = time.perf_counter()
+    next_at = 0.0
+    max_lag = 0.0
+    while next_at < args.step_seconds:
+        delay = started + next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            max_lag = max(max_lag, -delay)
+        kind = 'mic' if rng.random() < args.mic_ratio else 'upload'
+        payload = rng.choice(corpus[kind])
+        futures.append(executor.submit(send_request, port, kind, payload, args.language, args.timeout))
+        next_at += rng.expovariate(rate)
+
+    results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+    ok = sum(r['outcome'] == 'ok' for r in results)
+    step = {
+        'offered_rps': round(rate, 2),
+        'arrival_rps': round(len(futures) / args.step_seconds, 2),
+        'throughput_rps': round(ok / elapsed, 2),
+        'generator_lag_ms': round(max_lag * 1000, 1),
+        'all': summarize(results),
+        'mic': summarize(results, 'mic'),
+        'upload': summarize(results, 'upload'),
+    }
+    step['sustainable'] = is_sustainable(step, args)
+    return step
+
+
+def is_sustainable(step, args):
+    """
+    A step passes when failures and p95 latency of both request types are
+    within limits and throughput keeps up with the arrival rate.
+    """
+    if step['throughput_rps'] < SUSTAINED_THROUGHPUT_RATIO * step['arrival_rps']:
+        return False
+    overall = step['all']
+    if overall['error_rate'] + overall['timeout_rate'] > args.max_error_rate:
+        return False
+    for kind, slo in (('mic', args.mic_p95_slo), ('upload', args.upload_p95_slo)):
+        p95 = step[kind]['p95_ms']
+        if step[kind]['requests'] and (p95 is None or p95 > slo * 1000):
+            return False
+    return True
+
+
+def test_configuration(service, corpus, args):
+    """Ramp the offered rate until a step is not sustainable."""
+    rng = random.Random(args.seed)
+    steps = []
+    service.start()
+    try:
+        with ThreadPoolExecutor(max_workers=args.max_clients) as executor:
+            rate = args.start_rps
+            while rate <= args.max_rps:
+                step = run_step(service.port, corpus, rate, args, executor, rng)
+                steps.append(step)
+                print(f"  {service.label:>16} {rate:7.2f} rps offered -> {step['throughput_rps']:7.2f} ok/s, "
+                      f"mic p95 {_ms(step['mic']['p95_ms'])}, upload p95 {_ms(step['upload']['p95_ms'])}, "
+                      f"errors {step['all']['error_rate']:.1%}, timeouts {step['all']['timeout_rate']:.1%}"
+                      f"{'' if step['sustainable'] else '  (not sustainable)'}", flush=True)
+                if not step['sustainable']:
+                    break
+                rate *= args.rps_factor
+    finally:
+        service.stop()
+
+    passing = [s for s in steps if s['sustainable']]
+    best = passing[-1] if passing else None
+    return {
+        'configuration': service.label,
+        'workers': service.workers,
+        'worker_class': service.worker_class,
+        'pool_size': service.pool_size,
+        'sustainable_rps': best['throughput_rps'] if best else 0.0,
+        'at_sustainable': best,
+        'idle_rss_mb': _mb(service.idle_rss),
+        'peak_rss_mb': _mb(service.peak_rss),
+        'peak_worker_rss_mb': _mb(service.peak_worker_rss),
+        'steps': steps,
+    }
+
+
+def _ms(value):
+    return '-' if value is None else f'{value:.0f}ms'
+
+
+def _mb(value):
+    return None if value is None else round(value / (1024 * 1024), 1)
+
+
+def configurations(args):
+    """Expand the sweep; pool size only applies to gevent and gthread workers."""
+    for workers in args.workers:
+        for worker_class in args.worker_classes:
+            pools = args.pool_sizes if worker_class in ('gevent', 'gthread') else [None]
+            for pool_size in pools:
+                yield workers, worker_class, pool_size
+
+
+def service_env(args, corpus):
+    env = {
+        'RECOGNIZER_MODE': 'stub',
+        'STUB_LATENCY_MS': str(args.stub_latency_ms),
+        'STUB_LATENCY_JITTER_MS': str(args.stub_jitter_ms),
+        'STUB_ERROR_RATE': str(args.stub_error_rate),
+        'LOG_LEVEL': 'WARNING',
+        # The harness measures this instance, not the readiness limits
+        'READY_MAX_IN_FLIGHT': '0',
+        'READY_MAX_QUEUE_DEPTH': '0',
+    }
+    if not args.keep_caches:
+        env.update({'TRANSCRIPT_CACHE_SIZE': '0', 'FINGERPRINT_INDEX_SIZE': '0'})
+    if not corpus_needs_converter(corpus):
+        # WAV-only runs must not wait on /ready for an ffmpeg they never use
+        env['READY_REQUIRE_CONVERTER'] = '0'
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+def print_report(reports):
+    print()
+    print(f"{'configuration':>16} {'rps':>7} {'mic p50/p95/p99 ms':>22} {'upload p50/p95/p99 ms':>24} "
+          f"{'err':>6} {'t/o':>6} {'idle MB':>8} {'peak MB':>8} {'worker MB':>9}")
+    for report in reports:
+        best = report['at_sustainable']
+        if best:
+            mic = '/'.join(_ms(best['mic'][f'p{q}_ms']).rstrip('ms') for q in (50, 95, 99))
+            upload = '/'.join(_ms(best['upload'][f'p{q}_ms']).rstrip('ms') for q in (50, 95, 99))
+            err, timeouts = f"{best['all']['error_rate']:.1%}", f"{best['all']['timeout_rate']:.1%}"
+        else:
+            mic = upload = err = timeouts = '-'
+        print(f"{report['configuration']:>16} {report['sustainable_rps']:>7.2f} {mic:>22} {upload:>24} "
+              f"{err:>6} {timeouts:>6} {_fmt(report['idle_rss_mb']):>8} {_fmt(report['peak_rss_mb']):>8} "
+              f"{_fmt(report['peak_worker_rss_mb']):>9}")
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.0f}'
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def _str_list(value):
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep gunicorn configurations under a mic/upload request mix.")
+    parser.add_argument('--workers', type=_int_list, default=[1, 2, 4], help="worker counts (default 1,2,4)")
+    parser.add_argument('--worker-classes', type=_str_list, default=['gevent', 'gthread', 'sync'],
+                        help="gunicorn worker classes (default gevent,gthread,sync)")
+    parser.add_argument('--pool-sizes', type=_int_list, default=[100],
+                        help="gevent worker connections / gthread threads (default 100)")
+    parser.add_argument('--mic-ratio', type=float, default=0.8, help="share of requests that are mic clips")
+    parser.add_argument('--mic-dir', help="directory of real mic recordings (default: synthetic clips)")
+    parser.add_argument('--upload-dir', help="directory of real upload files (default: synthetic files)")
+    parser.add_argument('--mic-format', choices=('wav', 'webm'), default='wav')
+    parser.add_argument('--upload-format', choices=('wav', 'mp3'), default='wav')
+    parser.add_argument('--language', default='en-US')
+    parser.add_argument('--stub-latency-ms', type=float, default=800)
+    parser.add_argument('--stub-jitter-ms', type=float, default=200)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--start-rps', type=float, default=1.0)
+    parser.add_argument('--rps-factor', type=float, default=1.5, help="offered rate multiplier per step")
+    parser.add_argument('--max-rps', type=float, default=200.0)
+    parser.add_argument('--step-seconds', type=float, default=20.0)
+    parser.add_argument('--timeout', type=float, default=120.0, help="client timeout per request (s)")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--mic-p95-slo', type=float, default=3.0, help="mic p95 latency limit (s)")
+    parser.add_argument('--upload-p95-slo', type=float, default=60.0, help="upload p95 latency limit (s)")
+    parser.add_argument('--max-clients', type=int, default=512, help="concurrent client connections")
+    parser.add_argument('--keep-caches', action='store_true', help="leave transcript/fingerprint caches on")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra service environment (e.g. RECOGNIZER_CONCURRENCY=16)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write full results to this file")
+    args = parser.parse_args(argv)
+    if not 0.0 <= args.mic_ratio <= 1.0:
+        parser.error("--mic-ratio must be between 0 and 1")
+    if args.rps_factor <= 1.0:
+        parser.error("--rps-factor must be greater than 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("Building request corpus...")
+    corpus = build_corpus(args)
+    for kind, payloads in corpus.items():
+        print(f"  {kind}: {len(payloads)} files, {sum(len(d) for _, d in payloads) / len(payloads) / 1024:.0f} KB average")
+
+    if corpus_needs_converter(corpus) and not find_ffmpeg():
+        raise SystemExit("The corpus contains compressed recordings but ffmpeg is not installed, so the "
+                         "service would never report ready. Install ffmpeg or use WAV recordings.")
+
+    env = service_env(args, corpus)
+    reports = []
+    for workers, worker_class, pool_size in configurations(args):
+        service = ServiceUnderTest(workers, worker_class, pool_size, env)
+        print(f"Testing {service.label}")
+        try:
+            reports.append(test_configuration(service, corpus, args))
+        except RuntimeError as e:
+            print(f"  skipped: {e}")
+
+    print_report(reports)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'service_env': env, 'results': reports}, f, indent=2)
+        print(f"\nFull results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
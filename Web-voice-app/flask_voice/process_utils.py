@@ -0,0 +1,33 @@
+"""
+Process helpers shared by modules that track work owned by gunicorn workers
+(background transcribers, spool files) across process restarts.
+"""
+
+import os
+
+
+def process_alive(pid):
+    """Best-effort check that a process still exists (always True on Windows)."""
+    if os.name == 'nt' or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_start_time(pid):
+    """Start time of `pid` as a Unix timestamp, or None where /proc is unavailable."""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+        with open('/proc/stat', 'r') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime '))
+        # Field 22 (starttime, clock ticks after boot); the command name may contain spaces
+        start_ticks = int(stat.rsplit(')', 1)[1].split()[19])
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+    return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
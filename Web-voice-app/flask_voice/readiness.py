@@ -0,0 +1,130 @@
+"""
+Readiness endpoint.
+
+/health only says the process is up. /ready reports how loaded this instance
+is (in-flight requests, recognizer queue depth, slot and memory utilization,
+cache hit rates, recent recognizer latency, converter availability) and
+answers 503 once any configured saturation limit is exceeded, so a load
+balancer or run.py can send traffic elsewhere until it recovers.
+"""
+
+import os
+import threading
+
+from flask import jsonify, request
+
+from audio_converter import find_ffmpeg, memory_budget
+from scheduler import recognition_scheduler, RECOGNIZER_CONCURRENCY
+from transcription_engine import transcript_cache
+from audio_fingerprint import fingerprint_index
+
+# Saturation limits (0 disables a limit)
+READY_MAX_IN_FLIGHT = int(os.environ.get('READY_MAX_IN_FLIGHT', '64'))
+READY_MAX_QUEUE_DEPTH = int(os.environ.get('READY_MAX_QUEUE_DEPTH', str(4 * RECOGNIZER_CONCURRENCY)))
+READY_MAX_MEMORY_UTILIZATION = float(os.environ.get('READY_MAX_MEMORY_UTILIZATION', '0.95'))
+READY_MAX_RECOGNIZER_P95_MS = float(os.environ.get('READY_MAX_RECOGNIZER_P95_MS', '0'))
+# Upload instances cannot decode compressed formats without ffmpeg
+READY_REQUIRE_CONVERTER = os.environ.get('READY_REQUIRE_CONVERTER', '1') != '0'
+
+# Probe endpoints are not counted as in-flight work
+_UNTRACKED_PATHS = ('/health', '/ready')
+
+
+class InFlightCounter:
+    """Counts requests currently being handled by this process."""
+
+    def __init__(self):
+        self.count = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.count += 1
+            self.peak = max(self.peak, self.count)
+
+    def leave(self):
+        with self._lock:
+            self.count -= 1
+
+
+in_flight = InFlightCounter()
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / float(denominator), 3) if denominator else 0.0
+
+
+def readiness_report(requires_converter):
+    """
+    Build the readiness report.
+
+    Returns:
+        tuple: (report dict, ready bool)
+    """
+    scheduler = recognition_scheduler.stats()
+    memory = memory_budget.stats()
+    cache = transcript_cache.stats()
+    fingerprints = fingerprint_index.stats()
+    converter_available = find_ffmpeg() is not None
+    memory_utilization = _ratio(memory['in_use_bytes'], memory['limit_bytes'])
+    p95_ms = scheduler['recognizer_latency']['p95_ms']
+
+    reasons = []
+    if READY_MAX_IN_FLIGHT and in_flight.count > READY_MAX_IN_FLIGHT:
+        reasons.append(f"{in_flight.count} requests in flight (limit {READY_MAX_IN_FLIGHT})")
+    if READY_MAX_QUEUE_DEPTH and scheduler['queued'] > READY_MAX_QUEUE_DEPTH:
+        reasons.append(f"{scheduler['queued']} recognizer calls queued (limit {READY_MAX_QUEUE_DEPTH})")
+    if READY_MAX_MEMORY_UTILIZATION and memory_utilization > READY_MAX_MEMORY_UTILIZATION:
+        reasons.append(f"conversion memory {memory_utilization:.0%} used (limit {READY_MAX_MEMORY_UTILIZATION:.0%})")
+    if READY_MAX_RECOGNIZER_P95_MS and p95_ms > READY_MAX_RECOGNIZER_P95_MS:
+        reasons.append(f"recognizer p95 {p95_ms:.0f}ms (limit {READY_MAX_RECOGNIZER_P95_MS:.0f}ms)")
+    if requires_converter and READY_REQUIRE_CONVERTER and not converter_available:
+        reasons.append("ffmpeg is not available")
+
+    report = {
+        "ready": not reasons,
+        "reasons": reasons,
+        "in_flight": {"current": in_flight.count, "peak": in_flight.peak},
+        "recognizer": {
+            "capacity": scheduler['capacity'],
+            "active": scheduler['active'],
+            "queued": scheduler['queued'],
+            "utilization": _ratio(scheduler['active'], scheduler['capacity']),
+            "latency": scheduler['recognizer_latency'],
+        },
+        "conversion_memory": {
+            "in_use_bytes": memory['in_use_bytes'],
+            "limit_bytes": memory['limit_bytes'],
+            "utilization": memory_utilization,
+            "waiting": memory['waiting'],
+        },
+        "caches": {
+            "transcript_hit_rate": _ratio(cache['hits'], cache['hits'] + cache['misses']),
+            "fingerprint_match_rate": _ratio(fingerprints['matches'], fingerprints['lookups']),
+        },
+        "converter_available": converter_available,
+    }
+    return report, not reasons
+
+
+def init_app(app, requires_converter=True):
+    """Count in-flight requests and serve GET /ready on `app`."""
+
+    @app.before_request
+    def _enter_request():
+        if request.path not in _UNTRACKED_PATHS:
+            in_flight.enter()
+            request.environ['readiness.tracked'] = True
+
+    @app.teardown_request
+    def _leave_request(exc):
+        if request.environ.pop('readiness.tracked', False):
+            in_flight.leave()
+
+    def ready():
+        """Readiness check: 200 when this instance can take more work, else 503."""
+        report, is_ready = readiness_report(requires_converter)
+        return jsonify(report), 200 if is_ready else 503
+
+    app.add_url_rule('/ready', 'ready', ready, methods=['GET'])
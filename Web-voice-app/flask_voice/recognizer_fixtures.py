@@ -0,0 +1,202 @@
+"""
+Record/replay layer for recognizer traffic.
+
+RECOGNIZER_MODE selects how recognizer calls are served:
+- live:   call Google Speech Recognition (default)
+- record: call Google and append each request (audio hash, language), its
+          outcome and observed latency to a JSONL fixture store
+- replay: serve recorded outcomes locally without network access, sleeping for
+          the recorded latency (scaled by REPLAY_LATENCY_SCALE)
+- stub:   return a fixed transcript after STUB_LATENCY_MS (+/- STUB_LATENCY_JITTER_MS),
+          failing STUB_ERROR_RATE of calls; for load tests without fixtures
+
+Replay runs the real transcribe_speech()/auto-detect logic, so benchmarks and
+load tests see production-like timing. Several recordings of the same request
+are replayed round-robin to keep the latency spread.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+
+import speech_recognition as sr
+
+logger = logging.getLogger(__name__)
+
+LIVE = 'live'
+RECORD = 'record'
+REPLAY = 'replay'
+STUB = 'stub'
+
+RECOGNIZER_MODE = os.environ.get('RECOGNIZER_MODE', LIVE).strip().lower()
+RECOGNIZER_FIXTURES = os.environ.get(
+    'RECOGNIZER_FIXTURES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'recognizer.jsonl')
+)
+# 1.0 replays recorded latencies, 0 replays instantly, 2.0 simulates a slower backend
+REPLAY_LATENCY_SCALE = float(os.environ.get('REPLAY_LATENCY_SCALE', '1.0'))
+# Stub recognizer: simulated latency per call and fraction of calls that fail
+STUB_LATENCY_MS = float(os.environ.get('STUB_LATENCY_MS', '800'))
+STUB_LATENCY_JITTER_MS = float(os.environ.get('STUB_LATENCY_JITTER_MS', '200'))
+STUB_ERROR_RATE = float(os.environ.get('STUB_ERROR_RATE', '0'))
+STUB_TRANSCRIPT = "this is a simulated transcript of the recorded audio"
+
+# Outcome types stored in the fixture store
+_TEXT = 'text'
+_UNKNOWN = 'unknown'
+_ERROR = 'error'
+
+
+def request_key(audio_data, language):
+    """Fixture key for a recognizer request: hash of the audio, its format and the language."""
+    digest = hashlib.sha256(audio_data.frame_data)
+    digest.update(f"{audio_data.sample_rate}:{audio_data.sample_width}:{language}".encode('ascii'))
+    return digest.hexdigest()[:32]
+
+
+class RecognizerBackend:
+    """Routes recognizer calls to the live service, a recorder or a replayer."""
+
+    def __init__(self, mode=RECOGNIZER_MODE, path=RECOGNIZER_FIXTURES, latency_scale=REPLAY_LATENCY_SCALE):
+        if mode not in (LIVE, RECORD, REPLAY, STUB):
+            logger.warning(f"Unknown RECOGNIZER_MODE '{mode}', using live recognizer")
+            mode = LIVE
+        self.mode = mode
+        self.path = path
+        self.latency_scale = max(0.0, latency_scale)
+        self.recorded = 0
+        self.replayed = 0
+        self.missing = 0
+        self.stubbed = 0
+        self._lock = threading.Lock()
+        self._fixtures = {}
+        self._next = {}
+
+        if mode == REPLAY:
+            self._load()
+        elif mode == RECORD:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            logger.info(f"Recording recognizer traffic to {path}")
+
+    def recognize(self, recognizer, audio_data, language):
+        """
+        Recognize audio in the configured mode.
+
+        Returns:
+            str: Transcribed text
+
+        Raises:
+            sr.UnknownValueError: If no speech was (or was recorded as) recognized
+            sr.RequestError: On service errors, or in replay for unrecorded requests
+        """
+        if self.mode == REPLAY:
+            return self._replay(audio_data, language)
+        if self.mode == STUB:
+            return self._stub()
+        if self.mode == LIVE:
+            return recognizer.recognize_google(audio_data, language=language)
+
+        started = time.monotonic()
+        try:
+            text = recognizer.recognize_google(audio_data, language=language)
+        except sr.UnknownValueError:
+            self._record(audio_data, language, started, {'o': _UNKNOWN})
+            raise
+        except sr.RequestError as e:
+            self._record(audio_data, language, started, {'o': _ERROR, 'e': str(e)})
+            raise
+        self._record(audio_data, language, started, {'o': _TEXT, 't': text})
+        return text
+
+    def _record(self, audio_data, language, started, outcome):
+        entry = {
+            'k': request_key(audio_data, language),
+            'l': language,
+            'ms': round((time.monotonic() - started) * 1000, 1),
+            's': round(len(audio_data.frame_data) / float(audio_data.sample_rate * audio_data.sample_width), 2),
+        }
+        entry.update(outcome)
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                self.recorded += 1
+            except OSError as e:
+                logger.error(f"Could not record recognizer fixture: {e}")
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping malformed recognizer fixture line")
+                        continue
+                    self._fixtures.setdefault(entry['k'], []).append(entry)
+        except FileNotFoundError:
+            logger.warning(f"Recognizer fixture store not found: {self.path}")
+        logger.info(f"Replaying {len(self._fixtures)} recorded recognizer requests from {self.path}")
+
+    def _replay(self, audio_data, language):
+        key = request_key(audio_data, language)
+        with self._lock:
+            entries = self._fixtures.get(key)
+            if not entries:
+                self.missing += 1
+                entry = None
+            else:
+                index = self._next.get(key, 0)
+                self._next[key] = (index + 1) % len(entries)
+                entry = entries[index]
+                self.replayed += 1
+
+        if entry is None:
+            raise sr.RequestError(f"No recorded recognizer response for this audio ({language})")
+
+        delay = entry.get('ms', 0.0) / 1000.0 * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+
+        if entry['o'] == _TEXT:
+            return entry['t']
+        if entry['o'] == _UNKNOWN:
+            raise sr.UnknownValueError()
+        raise sr.RequestError(entry.get('e', 'recorded recognition error'))
+
+    def _stub(self):
+        delay = STUB_LATENCY_MS + random.uniform(-STUB_LATENCY_JITTER_MS, STUB_LATENCY_JITTER_MS)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        with self._lock:
+            self.stubbed += 1
+        if random.random() < STUB_ERROR_RATE:
+            raise sr.RequestError("simulated recognizer error")
+        return STUB_TRANSCRIPT
+
+    def stats(self):
+        with self._lock:
+            stats = {'mode': self.mode}
+            if self.mode == RECORD:
+                stats['recorded'] = self.recorded
+            elif self.mode == REPLAY:
+                stats.update({
+                    'fixtures': len(self._fixtures),
+                    'replayed': self.replayed,
+                    'missing': self.missing,
+                    'latency_scale': self.latency_scale,
+                })
+            elif self.mode == STUB:
+                stats.update({'stubbed': self.stubbed, 'latency_ms': STUB_LATENCY_MS})
+            return stats
+
+
+recognizer_backend = RecognizerBackend()
@@ -0,0 +1,266 @@
+"""
+On-demand profiling of individual transcription requests.
+
+Off unless configured. A request to one of PROFILE_ROUTES is profiled when
+it carries `X-Profile-Request: <PROFILE_TOKEN>`, or at random for a
+PROFILE_SAMPLE_RATE fraction of requests. Two modes:
+
+- deterministic (default): cProfile; writes <name>.prof (open with
+  `python -m pstats` or snakeviz) and a <name>.txt summary of the top
+  functions by cumulative time
+- sampling: a background OS thread samples the request's stack every
+  PROFILE_SAMPLE_INTERVAL_MS; writes <name>.folded (collapsed stacks for
+  speedscope / flamegraph.pl) and a <name>.txt summary. Lower overhead, so
+  timings are closer to an unprofiled request. Samples are wall-clock: time
+  the request spends waiting (recognizer, I/O) shows up where it waits.
+
+The header may choose the mode (`X-Profile-Mode: sampling`). Profiles land in
+PROFILE_DIR, named <UTC time>_<route>_<request id>, and the oldest are
+deleted beyond PROFILE_MAX_FILES profiles or PROFILE_MAX_AGE_HOURS. The
+response carries `X-Profile-Id` with the name.
+
+One request is profiled at a time per process. Work moved to other threads
+(run_cpu_bound under gevent, pipelined conversion) is not captured. With
+gevent workers the sampler follows the request's greenlet: its running stack
+is read from the OS thread while it runs, and its suspended frame
+(greenlet.gr_frame) while other greenlets run. The deterministic profile
+hooks the OS thread, so it also counts other greenlets that run while the
+request waits. When neither trigger is configured no hooks are installed.
+"""
+
+import os
+import io
+import re
+import sys
+import time
+import pstats
+import random
+import logging
+import cProfile
+import threading
+from collections import Counter
+
+from async_support import OSThread, gevent_active, original
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+)
+# Shared secret for the X-Profile-Request header (empty disables the header)
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+# Fraction of requests profiled at random (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'deterministic').strip().lower()
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+PROFILE_ROUTES = [route.strip() for route in os.environ.get(
+    'PROFILE_ROUTES', '/transcribe,/api/transcribe-file,/api/uploads/<upload_id>/finalize'
+).split(',') if route.strip()]
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+PROFILE_MAX_AGE_HOURS = float(os.environ.get('PROFILE_MAX_AGE_HOURS', '72'))
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_MODE_HEADER = 'X-Profile-Mode'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+DETERMINISTIC = 'deterministic'
+SAMPLING = 'sampling'
+
+# Functions listed in the text summaries
+_SUMMARY_ROWS = 40
+
+_active_lock = threading.Lock()
+
+
+def profiling_enabled():
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+class DeterministicProfile:
+    """cProfile around the request."""
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def write(self, base_path, header):
+        self._profile.dump_stats(base_path + '.prof')
+        summary = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=summary)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(_SUMMARY_ROWS)
+        with open(base_path + '.txt', 'w', encoding='utf-8') as f:
+            f.write(header + summary.getvalue())
+        return ['.prof', '.txt']
+
+
+class SamplingProfile:
+    """Periodic stack samples of one thread (or greenlet), aggregated as collapsed stacks."""
+
+    def __init__(self, interval_ms=PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = max(interval_ms, 1.0) / 1000.0
+        self.samples = Counter()
+        self._thread_id = None
+        self._greenlet = None
+        self._running = False
+        self._sampler = None
+
+    def start(self):
+        # Under gevent threading.get_ident() is a greenlet id; frames are keyed by OS thread
+        self._thread_id = original('_thread', 'get_ident')()
+        if gevent_active():
+            import greenlet
+            self._greenlet = greenlet.getcurrent()
+        self._running = True
+        self._sampler = OSThread(self._run)
+        self._sampler.start()
+
+    def _current_frame(self):
+        if self._greenlet is not None and self._greenlet.gr_frame is not None:
+            return self._greenlet.gr_frame  # Suspended while other greenlets run
+        return sys._current_frames().get(self._thread_id)
+
+    def _run(self):
+        sleep = original('time', 'sleep')
+        while self._running:
+            frame = self._current_frame()
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+            sleep(self.interval)
+
+    def stop(self):
+        self._running = False
+        self._sampler.join()
+
+    def write(self, base_path, header):
+        with open(base_path + '.folded', 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        total = sum(self.samples.values()) or 1
+        self_counts = Counter()
+        inclusive_counts = Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(';')
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                inclusive_counts[frame] += count
+        lines = [header, f"{total} samples every {self.interval * 1000:.0f}ms\n\n",
+                 f"{'self %':>7} {'total %':>8}  function\n"]
+        for frame, count in inclusive_counts.most_common(_SUMMARY_ROWS):
+            lines.append(f"{100.0 * self_counts[frame] / total:7.1f} {100.0 * count / total:8.1f}  {frame}\n")
+        with open(base_path + '.txt', 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        return ['.folded', '.txt']
+
+
+def choose_mode(headers):
+    """
+    Decide whether to profile a request.
+
+    Returns:
+        str or None: profiling mode, or None to leave the request alone
+    """
+    token = headers.get(PROFILE_HEADER)
+    if token and PROFILE_TOKEN and token == PROFILE_TOKEN:
+        mode = (headers.get(PROFILE_MODE_HEADER) or PROFILE_MODE).strip().lower()
+        return mode if mode in (DETERMINISTIC, SAMPLING) else DETERMINISTIC
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_MODE if PROFILE_MODE in (DETERMINISTIC, SAMPLING) else DETERMINISTIC
+    return None
+
+
+def profile_name(route, request_id):
+    """<UTC time>_<route>_<request id>, safe as a file name."""
+    timestamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+    request_slug = re.sub(r'[^A-Za-z0-9]+', '', request_id or '')[:16] or 'none'
+    return f"{timestamp}_{slug}_{request_slug}"
+
+
+def prune_profiles(directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES, max_age_hours=PROFILE_MAX_AGE_HOURS):
+    """Delete profiles older than max_age_hours and the oldest beyond max_files."""
+    try:
+        entries = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    profiles = {}
+    for entry in entries:
+        name = entry.split('.', 1)[0]
+        profiles.setdefault(name, []).append(os.path.join(directory, entry))
+
+    cutoff = time.time() - max_age_hours * 3600 if max_age_hours > 0 else None
+    names = sorted(profiles)  # Names start with the UTC timestamp
+    expired = set(names[:-max_files] if max_files > 0 and len(names) > max_files else [])
+    for name in names:
+        if cutoff is not None and all(os.path.getmtime(path) < cutoff for path in profiles[name]):
+            expired.add(name)
+    for name in expired:
+        for path in profiles[name]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def init_app(app):
+    """Profile selected requests of `app` on demand (no-op unless configured)."""
+    if not profiling_enabled():
+        return
+
+    from flask import g, request
+    from structured_logging import request_id_var
+
+    @app.before_request
+    def _start_profile():
+        rule = request.url_rule.rule if request.url_rule else None
+        if rule not in PROFILE_ROUTES:
+            return
+        mode = choose_mode(request.headers)
+        if mode is None:
+            return
+        if not _active_lock.acquire(blocking=False):
+            logger.info("Skipping profile of %s: another request is being profiled", rule)
+            return
+        profile = SamplingProfile() if mode == SAMPLING else DeterministicProfile()
+        g.profile = (profile, mode, rule, time.perf_counter())
+        g.profile_name = profile_name(rule, request_id_var.get())
+        profile.start()
+
+    @app.after_request
+    def _add_profile_header(response):
+        name = g.get('profile_name')
+        if name:
+            response.headers[PROFILE_ID_HEADER] = name
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        state = g.pop('profile', None)
+        if state is None:
+            return
+        profile, mode, rule, started = state
+        try:
+            profile.stop()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            name = g.pop('profile_name')
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            header = (f"{request.method} {request.path} ({rule})\n"
+                      f"request id: {request_id_var.get()}\nmode: {mode}\nwall time: {elapsed_ms:.0f}ms\n"
+                      f"error: {type(exc).__name__ if exc is not None else 'none'}\n\n")
+            suffixes = profile.write(os.path.join(PROFILE_DIR, name), header)
+            logger.info("Profiled %s in %.0fms: %s/%s{%s}", rule, elapsed_ms, PROFILE_DIR, name, ','.join(suffixes))
+            prune_profiles()
+        except Exception:
+            logger.exception("Could not write request profile")
+        finally:
+            _active_lock.release()
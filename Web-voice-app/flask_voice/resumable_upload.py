@@ -0,0 +1,565 @@
+"""
+Resumable chunked uploads.
+Large recordings are uploaded as init / append-chunk-at-offset / finalize and
+assembled on disk block by block. For streamable formats the completed prefix
+is decoded and transcribed in the background while later chunks are arriving.
+
+Session state lives on disk (not in process memory) so chunks of one upload can
+be handled by different gunicorn workers:
+
+    <root>/<upload_id>/meta.json       upload parameters
+    <root>/<upload_id>/offset          committed (checksum-verified) byte count
+    <root>/<upload_id>/data<ext>       assembled upload
+    <root>/<upload_id>/final.json      written by finalize
+    <root>/<upload_id>/segments.jsonl  background transcripts of the prefix
+    <root>/<upload_id>/done.json       written when background work finishes
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import subprocess
+import wave
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from audio_converter import (
+    WAV_SAMPLE_RATE, WAV_CHANNELS, WAV_SAMPLE_WIDTH, STREAM_BLOCK_SIZE, FFMPEG_PROCESS_BYTES,
+    find_ffmpeg, memory_budget, MemoryLimitError,
+)
+from process_utils import process_alive
+from voice_activity import split_at_pauses
+
+logger = logging.getLogger(__name__)
+
+# Upload limits
+MAX_RESUMABLE_UPLOAD_SIZE = int(os.environ.get('MAX_RESUMABLE_UPLOAD_MB', '512')) * 1024 * 1024
+RECOMMENDED_CHUNK_SIZE = 4 * 1024 * 1024  # must stay below MAX_CONTENT_LENGTH
+WRITE_BLOCK_SIZE = 64 * 1024
+
+# Unfinished uploads older than this are removed
+UPLOAD_TTL_SECONDS = 24 * 60 * 60
+
+# Formats ffmpeg can decode from a growing, non-seekable stream.
+# (MP4/M4A usually keep their index at the end of the file, WMA needs seeking.)
+PROGRESSIVE_FORMATS = {'.wav', '.mp3', '.ogg', '.webm', '.flac', '.aac'}
+
+# Background prefix transcription: segment length, and the window around each
+# segment boundary searched for the quietest frame to cut at
+SEGMENT_SECONDS = 30
+CUT_SEARCH_SECONDS = 2
+
+POLL_INTERVAL = 0.2
+# How long a request waits for another worker writing the same upload
+LOCK_WAIT_SECONDS = 30
+# Background decoding stops if no chunk arrives for this long
+IDLE_TIMEOUT_SECONDS = 600
+# How long finalize waits for background transcription to finish
+FINALIZE_WAIT_SECONDS = 600
+
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Client-visible error for a resumable upload request."""
+
+    def __init__(self, message, status_code=400, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ResumableUploadManager:
+    """
+    Manages resumable upload sessions under `root`.
+
+    Args:
+        root: Directory holding one sub-directory per upload
+        recognize_fn: Callable (pcm_bytes, sample_rate, sample_width, language, details=None)
+            returning (text, error_message, detected_language, trimmed_seconds)
+            and setting details['failed'] when recognition failed rather than
+            finding no speech; used for background transcription of the prefix
+    """
+
+    def __init__(self, root, recognize_fn):
+        self.root = os.path.normpath(root)
+        self.recognize_fn = recognize_fn
+        # Per-upload in-process locks: {upload_id: [lock, users]}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # -- paths -------------------------------------------------------------
+
+    def _session_dir(self, upload_id):
+        if not upload_id or not _UPLOAD_ID_RE.match(upload_id):
+            raise UploadError("Invalid upload id", 404)
+        return os.path.join(self.root, upload_id)
+
+    def _path(self, upload_id, name):
+        return os.path.join(self._session_dir(upload_id), name)
+
+    def data_path(self, upload_id, meta=None):
+        meta = meta or self._load_meta(upload_id)
+        return self._path(upload_id, f"data{meta['extension']}")
+
+    def _load_meta(self, upload_id):
+        try:
+            return _read_json(self._path(upload_id, 'meta.json'))
+        except FileNotFoundError:
+            raise UploadError("Upload not found or expired", 404)
+
+    def _read_offset(self, upload_id):
+        try:
+            with open(self._path(upload_id, 'offset'), 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            raise UploadError("Upload not found or expired", 404)
+
+    def _write_offset(self, upload_id, offset):
+        path = self._path(upload_id, 'offset')
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _locked(self, upload_id):
+        """
+        Serialize writers of one upload: an in-process lock for this worker's
+        threads/greenlets, then an flock on meta.json for other workers. Other
+        uploads are never blocked.
+
+        Raises:
+            UploadError: If another worker holds the upload for LOCK_WAIT_SECONDS
+        """
+        with self._locks_guard:
+            entry = self._locks.setdefault(upload_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0], open(self._path(upload_id, 'meta.json'), 'r') as lock_file:
+                if fcntl:
+                    # Polled, so a gevent worker's event loop never blocks in flock()
+                    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+                    while True:
+                        try:
+                            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except BlockingIOError:
+                            if time.monotonic() > deadline:
+                                raise UploadError("Upload is busy in another request", 409,
+                                                  offset=self._read_offset(upload_id))
+                            time.sleep(POLL_INTERVAL)
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[upload_id]
+
+    def is_finalized(self, upload_id):
+        return os.path.exists(self._path(upload_id, 'final.json'))
+
+    # -- session lifecycle -------------------------------------------------
+
+    def create(self, filename, extension, language, total_size=None):
+        """
+        Start a new upload session.
+
+        Returns:
+            dict: Session metadata (includes `upload_id`)
+        """
+        if total_size is not None and total_size > MAX_RESUMABLE_UPLOAD_SIZE:
+            raise UploadError(
+                f"File too large. Maximum size is {MAX_RESUMABLE_UPLOAD_SIZE // (1024 * 1024)}MB",
+                413
+            )
+
+        self.cleanup_expired()
+
+        upload_id = os.urandom(16).hex()
+        session_dir = self._session_dir(upload_id)
+        os.makedirs(session_dir)
+
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'extension': extension,
+            'language': language,
+            'total_size': total_size,
+            'created': time.time(),
+            'owner_pid': os.getpid(),
+            'progressive': extension in PROGRESSIVE_FORMATS and find_ffmpeg() is not None,
+        }
+        open(self.data_path(upload_id, meta), 'wb').close()
+        self._write_offset(upload_id, 0)
+        _write_json_atomic(self._path(upload_id, 'meta.json'), meta)
+
+        if meta['progressive']:
+            PrefixTranscriber(self, upload_id, meta).start()
+
+        logger.info(f"Resumable upload {upload_id} created for {filename} (progressive: {meta['progressive']})")
+        return meta
+
+    def status(self, upload_id):
+        meta = self._load_meta(upload_id)
+        return {
+            'uploadId': upload_id,
+            'offset': self._read_offset(upload_id),
+            'totalSize': meta['total_size'],
+            'finalized': self.is_finalized(upload_id),
+        }
+
+    def append(self, upload_id, offset, stream, checksum=None):
+        """
+        Append a chunk read from `stream` at `offset`.
+
+        The chunk is written to disk in blocks while being hashed; if the
+        SHA-256 does not match `checksum` it is truncated away again, so the
+        committed offset only ever covers verified data.
+
+        Returns:
+            int: New committed offset
+        """
+        meta = self._load_meta(upload_id)
+        data_path = self.data_path(upload_id, meta)
+        limit = meta['total_size'] or MAX_RESUMABLE_UPLOAD_SIZE
+
+        with self._locked(upload_id):
+            if self.is_finalized(upload_id):
+                raise UploadError("Upload already finalized", 409)
+
+            committed = self._read_offset(upload_id)
+            if offset != committed:
+                raise UploadError("Offset mismatch", 409, offset=committed)
+
+            digest = hashlib.sha256()
+            written = 0
+            with open(data_path, 'r+b') as f:
+                f.seek(committed)
+                f.truncate()
+                while True:
+                    block = stream.read(WRITE_BLOCK_SIZE)
+                    if not block:
+                        break
+                    if committed + written + len(block) > limit:
+                        f.truncate(committed)
+                        raise UploadError(
+                            f"Upload exceeds {'declared size' if meta['total_size'] else 'maximum size'} "
+                            f"of {limit} bytes",
+                            413, offset=committed
+                        )
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
+
+                if checksum and digest.hexdigest() != checksum.strip().lower():
+                    f.truncate(committed)
+                    raise UploadError("Chunk checksum mismatch", 400, offset=committed)
+
+            self._write_offset(upload_id, committed + written)
+
+        return committed + written
+
+    def finalize(self, upload_id, checksum=None, wait=FINALIZE_WAIT_SECONDS):
+        """
+        Mark the upload complete.
+
+        Returns:
+            tuple: (meta, data_path, prefix_result) where prefix_result is the
+                combined background transcription, or None if the caller must
+                transcribe data_path itself
+        """
+        meta = self._load_meta(upload_id)
+        data_path = self.data_path(upload_id, meta)
+
+        offset = self._read_offset(upload_id)
+        if offset == 0:
+            raise UploadError("No data has been uploaded", 400, offset=0)
+        if meta['total_size'] is not None and offset != meta['total_size']:
+            raise UploadError("Upload is incomplete", 409, offset=offset)
+
+        # Hashed without the lock: appends only ever write past the committed offset
+        if checksum:
+            digest = hashlib.sha256()
+            remaining = offset
+            with open(data_path, 'rb') as f:
+                while remaining:
+                    block = f.read(min(WRITE_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    digest.update(block)
+                    remaining -= len(block)
+            if digest.hexdigest() != checksum.strip().lower():
+                raise UploadError("File checksum mismatch", 400, offset=offset)
+
+        # Same lock as append(), so a chunk cannot land between the checks and final.json
+        with self._locked(upload_id):
+            committed = self._read_offset(upload_id)
+            if committed != offset:
+                raise UploadError("Upload changed while finalizing", 409, offset=committed)
+            _write_json_atomic(self._path(upload_id, 'final.json'), {'size': offset, 'finalized': time.time()})
+
+        prefix_result = None
+        if meta['progressive']:
+            prefix_result = self._wait_for_prefix(upload_id, meta, wait)
+        return meta, data_path, prefix_result
+
+    def discard(self, upload_id):
+        """Delete an upload session and its files."""
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def cleanup_expired(self, ttl=UPLOAD_TTL_SECONDS):
+        """Remove sessions older than `ttl` seconds."""
+        now = time.time()
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            return
+        for upload_id in entries:
+            if not _UPLOAD_ID_RE.match(upload_id):
+                continue
+            session_dir = os.path.join(self.root, upload_id)
+            try:
+                if now - os.path.getmtime(session_dir) > ttl:
+                    shutil.rmtree(session_dir, ignore_errors=True)
+                    logger.info(f"Removed expired upload {upload_id}")
+            except OSError:
+                continue
+
+    # -- background prefix results -----------------------------------------
+
+    def _wait_for_prefix(self, upload_id, meta, wait):
+        done_path = self._path(upload_id, 'done.json')
+        deadline = time.monotonic() + wait
+        while not os.path.exists(done_path):
+            if time.monotonic() > deadline:
+                logger.warning(f"Timed out waiting for background transcription of {upload_id}")
+                return None
+            if not process_alive(meta['owner_pid']):
+                logger.warning(f"Background transcriber for {upload_id} is gone; transcribing in full")
+                return None
+            time.sleep(POLL_INTERVAL)
+
+        done = _read_json(done_path)
+        if done.get('status') != 'complete':
+            logger.warning(f"Background transcription of {upload_id} failed: {done.get('error')}")
+            return None
+
+        segments = []
+        segments_path = self._path(upload_id, 'segments.jsonl')
+        if os.path.exists(segments_path):
+            with open(segments_path, 'r', encoding='utf-8') as f:
+                segments = [json.loads(line) for line in f if line.strip()]
+
+        language = meta['language']
+        for segment in segments:
+            if segment.get('text') and language == 'auto':
+                language = segment['language']
+        for segment in segments:
+            if segment.get('text') or not segment.get('failed') or not segment.get('retry_path'):
+                continue
+            # Retry segments whose recognition failed in the background once
+            # (segments without speech would only fail again)
+            retry_path = self._path(upload_id, segment['retry_path'])
+            with wave.open(retry_path, 'rb') as wav_file:
+                pcm = wav_file.readframes(wav_file.getnframes())
+            details = {}
+            text, error_message, detected, trimmed = self.recognize_fn(
+                pcm, WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH, language, details=details
+            )
+            segment.update({'text': text, 'error': error_message, 'trimmed_seconds': trimmed,
+                            'failed': bool(details.get('failed'))})
+            if text and language == 'auto':
+                language = detected
+
+        texts = [segment['text'] for segment in segments if segment.get('text')]
+        failed = [segment for segment in segments if segment.get('failed') and not segment.get('text')]
+        errors = [segment['error'] for segment in failed] + [
+            segment['error'] for segment in segments
+            if segment.get('error') and not segment.get('text') and not segment.get('failed')
+        ]
+        return {
+            'text': ' '.join(texts) if texts else None,
+            'error_message': errors[0] if errors and not texts else None,
+            'language': language,
+            'trimmed_seconds': sum(segment.get('trimmed_seconds') or 0.0 for segment in segments),
+            'segments': len(segments),
+            'duration_seconds': segments[-1]['end'] if segments else 0.0,
+            'incomplete': bool(failed),
+            'failed_segments': [segment['index'] for segment in failed],
+        }
+
+
+class PrefixTranscriber(threading.Thread):
+    """
+    Background decoder/transcriber for one progressive upload.
+
+    A feeder thread tails the committed bytes of the upload into ffmpeg's stdin;
+    this thread reads 16kHz mono PCM from ffmpeg's stdout, cuts it into
+    ~SEGMENT_SECONDS segments at the quietest nearby frame and transcribes each
+    segment as soon as it is complete.
+    """
+
+    def __init__(self, manager, upload_id, meta):
+        super().__init__(name=f"prefix-{upload_id[:8]}", daemon=True)
+        self.manager = manager
+        self.upload_id = upload_id
+        self.meta = meta
+        self.language = meta['language']
+        self.segment_index = 0
+        self.position_bytes = 0
+        self.feed_error = None
+        self.aborted = False
+
+    def run(self):
+        try:
+            status, error = self._run()
+        except MemoryLimitError as e:
+            status, error = 'failed', str(e)
+        except Exception as e:
+            logger.error(f"Background transcription of {self.upload_id} failed: {str(e)}")
+            status, error = 'failed', str(e)
+        if self.aborted:
+            return
+        try:
+            _write_json_atomic(self.manager._path(self.upload_id, 'done.json'), {'status': status, 'error': error})
+        except OSError:
+            pass  # Session was discarded
+
+    def _run(self):
+        bytes_per_second = WAV_SAMPLE_RATE * WAV_CHANNELS * WAV_SAMPLE_WIDTH
+        segment_bytes = SEGMENT_SECONDS * bytes_per_second
+        search_bytes = CUT_SEARCH_SECONDS * bytes_per_second
+
+        command = [
+            find_ffmpeg(), '-hide_banner', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-vn',
+            '-ac', str(WAV_CHANNELS),
+            '-ar', str(WAV_SAMPLE_RATE),
+            '-acodec', 'pcm_s16le',
+            '-f', 's16le',
+            'pipe:1',
+        ]
+
+        reserved = FFMPEG_PROCESS_BYTES + segment_bytes + search_bytes + 2 * STREAM_BLOCK_SIZE
+        with memory_budget.reserve(reserved, timeout=0):
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL)
+            feeder = threading.Thread(target=self._feed, args=(process,), daemon=True)
+            feeder.start()
+
+            blocks = iter(lambda: process.stdout.read(STREAM_BLOCK_SIZE), b'')
+            try:
+                for segment in split_at_pauses(blocks, segment_bytes, search_bytes,
+                                               WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH):
+                    if self.aborted:
+                        break
+                    self._transcribe_segment(segment)
+            finally:
+                process.stdout.close()
+                if self.aborted:
+                    process.kill()
+                returncode = process.wait()
+                feeder.join()
+
+            if self.aborted:
+                return 'aborted', None
+            if self.feed_error:
+                return 'failed', self.feed_error
+            if returncode != 0:
+                return 'failed', f"ffmpeg exited with code {returncode}"
+        return 'complete', None
+
+    def _feed(self, process):
+        """Copy committed upload bytes into ffmpeg until the upload is finalized."""
+        fed = 0
+        last_progress = time.monotonic()
+        try:
+            with open(self.manager.data_path(self.upload_id, self.meta), 'rb') as data_file:
+                while True:
+                    if not os.path.isdir(self.manager._session_dir(self.upload_id)):
+                        self.aborted = True
+                        break
+                    committed = self.manager._read_offset(self.upload_id)
+                    if fed < committed:
+                        data_file.seek(fed)
+                        block = data_file.read(min(WRITE_BLOCK_SIZE, committed - fed))
+                        process.stdin.write(block)
+                        fed += len(block)
+                        last_progress = time.monotonic()
+                        continue
+                    if self.manager.is_finalized(self.upload_id):
+                        break
+                    if time.monotonic() - last_progress > IDLE_TIMEOUT_SECONDS:
+                        self.feed_error = "Upload idle for too long"
+                        break
+                    time.sleep(POLL_INTERVAL)
+        except UploadError:
+            self.aborted = True
+        except (BrokenPipeError, OSError) as e:
+            self.feed_error = f"Decoder stopped: {str(e)}"
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def _transcribe_segment(self, pcm):
+        bytes_per_second = float(WAV_SAMPLE_RATE * WAV_CHANNELS * WAV_SAMPLE_WIDTH)
+        record = {
+            'index': self.segment_index,
+            'start': self.position_bytes / bytes_per_second,
+            'end': (self.position_bytes + len(pcm)) / bytes_per_second,
+            'language': self.language,
+        }
+        self.segment_index += 1
+        self.position_bytes += len(pcm)
+
+        details = {}
+        text, error_message, detected, trimmed = self.manager.recognize_fn(
+            pcm, WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH, self.language, details=details
+        )
+        record.update({'text': text, 'error': error_message, 'trimmed_seconds': trimmed,
+                       'failed': bool(details.get('failed'))})
+        if text:
+            record['language'] = detected
+            if self.language == 'auto':
+                # Later segments reuse the language found in the first one
+                self.language = detected
+        elif record['failed']:
+            # Keep the audio so finalize can retry this segment
+            retry_name = f"segment_{record['index']:05d}.wav"
+            with wave.open(self.manager._path(self.upload_id, retry_name), 'wb') as wav_file:
+                wav_file.setnchannels(WAV_CHANNELS)
+                wav_file.setsampwidth(WAV_SAMPLE_WIDTH)
+                wav_file.setframerate(WAV_SAMPLE_RATE)
+                wav_file.writeframes(pcm)
+            record['retry_path'] = retry_name
+
+        logger.info(f"Upload {self.upload_id}: segment {record['index']} "
+                    f"({record['start']:.1f}-{record['end']:.1f}s) transcribed")
+        with open(self.manager._path(self.upload_id, 'segments.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
@@ -1,29 +1,288 @@
 """
-Run script to start both Flask transcription services.
+Run script to start and supervise the Flask transcription service.
 
-This script starts:
-1. flask_transcribe.py - Microphone transcription service (port 5003)
-2. flask_upload_transcribe.py - File upload transcription service (port 5000)
+This script starts transcription_service.py, a single process group that serves:
+1. Microphone transcription routes (port 5003)
+2. File upload transcription routes (port 5000)
 
-Press Ctrl+C to stop both services.
+Both share one transcription engine, cache and worker pools.
+The individual services (flask_transcribe.py, flask_upload_transcribe.py)
+can still be run on their own.
+
+The supervisor:
+- Reads child output on background threads, so a chatty service never blocks
+  on a full pipe
+- Restarts the service with exponential backoff if it exits or stops answering
+  /health
+- Reports readiness changes from /ready (503 when the instance is saturated)
+- When gunicorn is available (not on Windows), runs it with several workers and
+  grows/shrinks the worker count (SIGTTIN/SIGTTOU) based on recognizer queue depth,
+  sampled from one worker's /ready report per check, with hysteresis
+
+Press Ctrl+C to stop the service.
 """
 
 import subprocess
 import sys
 import os
+import json
+import importlib.util
+import queue
 import signal
+import threading
 import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 
 # Get the directory where this script is located
 SCRIPT_DIR = Path(__file__).parent.absolute()
 
-# Paths to the Flask services
-FLASK_TRANSCRIBE = SCRIPT_DIR / "flask_transcribe.py"
-FLASK_UPLOAD_TRANSCRIBE = SCRIPT_DIR / "flask_upload_transcribe.py"
+# Path to the unified Flask service
+TRANSCRIPTION_SERVICE = SCRIPT_DIR / "transcription_service.py"
+
+SERVICE_PORTS = [5000, 5003]
+HEALTH_URL = "http://127.0.0.1:5000/health"
+READY_URL = "http://127.0.0.1:5000/ready"
+
+# Restart backoff: doubles after each quick failure, resets once the service
+# has stayed up for STABLE_SECONDS
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 30.0
+STABLE_SECONDS = 60
+
+# Readiness / liveness checks
+READY_TIMEOUT = 60
+HEALTH_INTERVAL = 5
+HEALTH_TIMEOUT = 3
+HEALTH_FAILURES_BEFORE_RESTART = 3
+
+# Worker scaling (gunicorn only)
+MIN_WORKERS = int(os.environ.get('MIN_WORKERS', '2'))
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '8'))
+SCALE_UP_QUEUE_DEPTH = 4     # queued recognizer calls that trigger a new worker
+SCALE_UP_CHECKS = 3          # consecutive busy checks before adding a worker
+SCALE_DOWN_CHECKS = 12       # consecutive idle checks before removing one
+SCALE_COOLDOWN_SECONDS = 60  # no further scaling this soon after a change
+
+# Output lines from all children, printed by the main thread
+output_queue = queue.Queue()
+
+# Store supervised services
+services = []
+
+
+class SupervisedService:
+    """A child process that is restarted with backoff when it dies or hangs."""
+
+    def __init__(self, name, command, health_url=None, ready_url=None, scalable=False):
+        self.name = name
+        self.command = command
+        self.health_url = health_url
+        self.ready_url = ready_url
+        self.scalable = scalable
+        self.workers = 1
+        self.process = None
+        self.started_at = 0.0
+        self.up = False
+        self.ready = None
+        self.restarts = 0
+        self.backoff = RESTART_BACKOFF_INITIAL
+        self.next_start = 0.0
+        self.health_failures = 0
+        self.last_health_check = 0.0
+        self.busy_checks = 0
+        self.idle_checks = 0
+        self.last_scaled = 0.0
+
+    def start(self):
+        """Start the child process and a thread that drains its output."""
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                cwd=str(SCRIPT_DIR),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                env=dict(os.environ, PYTHONUNBUFFERED='1'),
+            )
+        except Exception as e:
+            print(f"ERROR: Failed to start {self.name}: {e}")
+            self.process = None
+            self.schedule_restart()
+            return False
+
+        self.started_at = time.monotonic()
+        self.up = False
+        self.ready = None
+        self.health_failures = 0
+        self.workers = MIN_WORKERS if self.scalable else 1
+        threading.Thread(target=drain_output, args=(self.name, self.process), daemon=True).start()
+        print(f"✓ {self.name} started (PID: {self.process.pid})")
+        return True
+
+    def stop(self, timeout=5):
+        """Terminate the child process, killing it if it does not exit."""
+        if self.process and self.process.poll() is None:
+            print(f"Stopping {self.name} (PID: {self.process.pid})...")
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                print(f"Force killing process {self.process.pid}...")
+                self.process.kill()
+                self.process.wait()
 
-# Store process references
-processes = []
+    def schedule_restart(self):
+        """Plan the next start time using exponential backoff."""
+        if self.started_at and time.monotonic() - self.started_at >= STABLE_SECONDS:
+            self.backoff = RESTART_BACKOFF_INITIAL
+        self.next_start = time.monotonic() + self.backoff
+        print(f"⚠ Restarting {self.name} in {self.backoff:.0f}s")
+        self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        self.restarts += 1
+
+    def check(self):
+        """Run one supervision step: restart, liveness, readiness and scaling."""
+        now = time.monotonic()
+
+        if self.process is None:
+            if now >= self.next_start:
+                self.start()
+            return
+
+        if self.process.poll() is not None:
+            print(f"\n⚠ {self.name} has stopped unexpectedly (exit code: {self.process.returncode})")
+            self.process = None
+            self.schedule_restart()
+            return
+
+        interval = HEALTH_INTERVAL if self.up else 1
+        if not self.health_url or now - self.last_health_check < interval:
+            return
+        self.last_health_check = now
+
+        status, _ = fetch_json(self.health_url)
+        if status != 200:
+            if not self.up:
+                if now - self.started_at > READY_TIMEOUT:
+                    print(f"⚠ {self.name} did not start within {READY_TIMEOUT}s")
+                    self.stop()
+            else:
+                self.health_failures += 1
+                if self.health_failures >= HEALTH_FAILURES_BEFORE_RESTART:
+                    print(f"⚠ {self.name} failed {self.health_failures} health checks")
+                    self.stop()
+            return
+
+        self.health_failures = 0
+        if not self.up:
+            self.up = True
+            print(f"✓ {self.name} is up")
+
+        if not self.ready_url:
+            return
+        status, report = fetch_json(self.ready_url)
+        if report is None:
+            return
+        ready = status == 200
+        if ready != self.ready:
+            if ready:
+                print(f"✓ {self.name} is ready")
+            else:
+                print(f"⚠ {self.name} is not ready: {'; '.join(report.get('reasons', []))}")
+            self.ready = ready
+
+        if self.scalable:
+            self.autoscale(report)
+
+    def autoscale(self, report):
+        """
+        Add or remove gunicorn workers based on recognizer queue depth and saturation.
+
+        This is a sampling heuristic: each /ready report comes from whichever
+        worker accepted the request, and its counters cover that process only.
+        Decisions therefore need a run of consecutive samples (short to scale
+        up, long to scale down, so one idle worker among busy ones does not
+        shrink the pool), and no further change is made for
+        SCALE_COOLDOWN_SECONDS after scaling so the pool does not flap.
+        """
+        recognizer = report.get('recognizer', {})
+        queued = recognizer.get('queued', 0) + report.get('conversion_memory', {}).get('waiting', 0)
+        active = recognizer.get('active', 0)
+        saturated = not report.get('ready', True) and report.get('converter_available', True)
+
+        busy = queued >= SCALE_UP_QUEUE_DEPTH or saturated
+        self.busy_checks = self.busy_checks + 1 if busy else 0
+        self.idle_checks = self.idle_checks + 1 if queued == 0 and active == 0 else 0
+
+        if time.monotonic() - self.last_scaled < SCALE_COOLDOWN_SECONDS:
+            return
+        if self.busy_checks >= SCALE_UP_CHECKS and self.workers < MAX_WORKERS:
+            self.process.send_signal(signal.SIGTTIN)
+            self.workers += 1
+            print(f"↑ {self.name}: queue depth {queued}, scaling up to {self.workers} workers")
+        elif self.idle_checks >= SCALE_DOWN_CHECKS and self.workers > MIN_WORKERS:
+            self.process.send_signal(signal.SIGTTOU)
+            self.workers -= 1
+            print(f"↓ {self.name}: idle, scaling down to {self.workers} workers")
+        else:
+            return
+        self.last_scaled = time.monotonic()
+        self.busy_checks = 0
+        self.idle_checks = 0
+
+
+def drain_output(name, process):
+    """Read a child's output line by line so its pipe never fills up."""
+    try:
+        for line in process.stdout:
+            output_queue.put(f"[{name}] {line.rstrip()}")
+    except (ValueError, OSError):
+        pass  # Pipe closed
+
+
+def fetch_json(url):
+    """
+    GET a JSON endpoint.
+
+    Returns:
+        tuple: (status code, parsed body); (None, None) if unreachable
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=HEALTH_TIMEOUT) as response:
+            return response.status, json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read().decode('utf-8'))
+        except Exception:
+            return e.code, None
+    except Exception:
+        return None, None
+
+
+def service_command():
+    """
+    Build the command for the unified service.
+
+    Uses gunicorn (scalable, with gevent workers when installed) where
+    available, otherwise the built-in development server.
+
+    Returns:
+        tuple: (command list, scalable)
+    """
+    if os.name == 'nt' or importlib.util.find_spec('gunicorn') is None:
+        return [sys.executable, str(TRANSCRIPTION_SERVICE)], False
+
+    command = [sys.executable, '-m', 'gunicorn']
+    for port in SERVICE_PORTS:
+        command += ['--bind', f'0.0.0.0:{port}']
+    command += ['--workers', str(MIN_WORKERS), '--timeout', '600', '--graceful-timeout', '30']
+    if importlib.util.find_spec('gevent') is not None:
+        command += ['--worker-class', 'gevent', '--worker-connections', '100']
+    command.append('transcription_service:app')
+    return command, True
 
 
 def signal_handler(sig, frame):
@@ -31,17 +290,10 @@ def signal_handler(sig, frame):
     print("\n\n" + "=" * 60)
     print("Stopping all services...")
     print("=" * 60)
-    
-    for process in processes:
-        if process.poll() is None:  # Process is still running
-            print(f"Stopping process {process.pid}...")
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                print(f"Force killing process {process.pid}...")
-                process.kill()
-    
+
+    for service in services:
+        service.stop()
+
     print("All services stopped.")
     sys.exit(0)
 
@@ -54,32 +306,8 @@ def check_file_exists(file_path, service_name):
     return True
 
 
-def start_service(script_path, service_name, port):
-    """Start a Flask service in a separate process."""
-    print(f"\nStarting {service_name} on port {port}...")
-    
-    try:
-        process = subprocess.Popen(
-            [sys.executable, str(script_path)],
-            cwd=str(SCRIPT_DIR),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-        
-        processes.append(process)
-        print(f"✓ {service_name} started (PID: {process.pid})")
-        return process
-    except Exception as e:
-        print(f"ERROR: Failed to start {service_name}: {e}")
-        return None
-
-
 def monitor_processes():
-    """Monitor all processes and print their output."""
-    import select
-    
+    """Supervise all services and print their output."""
     print("\n" + "=" * 60)
     print("Services are running. Press Ctrl+C to stop all services.")
     print("=" * 60)
@@ -87,22 +315,21 @@ def monitor_processes():
     print("  - Microphone Transcription: http://localhost:5003/transcribe")
     print("  - File Upload Transcription: http://localhost:5000/api/transcribe-file")
     print("\n" + "=" * 60 + "\n")
-    
-    # Simple output monitoring
+
     while True:
-        all_dead = True
-        for i, process in enumerate(processes):
-            if process.poll() is None:
-                all_dead = False
-            else:
-                # Process died
-                print(f"\n⚠ Service {i+1} has stopped unexpectedly (exit code: {process.returncode})")
-        
-        if all_dead:
-            print("\nAll services have stopped.")
-            break
-        
-        time.sleep(1)
+        for service in services:
+            service.check()
+
+        # Print child output until the next supervision tick
+        deadline = time.monotonic() + 0.5
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                print(output_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
 
 
 def main():
@@ -110,39 +337,29 @@ def main():
     print("=" * 60)
     print("VoiceScript Flask Services Launcher")
     print("=" * 60)
-    
+
     # Register signal handler for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    
-    # Check if service files exist
-    if not check_file_exists(FLASK_TRANSCRIBE, "flask_transcribe.py"):
-        sys.exit(1)
-    
-    if not check_file_exists(FLASK_UPLOAD_TRANSCRIBE, "flask_upload_transcribe.py"):
+
+    # Check if service file exists
+    if not check_file_exists(TRANSCRIPTION_SERVICE, "transcription_service.py"):
         sys.exit(1)
-    
+
     # Start services
     print("\n" + "=" * 60)
     print("Starting Flask Services...")
     print("=" * 60)
-    
-    # Start microphone transcription service (port 5003)
-    mic_process = start_service(FLASK_TRANSCRIBE, "Microphone Transcription Service", 5003)
-    if not mic_process:
-        print("Failed to start microphone service. Exiting.")
-        sys.exit(1)
-    
-    # Small delay to avoid port conflicts
-    time.sleep(1)
-    
-    # Start file upload transcription service (port 5000)
-    upload_process = start_service(FLASK_UPLOAD_TRANSCRIBE, "File Upload Transcription Service", 5000)
-    if not upload_process:
-        print("Failed to start upload service. Stopping microphone service...")
-        mic_process.terminate()
+
+    command, scalable = service_command()
+    service = SupervisedService("Transcription Service", command, HEALTH_URL, READY_URL, scalable=scalable)
+    services.append(service)
+    print(f"\nStarting {service.name} on ports {', '.join(str(port) for port in SERVICE_PORTS)}"
+          f"{' (gunicorn)' if scalable else ''}...")
+    if not service.start():
+        print("Failed to start transcription service. Exiting.")
         sys.exit(1)
-    
+
     # Monitor processes
     try:
         monitor_processes()
@@ -152,4 +369,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
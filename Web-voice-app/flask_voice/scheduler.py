@@ -0,0 +1,230 @@
+"""
+Priority scheduler for recognizer calls.
+Short interactive microphone commands and long file jobs share the same
+recognizer quota. Every recognize call takes a slot from this scheduler, which
+serves priority classes by weighted fair queuing (stride scheduling on
+recognized audio seconds) with starvation protection, and records per-class
+queue-wait times and recent recognizer call latencies.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from wav_reader import MappedWav
+
+logger = logging.getLogger(__name__)
+
+# Concurrent recognizer calls allowed per process
+RECOGNIZER_CONCURRENCY = int(os.environ.get('RECOGNIZER_CONCURRENCY', '8'))
+
+# Priority classes and their weights (share of recognizer time under contention)
+INTERACTIVE = 'interactive'
+STANDARD = 'standard'
+BULK = 'bulk'
+CLASS_WEIGHTS = {
+    INTERACTIVE: 8.0,
+    STANDARD: 2.0,
+    BULK: 1.0,
+}
+
+# Microphone clips up to this long are interactive; uploads up to this long are standard
+INTERACTIVE_MAX_SECONDS = 15
+STANDARD_MAX_SECONDS = 120
+
+# A request waiting longer than this is served next regardless of class
+STARVATION_SECONDS = float(os.environ.get('SCHEDULER_STARVATION_SECONDS', '10'))
+
+# Queue-wait samples kept per class (and recognizer latency samples) for percentiles
+WAIT_SAMPLES = 500
+
+
+class SchedulerTimeout(RuntimeError):
+    """Raised when a recognizer slot is not granted within the timeout."""
+
+
+def classify(route, estimated_seconds=None):
+    """
+    Pick a priority class from the route type and estimated audio duration.
+
+    Args:
+        route: 'microphone', 'upload' or 'background'
+        estimated_seconds: Estimated audio duration (None if unknown)
+    """
+    if route == 'microphone':
+        if estimated_seconds is None or estimated_seconds <= INTERACTIVE_MAX_SECONDS:
+            return INTERACTIVE
+        return STANDARD
+    if route == 'upload':
+        if estimated_seconds is not None and estimated_seconds > STANDARD_MAX_SECONDS:
+            return BULK
+        return STANDARD
+    return BULK
+
+
+def estimate_duration_seconds(file_size_bytes, is_wav, path=None):
+    """
+    Rough audio duration of an uploaded file.
+
+    For a WAV at `path` the duration is read from its header, so any sample
+    rate, width or channel count is estimated correctly. Otherwise (or if the
+    header cannot be parsed) it is derived from the file size, assuming 16kHz
+    mono 16-bit WAV or ~128kbps compressed audio.
+    """
+    if is_wav and path is not None:
+        try:
+            with MappedWav(path) as wav:
+                return wav.duration_seconds
+        except (ValueError, OSError) as e:
+            logger.debug("Could not read WAV header of %s (%s); estimating from size", path, e)
+    bytes_per_second = 32000 if is_wav else 16000
+    return file_size_bytes / float(bytes_per_second)
+
+
+class _Waiter:
+    __slots__ = ('priority_class', 'cost', 'enqueued', 'event', 'granted')
+
+    def __init__(self, priority_class, cost):
+        self.priority_class = priority_class
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.event = threading.Event()
+        self.granted = False
+
+
+class RecognitionScheduler:
+    """
+    Grants up to `capacity` concurrent recognizer slots.
+
+    Each class has a stride-scheduling "pass" value that advances by
+    cost / weight whenever it is served; the waiting class with the lowest pass
+    goes next. A class that was idle re-enters at the current virtual time so it
+    cannot bank credit. Any waiter older than `starvation_seconds` is served
+    first, oldest first.
+    """
+
+    def __init__(self, capacity=RECOGNIZER_CONCURRENCY, weights=None, starvation_seconds=STARVATION_SECONDS):
+        self.capacity = max(1, capacity)
+        self.weights = dict(weights or CLASS_WEIGHTS)
+        self.starvation_seconds = starvation_seconds
+        self.active = 0
+        self._lock = threading.Lock()
+        self._queues = {name: deque() for name in self.weights}
+        self._pass = {name: 0.0 for name in self.weights}
+        self._virtual_time = 0.0
+        self._waits = {name: deque(maxlen=WAIT_SAMPLES) for name in self.weights}
+        self._served = {name: 0 for name in self.weights}
+        self._latencies = deque(maxlen=WAIT_SAMPLES)
+
+    @contextmanager
+    def slot(self, priority_class, cost=1.0, timeout=None):
+        """
+        Hold a recognizer slot for the duration of the block.
+
+        Args:
+            priority_class: One of the configured classes
+            cost: Work units (seconds of audio) this call will use
+            timeout: Seconds to wait for a slot (None waits indefinitely)
+
+        Raises:
+            SchedulerTimeout: If no slot was granted within `timeout`
+        """
+        if priority_class not in self._queues:
+            priority_class = STANDARD
+        waiter = _Waiter(priority_class, max(float(cost), 0.1))
+
+        with self._lock:
+            queue = self._queues[priority_class]
+            if not queue:
+                self._pass[priority_class] = max(self._pass[priority_class], self._virtual_time)
+            queue.append(waiter)
+            self._dispatch()
+
+        if not waiter.event.wait(timeout):
+            with self._lock:
+                if not waiter.granted:
+                    self._queues[priority_class].remove(waiter)
+                    raise SchedulerTimeout(f"No recognizer slot available within {timeout}s")
+
+        wait_seconds = time.monotonic() - waiter.enqueued
+        self._waits[priority_class].append(wait_seconds)
+        if wait_seconds > 1.0:
+            logger.info("%s recognizer call waited %.2fs for a slot", priority_class, wait_seconds)
+
+        granted = time.monotonic()
+        try:
+            yield wait_seconds
+        finally:
+            with self._lock:
+                self._latencies.append(time.monotonic() - granted)
+                self.active -= 1
+                self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiters. Caller must hold the lock."""
+        while self.active < self.capacity:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            waiter.granted = True
+            self.active += 1
+            self._served[waiter.priority_class] += 1
+            waiter.event.set()
+
+    def _next_waiter(self):
+        heads = [queue[0] for queue in self._queues.values() if queue]
+        if not heads:
+            return None
+
+        now = time.monotonic()
+        starving = [waiter for waiter in heads if now - waiter.enqueued > self.starvation_seconds]
+        if starving:
+            waiter = min(starving, key=lambda w: w.enqueued)
+        else:
+            waiter = min(heads, key=lambda w: (self._pass[w.priority_class], -self.weights[w.priority_class]))
+
+        name = waiter.priority_class
+        self._queues[name].popleft()
+        self._virtual_time = max(self._virtual_time, self._pass[name])
+        self._pass[name] += waiter.cost / self.weights[name]
+        return waiter
+
+    def stats(self):
+        """Per-class queue depth, served count and queue-wait percentiles, plus recognizer latency (ms)."""
+        with self._lock:
+            classes = {}
+            for name in self.weights:
+                waits = sorted(self._waits[name])
+                classes[name] = {
+                    'queued': len(self._queues[name]),
+                    'served': self._served[name],
+                    'wait_p50_ms': _percentile_ms(waits, 50),
+                    'wait_p95_ms': _percentile_ms(waits, 95),
+                    'wait_max_ms': round(waits[-1] * 1000, 1) if waits else 0.0,
+                }
+            latencies = sorted(self._latencies)
+            return {
+                'capacity': self.capacity,
+                'active': self.active,
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'classes': classes,
+                'recognizer_latency': {
+                    'samples': len(latencies),
+                    'p50_ms': _percentile_ms(latencies, 50),
+                    'p95_ms': _percentile_ms(latencies, 95),
+                    'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+                },
+            }
+
+
+def _percentile_ms(sorted_values, percentile):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100.0 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 1)
+
+
+recognition_scheduler = RecognitionScheduler()
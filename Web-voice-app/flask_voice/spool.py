@@ -0,0 +1,269 @@
+"""
+Managed spool directory for uploaded and converted audio files.
+
+Request handlers delete their temp files when they finish, but a worker that
+is killed (gunicorn's timeout, OOM, a crash) never runs that cleanup, and the
+orphans accumulate until the disk is full and every upload fails. The spool:
+
+- names files <kind>_<owner pid>_<random>_<name> so orphans can be found
+- removes files whose owner process is gone (or whose pid now belongs to a
+  process started after the file was written), and files with older names
+  that carry no pid once they are SPOOL_ORPHAN_AGE_SECONDS old, at startup and
+  every SPOOL_SWEEP_INTERVAL_SECONDS. Files of a live owner are never aged
+  out: under gevent workers gunicorn's timeout does not bound how long a
+  request (a long conversion, a slow upload) may still be using them
+- rejects new work (SpoolFullError) when the files on disk plus the incoming
+  file would exceed SPOOL_QUOTA_MB, after first trying a sweep
+- optionally places small files (up to SPOOL_RAM_MAX_FILE_MB, within
+  SPOOL_RAM_QUOTA_MB) on a RAM-backed directory such as /dev/shm
+  (SPOOL_RAM_DIR), avoiding slow ephemeral disks for short recordings
+
+Usage is measured by walking the directory at most every
+SPOOL_USAGE_CACHE_SECONDS; in between, files admitted since the last
+measurement are added to it. The quota is checked before writing, not
+reserved, so concurrent requests can overshoot it by at most the files they
+are writing.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+
+from process_utils import process_alive, process_start_time
+
+logger = logging.getLogger(__name__)
+
+SPOOL_QUOTA_BYTES = int(float(os.environ.get('SPOOL_QUOTA_MB', '1024')) * 1024 * 1024)
+# Age at which files without an owner pid (legacy names) are treated as orphans
+SPOOL_ORPHAN_AGE_SECONDS = float(os.environ.get('SPOOL_ORPHAN_AGE_SECONDS', '900'))
+SPOOL_SWEEP_INTERVAL_SECONDS = float(os.environ.get('SPOOL_SWEEP_INTERVAL_SECONDS', '60'))
+# RAM-backed spool for small files (empty disables), e.g. /dev/shm/voicescript-spool
+SPOOL_RAM_DIR = os.environ.get('SPOOL_RAM_DIR', '')
+SPOOL_RAM_QUOTA_BYTES = int(float(os.environ.get('SPOOL_RAM_QUOTA_MB', '256')) * 1024 * 1024)
+SPOOL_RAM_MAX_FILE_BYTES = int(float(os.environ.get('SPOOL_RAM_MAX_FILE_MB', '8')) * 1024 * 1024)
+# How long a measured directory size is reused before walking the tree again
+SPOOL_USAGE_CACHE_SECONDS = float(os.environ.get('SPOOL_USAGE_CACHE_SECONDS', '2'))
+
+# <kind>_<pid>_<16 hex>_<name>; older names (temp_<hex>_..., converted_...) are only aged out
+_SPOOL_NAME_RE = re.compile(r'^(?:temp|converted)_(\d+)_[0-9a-f]{16}_')
+_LEGACY_NAME_RE = re.compile(r'^(?:temp|converted)_')
+
+
+class SpoolFullError(RuntimeError):
+    """Raised when a file would not fit in the spool quota."""
+
+
+def directory_size(path):
+    """Total size in bytes of the files under `path`."""
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(directory, filename))
+            except OSError:
+                continue  # Deleted while walking
+    return total
+
+
+def _owner_gone(pid, mtime):
+    """True if `pid` exited, or was reused by a process started after the file was last written."""
+    if not process_alive(pid):
+        return True
+    started = process_start_time(pid)
+    # /proc's boot time has one-second resolution
+    return started is not None and mtime < started - 2
+
+
+class UploadSpool:
+    """
+    Quota-enforced, self-cleaning directory (plus optional RAM tier) for
+    request temp files.
+
+    Args:
+        root: Disk spool directory (UPLOAD_FOLDER); sub-directories such as
+            resumable sessions count towards the quota but are not swept here
+        ram_root: RAM-backed directory for small files, or '' to disable
+    """
+
+    def __init__(self, root, quota_bytes=SPOOL_QUOTA_BYTES, ram_root=SPOOL_RAM_DIR,
+                 ram_quota_bytes=SPOOL_RAM_QUOTA_BYTES, ram_max_file_bytes=SPOOL_RAM_MAX_FILE_BYTES,
+                 orphan_age=SPOOL_ORPHAN_AGE_SECONDS, sweep_interval=SPOOL_SWEEP_INTERVAL_SECONDS,
+                 usage_cache_seconds=SPOOL_USAGE_CACHE_SECONDS):
+        self.root = os.path.normpath(root)
+        self.quota_bytes = quota_bytes
+        self.ram_root = os.path.normpath(ram_root) if ram_root else None
+        self.ram_quota_bytes = ram_quota_bytes
+        self.ram_max_file_bytes = ram_max_file_bytes
+        self.orphan_age = orphan_age
+        self.sweep_interval = sweep_interval
+        self.usage_cache_seconds = usage_cache_seconds
+        self.reclaimed_files = 0
+        self.reclaimed_bytes = 0
+        self.rejected = 0
+        self._sweeper_pid = None
+        self._usage = {}  # directory -> (measured at, bytes)
+        self._lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        if self.ram_root:
+            try:
+                os.makedirs(self.ram_root, exist_ok=True)
+            except OSError as e:
+                logger.warning("RAM spool %s unavailable (%s); using %s only", self.ram_root, e, self.root)
+                self.ram_root = None
+
+    # -- placement ---------------------------------------------------------
+
+    def new_path(self, kind, name, expected_bytes=None):
+        """
+        Path for a new spool file, on the RAM tier when it is small enough.
+
+        Args:
+            kind: 'temp' (uploaded file) or 'converted' (decoded WAV)
+            name: Suffix of the file name (a secure filename or extension)
+            expected_bytes: Expected file size, used for the quota and tier choice
+
+        Raises:
+            SpoolFullError: If the file would not fit in the quota
+        """
+        directory = self._choose_directory(expected_bytes)
+        return os.path.join(directory, f"{kind}_{os.getpid()}_{os.urandom(8).hex()}_{name}")
+
+    def _choose_directory(self, expected_bytes):
+        if (self.ram_root and expected_bytes is not None and expected_bytes <= self.ram_max_file_bytes
+                and self.used_bytes(self.ram_root) + expected_bytes <= self.ram_quota_bytes):
+            self._charge(self.ram_root, expected_bytes)
+            return self.ram_root
+        self.ensure_space(expected_bytes or 0)
+        return self.root
+
+    def used_bytes(self, directory):
+        """Size of `directory`, re-measured at most every usage_cache_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._usage.get(directory)
+        if cached is not None and now - cached[0] < self.usage_cache_seconds:
+            return cached[1]
+        used = directory_size(directory)
+        with self._lock:
+            self._usage[directory] = (now, used)
+        return used
+
+    def _charge(self, directory, nbytes):
+        """Count an admitted file until the next measurement sees it on disk."""
+        with self._lock:
+            cached = self._usage.get(directory)
+            if cached is not None:
+                self._usage[directory] = (cached[0], cached[1] + nbytes)
+
+    def ensure_space(self, nbytes):
+        """
+        Check that `nbytes` more fit in the disk quota, sweeping orphans first if not.
+
+        Raises:
+            SpoolFullError: If the quota would still be exceeded
+        """
+        if self.quota_bytes <= 0:
+            return
+        if self.used_bytes(self.root) + nbytes > self.quota_bytes:
+            self.sweep()
+            with self._lock:
+                self._usage.pop(self.root, None)  # Re-measure: the cached figure may be stale
+            used = self.used_bytes(self.root)
+            if used + nbytes > self.quota_bytes:
+                with self._lock:
+                    self.rejected += 1
+                raise SpoolFullError(
+                    f"Upload spool is full ({used / (1024 * 1024):.0f}MB of "
+                    f"{self.quota_bytes / (1024 * 1024):.0f}MB used); please retry later"
+                )
+        self._charge(self.root, nbytes)
+
+    # -- orphan reclamation ------------------------------------------------
+
+    def sweep(self):
+        """
+        Delete files left behind by dead processes, and legacy-named files
+        older than the orphan age.
+
+        Returns:
+            int: Number of files removed
+        """
+        removed = 0
+        now = time.time()
+        for directory in filter(None, (self.root, self.ram_root)):
+            try:
+                entries = os.listdir(directory)
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                path = os.path.join(directory, entry)
+                match = _SPOOL_NAME_RE.match(entry)
+                if not match and not _LEGACY_NAME_RE.match(entry):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                if match is not None:
+                    owner_dead = _owner_gone(int(match.group(1)), stat.st_mtime)
+                    if not owner_dead:
+                        continue
+                else:
+                    owner_dead = False
+                    if now - stat.st_mtime < self.orphan_age:
+                        continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+                with self._lock:
+                    self.reclaimed_files += 1
+                    self.reclaimed_bytes += stat.st_size
+                    self._usage.pop(directory, None)
+                logger.info("Reclaimed orphaned spool file %s (%d bytes, %s)",
+                            entry, stat.st_size, 'owner exited' if owner_dead else 'expired')
+        return removed
+
+    def ensure_sweeper(self):
+        """Sweep now and start the periodic sweeper in this process (once per pid)."""
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        self.sweep()
+        if self.sweep_interval > 0:
+            threading.Thread(target=self._sweep_periodically, name='spool-sweeper', daemon=True).start()
+
+    def _sweep_periodically(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Spool sweep failed")
+
+    def stats(self):
+        stats = {
+            'root': self.root,
+            'used_bytes': self.used_bytes(self.root),
+            'quota_bytes': self.quota_bytes,
+            'reclaimed_files': self.reclaimed_files,
+            'reclaimed_bytes': self.reclaimed_bytes,
+            'rejected': self.rejected,
+        }
+        if self.ram_root:
+            stats['ram'] = {
+                'root': self.ram_root,
+                'used_bytes': self.used_bytes(self.ram_root),
+                'quota_bytes': self.ram_quota_bytes,
+                'max_file_bytes': self.ram_max_file_bytes,
+            }
+        return stats
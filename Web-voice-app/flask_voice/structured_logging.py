@@ -0,0 +1,269 @@
+"""
+Structured, asynchronous logging.
+
+Request threads only build a LogRecord and put it on a bounded queue; a
+background listener formats it (message interpolation, tracebacks) and writes
+it to stdout. Lines are JSON objects (LOG_FORMAT=json, the default) or plain
+text (LOG_FORMAT=text) carrying the request id and route of the request that
+emitted them.
+
+Configuration (environment):
+- LOG_LEVEL: default level (INFO)
+- LOG_ROUTE_LEVELS: per-route overrides, e.g. "/transcribe=WARNING,/api/uploads/<upload_id>=DEBUG"
+- LOG_SAMPLE_PER_SECOND: INFO/DEBUG lines allowed per call site per second before
+  sampling starts (50); past that only 1 in LOG_SAMPLE_EVERY (100) is kept
+- LOG_QUEUE_SIZE: records buffered before new ones are dropped (10000)
+
+Under gevent workers threading.Thread and the stdlib queue are monkey-patched
+to greenlets and greenlet locks, so a stock QueueListener would only format
+and write while request greenlets yield. The listener instead runs on a real
+OS thread started through the unpatched _thread module, reading from the
+unpatched (C) SimpleQueue, so log output never competes with the event loop.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+
+from async_support import OSThread, original
+from tracing import TRACEPARENT_HEADER, parse_traceparent
+
+LOG_LEVEL = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.INFO
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_SAMPLE_PER_SECOND = int(os.environ.get('LOG_SAMPLE_PER_SECOND', '50'))
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', '100'))
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Values that are safe to format later on the listener thread
+_PLAIN_ARGS = (str, int, float, bool, type(None))
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+route_var = contextvars.ContextVar('route', default=None)
+route_level_var = contextvars.ContextVar('route_level', default=None)
+
+_listener = None
+_handler = None
+_configure_lock = threading.Lock()
+
+
+def parse_route_levels(spec):
+    """Parse "route=LEVEL,route=LEVEL" into {route: levelno}."""
+    levels = {}
+    for item in (spec or '').split(','):
+        route, _, level = item.strip().rpartition('=')
+        if not route:
+            continue
+        levelno = logging.getLevelName(level.strip().upper())
+        if isinstance(levelno, int):
+            levels[route.strip()] = levelno
+    return levels
+
+
+ROUTE_LEVELS = parse_route_levels(os.environ.get('LOG_ROUTE_LEVELS', ''))
+
+
+class ContextFilter(logging.Filter):
+    """Attach the request id/route and apply the route's level."""
+
+    def filter(self, record):
+        route_level = route_level_var.get()
+        if record.levelno < (LOG_LEVEL if route_level is None else route_level):
+            return False
+        record.request_id = request_id_var.get()
+        record.route = route_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limit high-volume INFO/DEBUG call sites.
+
+    Each call site (file, line) may log LOG_SAMPLE_PER_SECOND lines per second;
+    beyond that one in LOG_SAMPLE_EVERY is kept, tagged with how many were
+    skipped. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, per_second=LOG_SAMPLE_PER_SECOND, keep_every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.per_second = per_second
+        self.keep_every = max(1, keep_every)
+        self.sampled_out = 0
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.per_second <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        second = int(record.created)
+        with self._lock:
+            window, count, skipped = self._sites.get(site, (second, 0, 0))
+            if window != second:
+                window, count = second, 0
+            count += 1
+            if count <= self.per_second or count % self.keep_every == 0:
+                self._sites[site] = (window, count, 0)
+                if skipped:
+                    record.sampled = skipped
+                return True
+            self._sites[site] = (window, count, skipped + 1)
+            self.sampled_out += 1
+            return False
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener and never blocks."""
+
+    def __init__(self, log_queue, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(log_queue)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Interpolate now only if the arguments could change before the listener runs
+        if record.args and not (
+            isinstance(record.args, tuple) and all(isinstance(arg, _PLAIN_ARGS) for arg in record.args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue is unbounded, so the bound is checked here (approximately)
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class OSThreadQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose thread is a real OS thread, even under gevent monkey-patching."""
+
+    def start(self):
+        self._thread = OSThread(self._monitor)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.enqueue_sentinel()
+        self._thread.join()
+        self._thread = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (UTC timestamps)."""
+
+    converter = time.gmtime
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in ('request_id', 'route', 'sampled'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+
+def configure_logging():
+    """
+    Route all logging through the asynchronous queue. Safe to call repeatedly.
+    """
+    global _listener, _handler
+    with _configure_lock:
+        if _handler is not None:
+            return
+
+        log_queue = original('queue', 'SimpleQueue')()
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+
+        _handler = AsyncQueueHandler(log_queue)
+        _handler.addFilter(ContextFilter())
+        _handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        # Loggers must let through the most verbose level any route asks for
+        root.setLevel(min([LOG_LEVEL] + list(ROUTE_LEVELS.values())))
+
+        _listener = OSThreadQueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def init_app(app):
+    """Tag every request of `app` with a request id and its route's log level."""
+    from flask import g, request
+
+    @app.before_request
+    def _bind_request_context():
+        # Prefer the caller's id, then its trace id, so log lines join the trace
+        trace = parse_traceparent(request.headers.get(TRACEPARENT_HEADER))
+        request_id = request.headers.get(REQUEST_ID_HEADER) or (trace[0] if trace else uuid.uuid4().hex[:16])
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.log_tokens = (
+            request_id_var.set(request_id[:64]),
+            route_var.set(rule),
+            route_level_var.set(ROUTE_LEVELS.get(rule)),
+        )
+
+    @app.after_request
+    def _add_request_id_header(response):
+        request_id = request_id_var.get()
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_context(exc):
+        tokens = g.pop('log_tokens', None)
+        if tokens:
+            for var, token in zip((request_id_var, route_var, route_level_var), tokens):
+                try:
+                    var.reset(token)
+                except ValueError:
+                    pass  # Set in a different context (e.g. a copied one); nothing to undo
+
+
+def stats():
+    """Queue depth, dropped and sampled-out record counts."""
+    if _handler is None:
+        return {'configured': False}
+    sampler = next(f for f in _handler.filters if isinstance(f, SamplingFilter))
+    return {
+        'configured': True,
+        'queued': _handler.queue.qsize(),
+        'dropped': _handler.dropped,
+        'sampled_out': sampler.sampled_out,
+    }
@@ -0,0 +1,123 @@
+"""Resumable upload protocol: offsets, checksums, finalize and per-upload locking."""
+
+import io
+import time
+import hashlib
+import threading
+
+import pytest
+
+from resumable_upload import ResumableUploadManager, UploadError
+
+
+def no_recognition(pcm, sample_rate, sample_width, language, details=None):
+    raise AssertionError("non-progressive uploads are not transcribed in the background")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ResumableUploadManager(str(tmp_path / 'resumable'), no_recognition)
+
+
+def create(manager, total_size=None):
+    # .m4a is not progressive, so no background transcriber is started
+    return manager.create('talk.m4a', '.m4a', 'en-US', total_size)['upload_id']
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class SlowStream:
+    """Request body that arrives slowly, like a client on a poor connection."""
+
+    def __init__(self, data, delay):
+        self.data = io.BytesIO(data)
+        self.delay = delay
+
+    def read(self, size):
+        time.sleep(self.delay)
+        return self.data.read(size)
+
+
+def test_chunks_are_appended_at_the_committed_offset(manager):
+    upload_id = create(manager, 10)
+
+    assert manager.append(upload_id, 0, io.BytesIO(b'hello'), sha256(b'hello')) == 5
+    assert manager.append(upload_id, 5, io.BytesIO(b'world')) == 10
+
+    meta, data_path, prefix_result = manager.finalize(upload_id, sha256(b'helloworld'))
+    with open(data_path, 'rb') as f:
+        assert f.read() == b'helloworld'
+    assert prefix_result is None
+    assert manager.status(upload_id)['finalized'] is True
+
+
+def test_offset_mismatch_is_rejected_with_the_committed_offset(manager):
+    upload_id = create(manager)
+    manager.append(upload_id, 0, io.BytesIO(b'abc'))
+
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, 0, io.BytesIO(b'abc'))
+    assert error.value.status_code == 409
+    assert error.value.details['offset'] == 3
+
+
+def test_chunk_with_bad_checksum_is_not_committed(manager):
+    upload_id = create(manager)
+    manager.append(upload_id, 0, io.BytesIO(b'good'))
+
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, 4, io.BytesIO(b'corrupted'), sha256(b'original'))
+    assert error.value.status_code == 400
+    assert manager.status(upload_id)['offset'] == 4
+    assert manager.append(upload_id, 4, io.BytesIO(b'data')) == 8
+
+
+def test_chunk_beyond_the_declared_size_is_rejected(manager):
+    upload_id = create(manager, 4)
+
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, 0, io.BytesIO(b'too long'))
+    assert error.value.status_code == 413
+    assert manager.status(upload_id)['offset'] == 0
+
+
+def test_finalize_checks_size_and_file_checksum(manager):
+    upload_id = create(manager, 8)
+    with pytest.raises(UploadError) as error:
+        manager.finalize(upload_id)
+    assert error.value.status_code == 400  # Nothing uploaded yet
+
+    manager.append(upload_id, 0, io.BytesIO(b'half'))
+    with pytest.raises(UploadError) as error:
+        manager.finalize(upload_id)
+    assert error.value.status_code == 409
+
+    manager.append(upload_id, 4, io.BytesIO(b'done'))
+    with pytest.raises(UploadError) as error:
+        manager.finalize(upload_id, sha256(b'something else'))
+    assert error.value.status_code == 400
+    assert not manager.is_finalized(upload_id)
+
+    manager.finalize(upload_id, sha256(b'halfdone'))
+    with pytest.raises(UploadError) as error:
+        manager.append(upload_id, 8, io.BytesIO(b'more'))
+    assert error.value.status_code == 409
+
+
+def test_slow_client_does_not_block_other_uploads(manager):
+    slow_upload = create(manager)
+    other_upload = create(manager)
+    slow = threading.Thread(target=manager.append,
+                            args=(slow_upload, 0, SlowStream(b'x' * 64 * 1024 * 8, delay=0.1)))
+    slow.start()
+    time.sleep(0.05)  # The slow append now holds its upload's lock
+
+    started = time.monotonic()
+    manager.append(other_upload, 0, io.BytesIO(b'quick'))
+    elapsed = time.monotonic() - started
+    slow.join()
+
+    assert elapsed < 0.3
+    assert manager.status(slow_upload)['offset'] == 64 * 1024 * 8
@@ -0,0 +1,133 @@
+"""Recognizer scheduler: weighted fair ordering, starvation protection and duration estimates."""
+
+import threading
+import time
+import wave
+
+import pytest
+
+from scheduler import (
+    RecognitionScheduler, SchedulerTimeout, classify, estimate_duration_seconds,
+    INTERACTIVE, STANDARD, BULK
+)
+
+
+class HeldSlot:
+    """Occupies the only slot of a capacity-1 scheduler until released."""
+
+    def __init__(self, scheduler, priority_class=STANDARD):
+        self._context = scheduler.slot(priority_class)
+        self._context.__enter__()
+
+    def release(self):
+        self._context.__exit__(None, None, None)
+
+
+def enqueue(scheduler, requests, served):
+    """Queue (class, cost) requests behind the held slot, in order; each records its class when served."""
+    def run(priority_class, cost):
+        with scheduler.slot(priority_class, cost):
+            served.append(priority_class)
+
+    threads = []
+    for priority_class, cost in requests:
+        queued = scheduler.stats()['queued']
+        thread = threading.Thread(target=run, args=(priority_class, cost))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.stats()['queued'] == queued + 1)
+    return threads
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def drain(held, threads):
+    held.release()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_classes_are_served_in_proportion_to_their_weights():
+    scheduler = RecognitionScheduler(capacity=1, starvation_seconds=60)
+    held = HeldSlot(scheduler)
+    served = []
+    # Bulk work queued first must not hold back interactive work behind it
+    threads = enqueue(scheduler, [(BULK, 1.0)] * 8 + [(INTERACTIVE, 1.0)] * 8, served)
+
+    drain(held, threads)
+    assert len(served) == 16
+    # Weights 8:1 -> interactive gets nearly every slot until its queue is empty
+    assert served[:9].count(INTERACTIVE) == 8
+    assert scheduler.stats()['classes'][BULK]['served'] == 8
+
+
+def test_cost_is_charged_in_audio_seconds():
+    scheduler = RecognitionScheduler(capacity=1, weights={INTERACTIVE: 1.0, STANDARD: 1.0, BULK: 1.0},
+                                     starvation_seconds=60)
+    held = HeldSlot(scheduler, INTERACTIVE)
+    served = []
+    # Equal weights: one 10-second standard call is worth ten 1-second bulk calls
+    threads = enqueue(scheduler, [(STANDARD, 10.0)] * 2 + [(BULK, 1.0)] * 10, served)
+
+    drain(held, threads)
+    assert served[0] == STANDARD
+    assert served[1:11] == [BULK] * 10
+    assert served[11] == STANDARD
+
+
+def test_starving_waiters_are_served_first():
+    scheduler = RecognitionScheduler(capacity=1, starvation_seconds=0.05)
+    held = HeldSlot(scheduler)
+    served = []
+    threads = enqueue(scheduler, [(BULK, 100.0)], served)
+    time.sleep(0.1)
+    threads += enqueue(scheduler, [(INTERACTIVE, 1.0)] * 3, served)
+
+    drain(held, threads)
+    assert served[0] == BULK
+
+
+def test_a_slot_not_granted_in_time_raises_and_leaves_the_queue():
+    scheduler = RecognitionScheduler(capacity=1)
+    held = HeldSlot(scheduler)
+
+    with pytest.raises(SchedulerTimeout):
+        with scheduler.slot(BULK, timeout=0.05):
+            pass
+    assert scheduler.stats()['queued'] == 0
+
+    held.release()
+    assert scheduler.stats()['active'] == 0
+
+
+def test_classify():
+    assert classify('microphone', 5) == INTERACTIVE
+    assert classify('microphone', 60) == STANDARD
+    assert classify('upload', 60) == STANDARD
+    assert classify('upload', 600) == BULK
+    assert classify('background') == BULK
+
+
+def test_wav_duration_is_read_from_the_header(tmp_path):
+    path = str(tmp_path / 'stereo.wav')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(b'\0' * 44100 * 4 * 3)
+
+    assert estimate_duration_seconds(0, True, path) == pytest.approx(3.0)
+
+
+def test_duration_falls_back_to_the_file_size(tmp_path):
+    path = tmp_path / 'broken.wav'
+    path.write_bytes(b'not a wav file')
+
+    assert estimate_duration_seconds(64000, True, str(path)) == pytest.approx(2.0)
+    assert estimate_duration_seconds(64000, False) == pytest.approx(4.0)
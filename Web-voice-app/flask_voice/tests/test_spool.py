@@ -0,0 +1,118 @@
+"""Upload spool: quota admission, RAM tier placement and orphan reclamation."""
+
+import io
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from spool import UploadSpool, SpoolFullError
+
+
+def make_spool(tmp_path, quota_bytes=1000, **kwargs):
+    kwargs.setdefault('ram_root', '')
+    kwargs.setdefault('usage_cache_seconds', 60)
+    return UploadSpool(str(tmp_path / 'spool'), quota_bytes=quota_bytes, sweep_interval=0, **kwargs)
+
+
+def write(path, nbytes):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * nbytes)
+    return path
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_files_that_would_exceed_the_quota_are_rejected(tmp_path):
+    spool = make_spool(tmp_path)
+    write(spool.new_path('temp', 'a.wav', 600), 600)
+
+    with pytest.raises(SpoolFullError):
+        spool.new_path('temp', 'b.wav', 600)
+    assert spool.stats()['rejected'] == 1
+
+
+def test_a_full_spool_is_swept_before_rejecting(tmp_path):
+    spool = make_spool(tmp_path)
+    orphan = write(os.path.join(spool.root, f"temp_{dead_pid()}_{os.urandom(8).hex()}_a.wav"), 900)
+    spool.used_bytes(spool.root)
+
+    spool.ensure_space(500)
+    assert not os.path.exists(orphan)
+
+
+def test_small_files_go_to_the_ram_tier(tmp_path):
+    spool = make_spool(tmp_path, ram_root=str(tmp_path / 'ram'), ram_quota_bytes=500, ram_max_file_bytes=300)
+
+    assert os.path.dirname(spool.new_path('temp', 'a.wav', 200)) == spool.ram_root
+    assert os.path.dirname(spool.new_path('temp', 'b.wav', 400)) == spool.root
+    # 200 of the 500 RAM bytes are taken, so a third 200-byte file still fits but a fourth does not
+    assert os.path.dirname(spool.new_path('temp', 'c.wav', 200)) == spool.ram_root
+    assert os.path.dirname(spool.new_path('temp', 'd.wav', 200)) == spool.root
+
+
+def test_sweep_removes_files_of_exited_owners_and_keeps_live_ones(tmp_path):
+    # With no age limit at all, files of a live owner are still kept
+    spool = make_spool(tmp_path, orphan_age=0)
+    live = write(spool.new_path('temp', 'live.wav'), 10)
+    orphan = write(os.path.join(spool.root, f"converted_{dead_pid()}_{os.urandom(8).hex()}_.wav"), 10)
+
+    assert spool.sweep() == 1
+    assert os.path.exists(live)
+    assert not os.path.exists(orphan)
+    assert spool.stats()['reclaimed_bytes'] == 10
+
+
+def test_sweep_removes_files_whose_owner_pid_was_reused(tmp_path):
+    # pid 1 is alive, but it started long before a file written "now" could be its own
+    spool = make_spool(tmp_path)
+    stale = write(os.path.join(spool.root, f"temp_1_{os.urandom(8).hex()}_a.wav"), 10)
+    boot = time.time() - time.monotonic()
+    os.utime(stale, (boot - 3600, boot - 3600))
+
+    assert spool.sweep() == 1
+    assert not os.path.exists(stale)
+
+
+def test_legacy_names_are_only_aged_out(tmp_path):
+    spool = make_spool(tmp_path, orphan_age=60)
+    fresh = write(os.path.join(spool.root, 'temp_0123abcd_a.wav'), 10)
+    expired = write(os.path.join(spool.root, 'converted_4567ef01_b.wav'), 10)
+    unrelated = write(os.path.join(spool.root, 'notes.txt'), 10)
+    os.utime(expired, (time.time() - 120, time.time() - 120))
+    os.utime(unrelated, (time.time() - 120, time.time() - 120))
+
+    assert spool.sweep() == 1
+    assert os.path.exists(fresh)
+    assert not os.path.exists(expired)
+    assert os.path.exists(unrelated)
+
+
+def test_resumable_chunks_are_charged_against_the_quota(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import flask_upload_transcribe as service
+    from resumable_upload import ResumableUploadManager
+
+    spool = make_spool(tmp_path, quota_bytes=1000)
+    manager = ResumableUploadManager(os.path.join(spool.root, 'resumable'), service.recognize_pcm)
+    monkeypatch.setattr(service, 'upload_spool', spool)
+    monkeypatch.setattr(service, 'upload_manager', manager)
+    client = service.app.test_client()
+
+    # No totalSize is declared, so only the chunks themselves can be counted
+    created = client.post('/api/uploads', json={'filename': 'talk.m4a', 'language': 'en-US'})
+    upload_id = created.get_json()['uploadId']
+
+    first = client.put(f'/api/uploads/{upload_id}', data=io.BytesIO(b'a' * 600),
+                       headers={'Upload-Offset': '0', 'Content-Length': '600'})
+    assert first.status_code == 200
+    second = client.put(f'/api/uploads/{upload_id}', data=io.BytesIO(b'b' * 600),
+                        headers={'Upload-Offset': '600', 'Content-Length': '600'})
+    assert second.status_code == 507
+    assert second.get_json()['offset'] == 600
@@ -0,0 +1,72 @@
+"""Segment recognition must tell recognizer outages apart from silence."""
+
+import os
+
+import pytest
+import speech_recognition as sr
+
+import transcription_engine
+
+ENGLISH_TEXT = "the quick brown fox jumps over the lazy dog and runs back home"
+
+
+@pytest.fixture
+def recognizer_calls(monkeypatch):
+    """Fake recognizer: segments listed in `calls['outage']` fail with a service error."""
+    calls = {'outage': set(), 'segment': None, 'attempts': []}
+
+    def recognize(recognizer, audio_data, language):
+        calls['attempts'].append((calls['segment'], language))
+        if calls['segment'] in calls['outage']:
+            raise sr.RequestError("recognition connection failed")
+        return ENGLISH_TEXT
+
+    monkeypatch.setattr(transcription_engine.recognizer_backend, 'recognize', recognize)
+    monkeypatch.setattr(transcription_engine.transcript_cache, 'max_entries', 0)
+    monkeypatch.setattr(transcription_engine.fingerprint_index, 'max_entries', 0)
+    return calls
+
+
+def segments(calls, count, seconds=1.0):
+    for index in range(count):
+        calls['segment'] = index
+        yield os.urandom(int(seconds * 16000) * 2)
+
+
+@pytest.mark.parametrize('language', ['auto', 'en-US'])
+def test_segment_lost_to_an_outage_is_retried_and_reported(recognizer_calls, language):
+    recognizer_calls['outage'] = {0}
+
+    result = transcription_engine.recognize_segments(segments(recognizer_calls, 3), language, sr.Recognizer())
+
+    assert result['text'] == ' '.join([ENGLISH_TEXT] * 2)
+    assert result['incomplete'] is True
+    assert result['failed_segments'] == [0]
+    # Tried once more after the first failure (every language each time in auto mode)
+    languages = len(transcription_engine.AUTO_DETECT_LANGUAGES) if language == 'auto' else 1
+    assert sum(segment == 0 for segment, _ in recognizer_calls['attempts']) == 2 * languages
+
+
+def test_all_segments_lost_reports_the_service_error(recognizer_calls):
+    recognizer_calls['outage'] = {0, 1}
+
+    result = transcription_engine.recognize_segments(segments(recognizer_calls, 2), 'auto', sr.Recognizer())
+
+    assert result['text'] is None
+    assert result['failed_segments'] == [0, 1]
+    assert result['error_message'].startswith("Recognition service error")
+
+
+def test_auto_mode_without_speech_is_not_a_failure(monkeypatch):
+    def recognize(recognizer, audio_data, language):
+        if language == 'ar-SA':
+            raise sr.RequestError("recognition connection failed")
+        raise sr.UnknownValueError()
+
+    monkeypatch.setattr(transcription_engine.recognizer_backend, 'recognize', recognize)
+    audio_data = sr.AudioData(os.urandom(32000), 16000, 2)
+
+    with pytest.raises(sr.UnknownValueError):
+        transcription_engine._recognize_uncached(
+            audio_data, 'auto', sr.Recognizer(), transcription_engine.AUTO_DETECT_LANGUAGES, transcription_engine.STANDARD
+        )
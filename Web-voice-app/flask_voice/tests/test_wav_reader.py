@@ -0,0 +1,69 @@
+"""Malformed WAV headers must be rejected with ValueError, never struct.error."""
+
+import io
+import struct
+import wave
+
+import pytest
+import speech_recognition as sr
+
+from scheduler import estimate_duration_seconds
+from transcription_engine import transcribe_speech
+from wav_reader import MappedWav
+
+
+def wav_bytes(seconds=0.5, sample_rate=16000, channels=1):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b'\0\0' * channels * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+def fmt_chunk(channels=1, sample_rate=16000, bits=16):
+    block_align = channels * bits // 8
+    return b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, sample_rate * block_align,
+                                 block_align, bits)
+
+
+MALFORMED = {
+    'fmt chunk cut short': b'RIFF\x10\x00\x00\x00WAVEfmt \x10\x00\x00\x00\x01\x00',
+    'fmt chunk smaller than 16 bytes': b'RIFF\x18\x00\x00\x00WAVEfmt \x04\x00\x00\x00\x01\x00\x01\x00data\x00\x00\x00\x00',
+    'header only': b'RIFF\x04\x00\x00\x00WAVE',
+    'not RIFF': b'OggS' + b'\0' * 40,
+    'zero channels': b'RIFF\x00\x00\x00\x00WAVE' + fmt_chunk(channels=0) + b'data\x04\x00\x00\x00\0\0\0\0',
+    'zero sample rate': b'RIFF\x00\x00\x00\x00WAVE' + fmt_chunk(sample_rate=0) + b'data\x04\x00\x00\x00\0\0\0\0',
+}
+
+
+@pytest.fixture(params=sorted(MALFORMED))
+def malformed_wav(request, tmp_path):
+    path = tmp_path / 'malformed.wav'
+    path.write_bytes(MALFORMED[request.param])
+    return str(path)
+
+
+def test_malformed_header_raises_value_error(malformed_wav):
+    with pytest.raises(ValueError):
+        MappedWav(malformed_wav)
+
+
+def test_duration_estimate_falls_back_to_file_size(malformed_wav):
+    assert estimate_duration_seconds(1000, True, malformed_wav) == pytest.approx(1000 / 32000.0)
+
+
+def test_transcription_reports_an_error(malformed_wav):
+    text, error_message, _, _ = transcribe_speech(malformed_wav, 'en-US', sr.Recognizer())
+    assert text is None
+    assert error_message
+
+
+def test_valid_header_is_parsed(tmp_path):
+    path = tmp_path / 'stereo.wav'
+    path.write_bytes(wav_bytes(seconds=1.5, sample_rate=44100, channels=2))
+    with MappedWav(str(path)) as wav:
+        assert (wav.sample_rate, wav.channels, wav.sample_width) == (44100, 2, 2)
+        assert wav.duration_seconds == pytest.approx(1.5)
+    assert estimate_duration_seconds(path.stat().st_size, True, str(path)) == pytest.approx(1.5)
@@ -0,0 +1,284 @@
+"""
+Request tracing across the Node backend and the Flask services.
+
+Incoming requests carry a W3C `traceparent` header (and/or X-Request-ID); the
+Flask request joins that trace and records spans for its stages (save,
+convert, recognize - one per language attempt - and cleanup). Spans are
+exported as OTLP/JSON lines (the OpenTelemetry Collector file exporter format)
+to TRACE_EXPORT_FILE, which the Node backend writes to as well, so one trace
+shows the axios call and the Python work behind it.
+
+Tracing is off unless TRACE_EXPORT_FILE is set; the trace id is still
+propagated and used as the request id.
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from async_support import OSThread, original
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORT_FILE = os.environ.get('TRACE_EXPORT_FILE', '')
+SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'voicescript-flask')
+
+TRACEPARENT_HEADER = 'traceparent'
+# Tells the caller which server span handled its request (W3C Trace Context level 2)
+TRACERESPONSE_HEADER = 'traceresponse'
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Spans written per export line
+_EXPORT_BATCH = 256
+
+current_span_var = contextvars.ContextVar('current_span', default=None)
+
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+
+def new_span_id():
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(value):
+    """
+    Parse a W3C traceparent header.
+
+    Returns:
+        tuple or None: (trace_id, parent_span_id)
+    """
+    parts = (value or '').strip().lower().split('-')
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, span_id = parts[1], parts[2]
+    try:
+        int(trace_id, 16)
+        int(span_id, 16)
+    except ValueError:
+        return None
+    if trace_id == '0' * 32 or span_id == '0' * 16:
+        return None
+    return trace_id, span_id
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_span_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message')
+
+    def __init__(self, name, trace_id, parent_span_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.status_message = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, message):
+        self.status = STATUS_ERROR
+        self.status_message = str(message)[:200]
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        exporter.export(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()
+                           if value is not None],
+            'status': {'code': self.status},
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+class FileExporter:
+    """
+    Writes finished spans as OTLP/JSON lines from a background OS thread
+    (a real thread and queue even under gevent, so file writes never run on
+    the event loop and export() never yields).
+    """
+
+    def __init__(self, path, service_name=SERVICE_NAME):
+        self.path = path
+        self.service_name = service_name
+        self.exported = 0
+        self._queue = original('queue', 'SimpleQueue')()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def export(self, span):
+        if not self.enabled:
+            return
+        self._queue.put(span)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self._thread = OSThread(self._run)
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            self._write(spans)
+
+    def _write(self, spans):
+        while len(spans) < _EXPORT_BATCH:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        line = json.dumps({
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'voicescript.flask_voice'},
+                    'spans': [span.to_otlp() for span in spans],
+                }],
+            }]
+        }, separators=(',', ':'))
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self.exported += len(spans)
+        except OSError as e:
+            logger.warning("Could not export %d spans: %s", len(spans), e)
+
+    def flush(self):
+        """Write any queued spans (called at exit)."""
+        while True:
+            try:
+                spans = [self._queue.get_nowait()]
+            except queue.Empty:
+                return
+            self._write(spans)
+
+
+exporter = FileExporter(TRACE_EXPORT_FILE)
+
+
+@contextmanager
+def span(name, ok_exceptions=(), **attributes):
+    """
+    Record a child span of the current span for the duration of the block.
+
+    Yields the Span (or None outside a trace / with tracing disabled) so
+    callers can add attributes as they learn them. Exceptions mark the span
+    as failed unless they are instances of `ok_exceptions`.
+    """
+    parent = current_span_var.get()
+    if parent is None or not exporter.enabled:
+        yield None
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, attributes=attributes)
+    token = current_span_var.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        if not isinstance(e, ok_exceptions):
+            child.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current_span_var.reset(token)
+        child.finish()
+
+
+def init_app(app):
+    """Join (or start) a trace for every request and record a server span."""
+    from flask import g, request
+
+    @app.before_request
+    def _start_server_span():
+        parsed = parse_traceparent(request.headers.get(TRACEPARENT_HEADER))
+        trace_id, parent_span_id = parsed if parsed else (new_trace_id(), None)
+        rule = request.url_rule.rule if request.url_rule else request.path
+        server_span = Span(f"{request.method} {rule}", trace_id, parent_span_id, kind=SPAN_KIND_SERVER,
+                           attributes={'http.method': request.method, 'http.route': rule})
+        g.trace_span = server_span
+        g.trace_token = current_span_var.set(server_span)
+
+    @app.after_request
+    def _record_response(response):
+        server_span = g.get('trace_span')
+        if server_span is not None:
+            server_span.set(**{'http.status_code': response.status_code})
+            if response.status_code >= 500:
+                server_span.fail(f"HTTP {response.status_code}")
+            response.headers[TRACERESPONSE_HEADER] = server_span.traceparent
+        return response
+
+    @app.teardown_request
+    def _finish_server_span(exc):
+        server_span = g.pop('trace_span', None)
+        token = g.pop('trace_token', None)
+        if server_span is None:
+            return
+        if exc is not None:
+            server_span.fail(f"{type(exc).__name__}: {exc}")
+        if token is not None:
+            try:
+                current_span_var.reset(token)
+            except ValueError:
+                pass
+        if exporter.enabled:
+            server_span.finish()
+
+
+def stats():
+    return {'enabled': exporter.enabled, 'exported_spans': exporter.exported}
@@ -0,0 +1,482 @@
+"""
+Shared transcription engine.
+Language tables, validation and recognition logic used by both the microphone
+and the file upload routes, so one process can serve both from the same warm
+state (transcript cache, memory budget, thread pools).
+"""
+
+# Fix for Python 3.13 compatibility - aifc was removed
+# MUST be before any other imports that might trigger speech_recognition import
+import sys
+import types
+
+if sys.version_info >= (3, 13):
+    if 'aifc' not in sys.modules:
+        aifc_stub = types.ModuleType('aifc')
+        aifc_stub.Error = Exception
+        def aifc_open(*args, **kwargs):
+            raise NotImplementedError("aifc.open() not available in Python 3.13+")
+        aifc_stub.open = aifc_open
+        sys.modules['aifc'] = aifc_stub
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import speech_recognition as sr
+from langdetect import detect, LangDetectException
+
+from audio_converter import (
+    WAV_SAMPLE_RATE, WAV_SAMPLE_WIDTH, PIPELINE_SEGMENT_SECONDS, PIPELINE_CUT_SEARCH_SECONDS
+)
+from voice_activity import prepare_audio
+from async_support import run_cpu_bound
+from scheduler import recognition_scheduler, STANDARD, BULK
+from recognizer_fixtures import recognizer_backend
+from audio_fingerprint import fingerprint_index, fingerprint_audio_data
+from wav_reader import MappedWav
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = 'en-US'
+
+# Supported languages for Google Speech Recognition
+# Format: language code (e.g., 'en-US', 'es-ES', 'fr-FR')
+# See: https://cloud.google.com/speech-to-text/docs/languages
+SUPPORTED_LANGUAGES = {
+    'auto': 'Auto Detect',
+    'en-US': 'English (United States)',
+    'en-GB': 'English (United Kingdom)',
+    'es-ES': 'Spanish (Spain)',
+    'es-MX': 'Spanish (Mexico)',
+    'fr-FR': 'French (France)',
+    'de-DE': 'German (Germany)',
+    'it-IT': 'Italian (Italy)',
+    'pt-BR': 'Portuguese (Brazil)',
+    'pt-PT': 'Portuguese (Portugal)',
+    'ru-RU': 'Russian (Russia)',
+    'ja-JP': 'Japanese (Japan)',
+    'ko-KR': 'Korean (Korea)',
+    'zh-CN': 'Chinese (Simplified, China)',
+    'zh-TW': 'Chinese (Traditional, Taiwan)',
+    'ar-SA': 'Arabic (Saudi Arabia)',
+    'ar-EG': 'Arabic (Egypt)',
+    'hi-IN': 'Hindi (India)',
+    'nl-NL': 'Dutch (Netherlands)',
+    'pl-PL': 'Polish (Poland)',
+    'tr-TR': 'Turkish (Turkey)',
+    'sv-SE': 'Swedish (Sweden)',
+    'da-DK': 'Danish (Denmark)',
+    'no-NO': 'Norwegian (Norway)',
+    'fi-FI': 'Finnish (Finland)',
+    'cs-CZ': 'Czech (Czech Republic)',
+    'hu-HU': 'Hungarian (Hungary)',
+    'ro-RO': 'Romanian (Romania)',
+    'th-TH': 'Thai (Thailand)',
+    'vi-VN': 'Vietnamese (Vietnam)',
+    'id-ID': 'Indonesian (Indonesia)',
+    'ms-MY': 'Malay (Malaysia)',
+    'he-IL': 'Hebrew (Israel)',
+    'uk-UA': 'Ukrainian (Ukraine)',
+    'el-GR': 'Greek (Greece)',
+}
+
+# Languages to try for auto-detection (in order of priority)
+# File uploads favour Arabic first; microphone commands favour English first
+AUTO_DETECT_LANGUAGES = ['ar-SA',  'en-US', 'ar-EG',  'en-GB', 'fr-FR', 'es-ES', 'de-DE', 'it-IT', 'pt-BR', 'ru-RU', 'ja-JP', 'ko-KR', 'zh-CN', 'nl-NL', 'tr-TR', 'hi-IN', 'sv-SE', 'pl-PL']
+MIC_AUTO_DETECT_LANGUAGES = [ 'en-US','ar-EG','ar-SA','fr-FR',  'en-GB',  'es-ES', 'de-DE', 'it-IT', 'pt-BR', 'ru-RU', 'ja-JP', 'ko-KR', 'zh-CN', 'nl-NL', 'tr-TR', 'hi-IN', 'sv-SE', 'pl-PL']
+
+# Mapping from langdetect codes to Google language codes
+LANG_DETECT_MAP = {
+    'en': ['en-US', 'en-GB'],
+    'es': ['es-ES', 'es-MX'],
+    'fr': ['fr-FR'],
+    'de': ['de-DE'],
+    'it': ['it-IT'],
+    'pt': ['pt-BR', 'pt-PT'],
+    'ru': ['ru-RU'],
+    'ja': ['ja-JP'],
+    'ko': ['ko-KR'],
+    'zh': ['zh-CN', 'zh-TW'],
+    'ar': ['ar-SA', 'ar-EG'],
+    'hi': ['hi-IN'],
+    'nl': ['nl-NL'],
+    'pl': ['pl-PL'],
+    'tr': ['tr-TR'],
+    'sv': ['sv-SE'],
+    'da': ['da-DK'],
+    'no': ['no-NO'],
+    'fi': ['fi-FI'],
+    'cs': ['cs-CZ'],
+    'hu': ['hu-HU'],
+    'ro': ['ro-RO'],
+    'th': ['th-TH'],
+    'vi': ['vi-VN'],
+    'id': ['id-ID'],
+    'ms': ['ms-MY'],
+    'he': ['he-IL'],
+    'uk': ['uk-UA'],
+    'el': ['el-GR'],
+}
+
+# Recent transcripts keyed by audio content, shared by all routes in the process
+TRANSCRIPT_CACHE_SIZE = int(os.environ.get('TRANSCRIPT_CACHE_SIZE', '256'))
+
+# Extra attempts for a segment whose recognition failed (not for silent segments)
+SEGMENT_RETRIES = 1
+
+
+def validate_language(language_code):
+    """Validate if language code is supported."""
+    # Handle None, empty string, or whitespace-only strings
+    if not language_code or (isinstance(language_code, str) and not language_code.strip()):
+        return DEFAULT_LANGUAGE, None
+    # Strip whitespace and normalize
+    language_code = language_code.strip() if isinstance(language_code, str) else language_code
+    if language_code in SUPPORTED_LANGUAGES:
+        return language_code, None
+    return None, f"Unsupported language code: {language_code}. Supported languages: {', '.join(SUPPORTED_LANGUAGES.keys())}"
+
+
+class TranscriptCache:
+    """Thread-safe LRU cache of (text, language) keyed by audio hash and requested language."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(audio_data, language):
+        return hashlib.sha256(audio_data.frame_data).hexdigest(), audio_data.sample_rate, language
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+transcript_cache = TranscriptCache(TRANSCRIPT_CACHE_SIZE)
+
+
+def _recognize_google(recognizer, audio_data, language, priority_class):
+    """Call the recognizer once (live, recording or replaying), holding a scheduler slot for the call."""
+    duration = len(audio_data.frame_data) / float(audio_data.sample_rate * audio_data.sample_width)
+    with span('recognize', ok_exceptions=(sr.UnknownValueError,), language=language,
+              priority_class=priority_class, audio_seconds=round(duration, 2)) as attempt:
+        with recognition_scheduler.slot(priority_class, cost=duration) as wait_seconds:
+            if attempt is not None:
+                attempt.set(queue_wait_ms=round(wait_seconds * 1000, 1))
+            try:
+                text = recognizer_backend.recognize(recognizer, audio_data, language)
+            except sr.UnknownValueError:
+                if attempt is not None:
+                    attempt.set(outcome='no_speech')
+                raise
+            if attempt is not None:
+                attempt.set(outcome='text', chars=len(text))
+            return text
+
+
+def recognize(audio_data, language, recognizer, auto_detect_languages=AUTO_DETECT_LANGUAGES,
+              priority_class=STANDARD, details=None):
+    """
+    Recognize prepared audio with Google Speech Recognition.
+    
+    Identical audio is served from the transcript cache and near-duplicates
+    (re-encoded or slightly trimmed) from the fingerprint index. Otherwise, in
+    auto mode each language in `auto_detect_languages` is tried in order and
+    the first transcript whose detected language matches is returned. Every
+    recognizer call is scheduled under `priority_class`.
+    
+    Args:
+        details: Optional dict filled with 'transcript_source' ('cache',
+            'fingerprint' or 'recognizer') and, for fingerprint matches,
+            'match_confidence'
+    
+    Returns:
+        tuple: (text, language)
+    
+    Raises:
+        sr.UnknownValueError: If no speech could be recognized
+        sr.RequestError: If the recognition service fails (in auto mode: for every language)
+    """
+    if details is None:
+        details = {}
+    
+    cache_key = transcript_cache.key(audio_data, language)
+    cached = transcript_cache.get(cache_key)
+    if cached:
+        logger.info("Transcript cache hit (%s)", cached[1])
+        details['transcript_source'] = 'cache'
+        return cached
+    
+    fingerprint = None
+    if fingerprint_index.enabled:
+        fingerprint = run_cpu_bound(fingerprint_audio_data, audio_data)
+        match = fingerprint_index.lookup(fingerprint, language)
+        if match:
+            text, matched_language, confidence = match
+            logger.info("Near-duplicate audio matched (%s, confidence %.3f)", matched_language, confidence)
+            details.update(transcript_source='fingerprint', match_confidence=confidence)
+            transcript_cache.put(cache_key, (text, matched_language))
+            return text, matched_language
+    
+    details['transcript_source'] = 'recognizer'
+    text, detected = _recognize_uncached(audio_data, language, recognizer, auto_detect_languages, priority_class)
+    transcript_cache.put(cache_key, (text, detected))
+    if fingerprint is not None:
+        fingerprint_index.add(fingerprint, text, detected, language)
+    return text, detected
+
+
+def _recognize_uncached(audio_data, language, recognizer, auto_detect_languages, priority_class):
+    """
+    Call the recognizer for one language, or try `auto_detect_languages` in order.
+    
+    In auto mode a language that fails with a service error is skipped, but if
+    every language failed that way the last sr.RequestError is raised, so an
+    outage is not mistaken for audio without speech.
+    """
+    if language != "auto":
+        text = _recognize_google(recognizer, audio_data, language, priority_class)
+        return text, language
+    
+    # Auto-detect language by trying common languages
+    request_error = None
+    reached_service = False
+    for lang in auto_detect_languages:
+        try:
+            logger.debug("Trying language: %s", lang)
+            candidate_text = _recognize_google(recognizer, audio_data, lang, priority_class)
+            reached_service = True
+            # Verify the detected language matches
+            try:
+                detected_lang_code = run_cpu_bound(detect, candidate_text)
+                if detected_lang_code in LANG_DETECT_MAP and lang in LANG_DETECT_MAP[detected_lang_code]:
+                    logger.info("Auto-detected language: %s", lang)
+                    return candidate_text, lang
+                else:
+                    logger.debug("Language mismatch: transcribed in %s but detected as %s", lang, detected_lang_code)
+                    continue
+            except LangDetectException:
+                logger.debug("Could not detect language for text from %s", lang)
+                continue
+        except sr.UnknownValueError:
+            reached_service = True
+            logger.debug("No speech detected for %s", lang)
+            continue
+        except sr.RequestError as e:
+            request_error = e
+            logger.warning("Request error with %s: %s", lang, e)
+            continue
+    
+    if request_error is not None and not reached_service:
+        raise request_error
+    raise sr.UnknownValueError("Could not understand audio in any supported language")
+
+
+def transcribe_speech(audio_path, language, recognizer, priority_class=STANDARD, details=None):
+    """
+    Transcribe speech audio using speech recognition.
+    
+    Mono PCM WAVs are memory-mapped rather than read into memory; files longer
+    than one segment are recognized in segments cut at pauses, each a zero-copy
+    view of the mapping. Other files are loaded with sr.AudioFile.
+    
+    Returns:
+        tuple: (transcribed_text, error_message, detected_language, trimmed_seconds)
+    """
+    try:
+        wav = MappedWav(audio_path)
+    except (ValueError, OSError) as e:
+        logger.debug("Memory-mapped read unavailable (%s), loading %s", e, audio_path)
+        wav = None
+    
+    if wav is not None and wav.channels == 1:
+        with wav:
+            if wav.duration_seconds <= PIPELINE_SEGMENT_SECONDS + PIPELINE_CUT_SEARCH_SECONDS:
+                audio_data = sr.AudioData(wav.frames, wav.sample_rate, wav.sample_width)
+                return recognize_audio_data(audio_data, language, recognizer, priority_class=priority_class,
+                                            details=details)
+            
+            result = recognize_segments(
+                wav.segments(PIPELINE_SEGMENT_SECONDS, PIPELINE_CUT_SEARCH_SECONDS), language, recognizer,
+                priority_class, wav.sample_rate, wav.sample_width, details
+            )
+            return result['text'], result['error_message'], result['language'], result['trimmed_seconds']
+    if wav is not None:
+        wav.close()
+    
+    try:
+        with sr.AudioFile(audio_path) as source:
+            audio_data = recognizer.record(source)
+    except Exception as e:
+        error_message = f"Error transcribing speech: {str(e)}"
+        logger.error(error_message)
+        return None, error_message, language, 0.0
+    
+    return recognize_audio_data(audio_data, language, recognizer, priority_class=priority_class, details=details)
+
+
+def recognize_audio_data(audio_data, language, recognizer, auto_detect_languages=AUTO_DETECT_LANGUAGES,
+                         priority_class=STANDARD, details=None):
+    """
+    Transcribe an in-memory speech_recognition AudioData object.
+    
+    Args:
+        details: Optional dict, filled as by recognize(); 'failed' is set when
+            recognition failed for a reason other than the audio having no
+            recognizable speech (e.g. a service error), so a retry may succeed
+    
+    Returns:
+        tuple: (transcribed_text, error_message, detected_language, trimmed_seconds)
+    """
+    text = None
+    error_message = None
+    detected_language = language
+    trimmed_seconds = 0.0
+    
+    try:
+        # Estimate ambient noise from the loaded buffer (nothing is discarded)
+        # and drop silence so only speech is sent to the recognizer
+        with span('prepare'):
+            audio_data, trimmed_seconds = run_cpu_bound(prepare_audio, audio_data)
+        
+        text, detected_language = recognize(
+            audio_data, language, recognizer, auto_detect_languages, priority_class, details
+        )
+        logger.info("Transcription successful (%d chars)", len(text))
+    
+    except sr.UnknownValueError:
+        if language == "auto":
+            error_message = "Could not understand the audio. The audio may contain only music, noise, or unclear speech in any supported language."
+        else:
+            error_message = "Could not understand the audio. The audio may contain only music, noise, or unclear speech."
+        logger.warning(error_message)
+    
+    except sr.RequestError as e:
+        error_message = f"Recognition service error: {str(e)}"
+        logger.error(error_message)
+        if details is not None:
+            details['failed'] = True
+    
+    except Exception as e:
+        error_message = f"Error transcribing speech: {str(e)}"
+        logger.error(error_message)
+        if details is not None:
+            details['failed'] = True
+    
+    return text, error_message, detected_language, trimmed_seconds
+
+
+def recognize_pcm(pcm, sample_rate, sample_width, language, priority_class=BULK, details=None):
+    """Recognize raw PCM bytes with a fresh recognizer (background work by default)."""
+    audio_data = sr.AudioData(pcm, sample_rate, sample_width)
+    return recognize_audio_data(audio_data, language, sr.Recognizer(), priority_class=priority_class,
+                                details=details)
+
+
+def recognize_segments(segments, language, recognizer, priority_class=STANDARD,
+                       sample_rate=WAV_SAMPLE_RATE, sample_width=WAV_SAMPLE_WIDTH, details=None):
+    """
+    Recognize a stream of mono PCM segments (16kHz 16-bit by default) one by one.
+    
+    In auto mode the language detected in the first recognized segment is
+    reused for the rest, so only one segment pays for auto-detection.
+    
+    Segments without recognizable speech are skipped. A segment whose
+    recognition fails (e.g. a service error) is retried SEGMENT_RETRIES times;
+    if it still fails the result is marked incomplete and lists its index.
+    
+    Args:
+        details: Optional dict filled as by recognize() for the whole
+            recording: 'transcript_source' is 'cache' or 'fingerprint' only if
+            every recognized segment came from there (with the lowest
+            'match_confidence'), otherwise 'recognizer'; 'incomplete' and
+            'failed_segments' are set if any segment failed
+    
+    Returns:
+        dict: text, error_message, language, trimmed_seconds, segments,
+            duration_seconds, incomplete, failed_segments
+    """
+    texts = []
+    failures = []
+    no_speech_error = None
+    failed_segments = []
+    sources = set()
+    confidences = []
+    trimmed_total = 0.0
+    pcm_bytes = 0
+    count = 0
+    
+    for index, pcm in enumerate(segments):
+        count += 1
+        pcm_bytes += len(pcm)
+        audio_data = sr.AudioData(pcm, sample_rate, sample_width)
+        for attempt in range(SEGMENT_RETRIES + 1):
+            segment_details = {}
+            text, error_message, detected_language, trimmed_seconds = recognize_audio_data(
+                audio_data, language, recognizer, priority_class=priority_class, details=segment_details
+            )
+            if text or not segment_details.get('failed'):
+                break
+            if attempt < SEGMENT_RETRIES:
+                logger.warning("Segment %d failed, retrying: %s", index, error_message)
+        trimmed_total += trimmed_seconds
+        if text:
+            texts.append(text)
+            language = detected_language
+            sources.add(segment_details.get('transcript_source', 'recognizer'))
+            if 'match_confidence' in segment_details:
+                confidences.append(segment_details['match_confidence'])
+        elif segment_details.get('failed'):
+            logger.error("Segment %d failed after %d attempts: %s", index, SEGMENT_RETRIES + 1, error_message)
+            failed_segments.append(index)
+            failures.append(error_message)
+        elif error_message and no_speech_error is None:
+            no_speech_error = error_message
+    
+    if texts:
+        error_message = None
+    else:
+        error_message = failures[0] if failures else no_speech_error
+    if details is not None:
+        if texts:
+            details['transcript_source'] = sources.pop() if len(sources) == 1 else 'recognizer'
+            if details['transcript_source'] == 'fingerprint':
+                details['match_confidence'] = min(confidences)
+        if failed_segments:
+            details.update(incomplete=True, failed_segments=failed_segments)
+    return {
+        'text': ' '.join(texts) if texts else None,
+        'error_message': error_message,
+        'language': language,
+        'trimmed_seconds': trimmed_total,
+        'segments': count,
+        'duration_seconds': pcm_bytes / float(sample_rate * sample_width),
+        'incomplete': bool(failed_segments),
+        'failed_segments': failed_segments,
+    }
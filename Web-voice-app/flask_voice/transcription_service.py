@@ -0,0 +1,91 @@
+"""
+Unified transcription service.
+Serves the microphone routes (/transcribe, /languages) and the file upload
+routes (/api/...) from one app, so both traffic types share the transcription
+engine, transcript cache, conversion memory budget and worker pools instead of
+running two separate fleets.
+"""
+
+import os
+import logging
+import threading
+
+# Imported first: sets up the Python 3.13 aifc shim before speech_recognition loads
+from transcription_engine import SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE, transcript_cache
+
+from flask import Flask, jsonify
+from flask_cors import CORS
+from werkzeug.serving import make_server
+
+from audio_converter import memory_budget
+from scheduler import recognition_scheduler
+from recognizer_fixtures import recognizer_backend
+from audio_fingerprint import fingerprint_index
+import structured_logging
+import tracing
+from flask_transcribe import mic_blueprint
+from flask_upload_transcribe import upload_blueprint, configure_app, upload_spool, CORS_RESOURCES
+
+logger = logging.getLogger(__name__)
+
+# Ports used when running standalone; the frontend and Node backend still use
+# separate URLs for microphone and upload traffic, so listen on both
+UPLOAD_PORT = int(os.environ.get('UPLOAD_PORT', '5000'))
+MICROPHONE_PORT = int(os.environ.get('MICROPHONE_PORT', '5003'))
+
+app = Flask(__name__)
+CORS(app, resources=CORS_RESOURCES)
+configure_app(app)
+app.register_blueprint(mic_blueprint)
+app.register_blueprint(upload_blueprint)
+
+
+@app.route("/health", methods=["GET"])
+def health_check():
+    """Health check endpoint."""
+    return jsonify({
+        "status": "healthy",
+        "message": "Transcription service is running",
+        "services": ["microphone", "upload"],
+        "supported_languages_count": len(SUPPORTED_LANGUAGES),
+        "default_language": DEFAULT_LANGUAGE,
+        "transcript_cache": transcript_cache.stats(),
+        "fingerprint_index": fingerprint_index.stats(),
+        "conversion_memory": memory_budget.stats(),
+        "spool": upload_spool.stats(),
+        "scheduler": recognition_scheduler.stats(),
+        "recognizer": recognizer_backend.stats(),
+        "logging": structured_logging.stats(),
+        "tracing": tracing.stats()
+    }), 200
+
+
+def serve(ports, host='0.0.0.0'):
+    """Serve the app on several ports from one process (development server)."""
+    servers = [make_server(host, port, app, threaded=True) for port in ports]
+    threads = [threading.Thread(target=server.serve_forever, daemon=True) for server in servers[1:]]
+    for thread in threads:
+        thread.start()
+    try:
+        servers[0].serve_forever()
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("VoiceScript Transcription Service (microphone + upload)")
+    print("=" * 60)
+    print(f"Starting server on http://localhost:{UPLOAD_PORT} and http://localhost:{MICROPHONE_PORT}")
+    print("Endpoints:")
+    print("  POST /transcribe - Transcribe microphone audio (WAV, WebM/Opus, OGG)")
+    print("  GET  /languages - Get supported languages")
+    print("  POST /api/transcribe-file - Upload and transcribe audio")
+    print("  POST /api/analyze-file - Analyze file metadata")
+    print("  POST /api/uploads - Start a resumable upload (then PUT chunks, POST .../finalize)")
+    print("  GET  /api/languages - Get supported languages")
+    print("  GET  /health - Health check")
+    print("  GET  /ready - Readiness (503 when saturated)")
+    print("=" * 60)
+    serve([UPLOAD_PORT, MICROPHONE_PORT])
@@ -0,0 +1,327 @@
+"""
+Voice activity detection (VAD) utility.
+Trims leading/trailing silence and compresses long pauses before recognition,
+so the recognizer only receives audio that can actually produce text.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Analysis frame size
+VAD_FRAME_MS = 30
+
+# Speech kept around every detected speech region (protects word onsets/tails)
+VAD_PADDING_MS = 200
+
+# Pauses inside speech longer than this are shortened to this length
+VAD_MAX_PAUSE_MS = 600
+
+# A frame is speech if its energy is this far above the estimated noise floor
+VAD_ENERGY_MARGIN_DB = 10.0
+
+# Frames quieter than this are always treated as silence (dBFS)
+VAD_MIN_ENERGY_DBFS = -55.0
+
+# Low-energy frames with a high zero-crossing rate (fricatives like "s", "f")
+# still count as speech when within this many dB of the energy threshold
+VAD_ZCR_THRESHOLD = 0.25
+VAD_ZCR_MARGIN_DB = 6.0
+
+# Percentile of frame energies used as the noise floor estimate
+VAD_NOISE_PERCENTILE = 10
+
+# Clips shorter than this are passed through untouched
+VAD_MIN_DURATION_MS = 500
+
+
+def pcm_to_samples(frame_data, sample_width=2):
+    """
+    View raw little-endian PCM bytes as a NumPy array without copying.
+
+    Args:
+        frame_data: Raw PCM bytes (or any buffer)
+        sample_width: Bytes per sample (1, 2 or 4)
+
+    Returns:
+        numpy.ndarray: 1-D sample array
+    """
+    dtypes = {1: np.uint8, 2: '<i2', 4: '<i4'}
+    if sample_width not in dtypes:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    return np.frombuffer(frame_data, dtype=dtypes[sample_width])
+
+
+def frame_features(samples, sample_rate, frame_ms=VAD_FRAME_MS, sample_width=2):
+    """
+    Compute per-frame energy (dBFS) and zero-crossing rate.
+
+    Args:
+        samples: 1-D NumPy sample array
+        sample_rate: Sample rate in Hz
+        frame_ms: Analysis frame length in milliseconds
+        sample_width: Bytes per sample, used to scale to full-scale
+
+    Returns:
+        tuple: (energy_db, zcr, frame_length) where energy_db and zcr are
+            arrays with one value per frame (the last frame is zero-padded)
+    """
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    if len(samples) == 0:
+        return np.zeros(0), np.zeros(0), frame_length
+
+    full_scale = float(2 ** (8 * sample_width - 1))
+    x = samples.astype(np.float32)
+    if sample_width == 1:
+        x -= 128.0  # 8-bit PCM is unsigned
+    x /= full_scale
+
+    n_frames = -(-len(x) // frame_length)
+    pad = n_frames * frame_length - len(x)
+    if pad:
+        x = np.concatenate([x, np.zeros(pad, dtype=np.float32)])
+    frames = x.reshape(n_frames, frame_length)
+
+    energy = np.mean(frames * frames, axis=1)
+    energy_db = 10.0 * np.log10(energy + 1e-12)
+
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_length)
+
+    return energy_db, zcr, frame_length
+
+
+def estimate_noise_floor(energy_db, percentile=VAD_NOISE_PERCENTILE):
+    """Estimate the noise floor (dBFS) as a low percentile of frame energies."""
+    if len(energy_db) == 0:
+        return VAD_MIN_ENERGY_DBFS
+    return float(np.percentile(energy_db, percentile))
+
+
+def noise_floor_from_pcm(frame_data, sample_rate, sample_width=2, frame_ms=VAD_FRAME_MS):
+    """
+    Estimate the noise floor of an already-loaded PCM buffer.
+
+    Unlike Recognizer.adjust_for_ambient_noise(), nothing is read from or
+    consumed off the audio source: the estimate is a low percentile of the
+    frame energies across the whole clip.
+
+    Returns:
+        float: Noise floor in dBFS
+    """
+    samples = pcm_to_samples(frame_data, sample_width)
+    energy_db, _, _ = frame_features(samples, sample_rate, frame_ms, sample_width)
+    return estimate_noise_floor(energy_db)
+
+
+def estimate_noise_floor(audio_data):
+    """
+    Noise floor of `audio_data`, used as the VAD's speech/non-speech reference.
+
+    Replaces adjust_for_ambient_noise(source, duration=...), which discards the
+    first part of the stream. Only the VAD uses the estimate: recognize_google
+    sends the whole clip, so recognizer.energy_threshold (which only affects
+    listen()) is not touched.
+
+    Args:
+        audio_data: speech_recognition.AudioData instance
+
+    Returns:
+        float or None: Noise floor in dBFS, or None if it could not be estimated
+    """
+    try:
+        raw = audio_data.get_raw_data(convert_width=2)
+        noise_floor_db = noise_floor_from_pcm(raw, audio_data.sample_rate, 2)
+    except Exception as e:
+        logger.warning(f"Could not estimate noise floor: {str(e)}")
+        return None
+
+    logger.debug("Noise floor %.1f dBFS", noise_floor_db)
+    return noise_floor_db
+
+
+def speech_mask(energy_db, zcr, noise_floor_db=None,
+                energy_margin_db=VAD_ENERGY_MARGIN_DB,
+                min_energy_dbfs=VAD_MIN_ENERGY_DBFS,
+                zcr_threshold=VAD_ZCR_THRESHOLD,
+                zcr_margin_db=VAD_ZCR_MARGIN_DB):
+    """
+    Classify frames as speech/non-speech.
+
+    Returns:
+        numpy.ndarray: Boolean array, True for speech frames
+    """
+    if noise_floor_db is None:
+        noise_floor_db = estimate_noise_floor(energy_db)
+    threshold = max(noise_floor_db + energy_margin_db, min_energy_dbfs)
+
+    loud = energy_db > threshold
+    fricative = (energy_db > threshold - zcr_margin_db) & (zcr > zcr_threshold)
+    return loud | fricative
+
+
+def _dilate(mask, radius):
+    """Extend every True run in a boolean mask by `radius` frames on each side."""
+    if radius <= 0 or not mask.any():
+        return mask
+    counts = np.convolve(mask.astype(np.int32), np.ones(2 * radius + 1, dtype=np.int32), mode='same')
+    return counts > 0
+
+
+def _compress_pauses(mask, max_pause_frames):
+    """Shorten internal non-speech runs longer than `max_pause_frames`."""
+    keep = mask.copy()
+    voiced = np.flatnonzero(mask)
+    if len(voiced) == 0:
+        return keep
+
+    # Everything before the first / after the last speech frame is dropped
+    first, last = voiced[0], voiced[-1]
+    edges = np.diff(mask[first:last + 1].astype(np.int8))
+    gap_starts = np.flatnonzero(edges == -1) + first + 1
+    gap_ends = np.flatnonzero(edges == 1) + first + 1
+
+    head = max_pause_frames // 2
+    tail = max_pause_frames - head
+    for start, end in zip(gap_starts, gap_ends):
+        if end - start <= max_pause_frames:
+            keep[start:end] = True
+        else:
+            keep[start:start + head] = True
+            keep[end - tail:end] = True
+    return keep
+
+
+def find_quiet_cut(pcm, target_bytes, search_bytes, sample_rate, sample_width=2):
+    """
+    Pick a cut point within `search_bytes` of `target_bytes` at the quietest
+    frame, so segment boundaries fall in pauses rather than mid-word.
+
+    Returns:
+        int: Byte offset into `pcm` (aligned to whole samples)
+    """
+    start = max(0, target_bytes - search_bytes)
+    start -= start % sample_width
+    # Slicing copies a bytearray but only views a memoryview (e.g. a mapped WAV)
+    window = pcm_to_samples(pcm[start:target_bytes + search_bytes], sample_width)
+    energy_db, _, frame_length = frame_features(window, sample_rate, sample_width=sample_width)
+    if len(energy_db) == 0:
+        return target_bytes
+    cut = start + int(energy_db.argmin()) * frame_length * sample_width
+    return cut if cut > 0 else target_bytes
+
+
+def split_at_pauses(blocks, segment_bytes, search_bytes, sample_rate, sample_width=2):
+    """
+    Regroup a stream of PCM blocks into segments of roughly `segment_bytes`,
+    cutting each one at the quietest frame near the boundary.
+
+    Args:
+        blocks: Iterable of raw PCM byte blocks
+        segment_bytes: Target segment length in bytes
+        search_bytes: How far either side of the target to look for a pause
+
+    Yields:
+        bytes: PCM segments (the last one may be shorter)
+    """
+    pending = bytearray()
+    for block in blocks:
+        pending.extend(block)
+        while len(pending) >= segment_bytes + search_bytes:
+            cut = find_quiet_cut(pending, segment_bytes, search_bytes, sample_rate, sample_width)
+            yield bytes(pending[:cut])
+            del pending[:cut]
+    if pending:
+        yield bytes(pending)
+
+
+def trim_pcm(frame_data, sample_rate, sample_width=2,
+             padding_ms=VAD_PADDING_MS, max_pause_ms=VAD_MAX_PAUSE_MS,
+             frame_ms=VAD_FRAME_MS, noise_floor_db=None):
+    """
+    Remove non-speech regions from raw PCM audio.
+
+    Leading and trailing silence (beyond `padding_ms`) is removed and pauses
+    inside speech are compressed to at most `max_pause_ms`.
+
+    Args:
+        frame_data: Raw mono PCM bytes
+        sample_rate: Sample rate in Hz
+        sample_width: Bytes per sample
+        padding_ms: Audio kept before/after each speech region
+        max_pause_ms: Longest pause preserved between speech regions
+        frame_ms: Analysis frame length in milliseconds
+        noise_floor_db: Optional precomputed noise floor (dBFS)
+
+    Returns:
+        tuple: (trimmed_pcm, removed_seconds). When only leading/trailing
+            silence is removed, trimmed_pcm is a zero-copy memoryview slice of
+            the input. If no speech is found or the clip is too short, the
+            input is returned unchanged.
+    """
+    samples = pcm_to_samples(frame_data, sample_width)
+    if len(samples) * 1000 < VAD_MIN_DURATION_MS * sample_rate:
+        return frame_data, 0.0
+
+    energy_db, zcr, frame_length = frame_features(samples, sample_rate, frame_ms, sample_width)
+    mask = speech_mask(energy_db, zcr, noise_floor_db=noise_floor_db)
+    if not mask.any():
+        logger.debug("VAD found no speech frames; leaving audio untouched")
+        return frame_data, 0.0
+
+    mask = _dilate(mask, int(round(padding_ms / frame_ms)))
+    keep = _compress_pauses(mask, max(1, int(round(max_pause_ms / frame_ms))))
+    if keep.all():
+        return frame_data, 0.0
+
+    kept_frames = np.flatnonzero(keep)
+    first, last = kept_frames[0], kept_frames[-1] + 1
+    if last - first == len(kept_frames):
+        # One contiguous region: slice the buffer instead of copying samples
+        start = first * frame_length * sample_width
+        end = min(last * frame_length, len(samples)) * sample_width
+        removed_seconds = float(len(samples) - (end - start) // sample_width) / sample_rate
+        return memoryview(frame_data)[start:end], removed_seconds
+
+    sample_keep = np.repeat(keep, frame_length)[:len(samples)]
+    trimmed = samples[sample_keep]
+    removed_seconds = (len(samples) - len(trimmed)) / float(sample_rate)
+    return trimmed.tobytes(), removed_seconds
+
+
+def trim_audio_data(audio_data, **kwargs):
+    """
+    Apply VAD trimming to a speech_recognition AudioData object.
+
+    Args:
+        audio_data: speech_recognition.AudioData instance
+        **kwargs: Passed through to trim_pcm()
+
+    Returns:
+        tuple: (AudioData, removed_seconds)
+    """
+    try:
+        raw = audio_data.get_raw_data(convert_width=2)
+        trimmed, removed_seconds = trim_pcm(raw, audio_data.sample_rate, 2, **kwargs)
+    except Exception as e:
+        logger.warning(f"Voice activity trimming skipped: {str(e)}")
+        return audio_data, 0.0
+
+    if removed_seconds <= 0:
+        return audio_data, 0.0
+
+    logger.info("VAD removed %.2fs of non-speech audio", removed_seconds)
+    return type(audio_data)(trimmed, audio_data.sample_rate, 2), removed_seconds
+
+
+def prepare_audio(audio_data):
+    """
+    Estimate the clip's noise floor, then trim non-speech relative to it.
+
+    Returns:
+        tuple: (AudioData, removed_seconds)
+    """
+    noise_floor_db = estimate_noise_floor(audio_data)
+    return trim_audio_data(audio_data, noise_floor_db=noise_floor_db)
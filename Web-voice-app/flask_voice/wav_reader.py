@@ -0,0 +1,140 @@
+"""
+Memory-mapped WAV reader.
+
+sr.AudioFile + recognizer.record() read a whole converted WAV into Python
+bytes, and segmenting/trimming then slice and copy it again. MappedWav maps
+the file read-only and exposes the PCM data as zero-copy memoryview / NumPy
+views, so long files are segmented and trimmed straight from the page cache
+and peak RSS stays near one segment rather than the whole file.
+"""
+
+import mmap
+import struct
+import logging
+
+import numpy as np
+
+from voice_activity import find_quiet_cut
+
+logger = logging.getLogger(__name__)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class MappedWav:
+    """
+    Read-only, memory-mapped view of an uncompressed PCM WAV file.
+
+    Use as a context manager; views handed out must not be used after close().
+
+    Attributes:
+        sample_rate: Samples per second
+        channels: Channel count
+        sample_width: Bytes per sample
+        frames: memoryview over the PCM data chunk (no copy)
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Path to a PCM WAV file
+
+        Raises:
+            ValueError: If the file is not an uncompressed PCM WAV
+            OSError: If the file cannot be opened or mapped
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"Empty WAV file: {path}")
+        try:
+            self._parse_header()
+        except struct.error as e:
+            self._map.close()
+            raise ValueError(f"Malformed WAV header: {e}") from e
+        except Exception:
+            self._map.close()
+            raise
+
+    def _parse_header(self):
+        data = self._map
+        if len(data) < 12 or data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
+            raise ValueError("Not a RIFF/WAVE file")
+
+        fmt = None
+        position = 12
+        while position + 8 <= len(data):
+            chunk_id = data[position:position + 4]
+            chunk_size = struct.unpack_from('<I', data, position + 4)[0]
+            body = position + 8
+            if chunk_id == b'fmt ':
+                if chunk_size < 16 or body + 16 > len(data):
+                    raise ValueError("Malformed WAV header (truncated fmt chunk)")
+                fmt = struct.unpack_from('<HHIIHH', data, body)
+                format_tag = fmt[0]
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26 and body + 26 <= len(data):
+                    format_tag = struct.unpack_from('<H', data, body + 24)[0]
+                if format_tag != WAVE_FORMAT_PCM:
+                    raise ValueError(f"Unsupported WAV encoding (format tag {format_tag:#06x})")
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError("WAV data chunk appears before fmt chunk")
+                # Streamed WAVs may carry a placeholder size; clamp to the file
+                end = min(len(data), body + chunk_size) if chunk_size else len(data)
+                _, self.channels, self.sample_rate, _, block_align, bits = fmt
+                self.sample_width = bits // 8
+                if (self.sample_width not in (1, 2, 4) or self.channels < 1 or self.sample_rate < 1
+                        or block_align != self.sample_width * self.channels):
+                    raise ValueError(f"Unsupported WAV sample layout ({bits}-bit, {self.channels} channels)")
+                end -= (end - body) % block_align
+                self.frames = memoryview(data)[body:end]
+                return
+            position = body + chunk_size + (chunk_size & 1)
+
+        raise ValueError("WAV file has no data chunk")
+
+    @property
+    def duration_seconds(self):
+        return len(self.frames) / float(self.sample_rate * self.sample_width * self.channels)
+
+    def samples(self):
+        """NumPy view of the interleaved samples (no copy)."""
+        dtypes = {1: np.uint8, 2: '<i2', 4: '<i4'}
+        return np.frombuffer(self.frames, dtype=dtypes[self.sample_width])
+
+    def segments(self, segment_seconds, search_seconds):
+        """
+        Split mono PCM into segments of about `segment_seconds`, cut at pauses.
+
+        Yields:
+            memoryview: Zero-copy slices of `frames`
+        """
+        bytes_per_second = self.sample_rate * self.sample_width * self.channels
+        segment_bytes = int(segment_seconds * bytes_per_second)
+        search_bytes = int(search_seconds * bytes_per_second)
+        start = 0
+        total = len(self.frames)
+        while total - start >= segment_bytes + search_bytes:
+            window = self.frames[start:start + segment_bytes + search_bytes]
+            cut = find_quiet_cut(window, segment_bytes, search_bytes, self.sample_rate, self.sample_width)
+            yield self.frames[start:start + cut]
+            start += cut
+        if start < total:
+            yield self.frames[start:]
+
+    def close(self):
+        try:
+            self.frames.release()
+            self._map.close()
+        except BufferError:
+            # A caller still holds a view; the mapping is released with it
+            logger.debug(f"Deferred unmapping of {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -939,26 +939,36 @@ export default function HomePage() {
           }
           audioContextRef.current = null;
 
-          const blob = new Blob(chunks, { type: "audio/webm" });
+          const recordedType = recorder.mimeType || "audio/webm";
+          const blob = new Blob(chunks, { type: recordedType });
           chunks = [];
 
           try {
-            const arrayBuffer = await blob.arrayBuffer();
-            // Use a new AudioContext for decoding (separate from visualization)
-            const decodeContext = new (window.AudioContext || window.webkitAudioContext)();
-            const audioBuffer = await decodeContext.decodeAudioData(arrayBuffer);
-            decodeContext.close(); // Clean up after decoding
-
-            const wavBlob = encodeWAV(audioBuffer);
-            const formData = new FormData();
-            formData.append("audio", wavBlob, "recording.wav");
+            // WebM/Opus and OGG are decoded by the server; other recordings
+            // (or servers without ffmpeg, which answer 415) get a WAV
+            const sendCompressed = /webm|ogg/.test(recordedType);
+            const toWavBlob = async () => {
+              const arrayBuffer = await blob.arrayBuffer();
+              // Use a new AudioContext for decoding (separate from visualization)
+              const decodeContext = new (window.AudioContext || window.webkitAudioContext)();
+              const audioBuffer = await decodeContext.decodeAudioData(arrayBuffer);
+              decodeContext.close(); // Clean up after decoding
+              return encodeWAV(audioBuffer);
+            };
 
             // Ensure language is set, default to en-US if not
             const languageToSend = selectedLanguage || 'en-US';
-            formData.append("language", languageToSend);
+            const buildFormData = (audioBlob, filename) => {
+              const formData = new FormData();
+              formData.append("audio", audioBlob, filename);
+              formData.append("language", languageToSend);
+              return formData;
+            };
+            const compressedName = recordedType.includes("ogg") ? "recording.ogg" : "recording.webm";
+            const uploadBlob = sendCompressed ? blob : await toWavBlob();
 
             console.log("Sending transcription request with language:", languageToSend);
-            console.log("Audio blob size:", wavBlob.size, "bytes");
+            console.log("Audio blob size:", uploadBlob.size, "bytes", `(${uploadBlob.type})`);
             console.log("Service URL:", API_CONFIG.MICROPHONE_SERVICE_URL);
 
             // Clean up any existing abort controller and timeout
@@ -980,12 +990,19 @@ export default function HomePage() {
             timeoutRef.current = timeoutId;
 
             try {
-              const response = await fetch(`${API_CONFIG.MICROPHONE_SERVICE_URL}/transcribe`, {
+              const postRecording = (formData) => fetch(`${API_CONFIG.MICROPHONE_SERVICE_URL}/transcribe`, {
                 method: "POST",
                 body: formData,
                 signal: controller.signal,
                 // Don't set Content-Type header, let browser set it with boundary for FormData
               });
+              let response = await postRecording(
+                buildFormData(uploadBlob, sendCompressed ? compressedName : "recording.wav")
+              );
+              if (response.status === 415 && sendCompressed) {
+                console.log("Server cannot decode compressed audio, resending as WAV");
+                response = await postRecording(buildFormData(await toWavBlob(), "recording.wav"));
+              }
 
               // Clear timeout on successful response
               if (timeoutRef.current) {